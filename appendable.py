@@ -0,0 +1,183 @@
+from array import array
+from bisect import bisect_right
+from typing import List, Tuple
+from integer_compressor import IntegerCompressor, check_value_bits, writable
+
+# What extend() does when a new value needs more bits than the current k
+WIDEN_SEGMENT = "segment"   # Start a new segment with the wider k (the old words are kept as they are)
+WIDEN_REPACK = "repack"     # Re-pack the whole column once with the wider k (one segment)
+
+
+def check_widen(widen: str) -> str:
+    # Validate the widen policy given to a codec
+    if widen not in (WIDEN_SEGMENT, WIDEN_REPACK):
+        raise ValueError(f"Unknown widen policy: '{widen}'")
+    return widen
+
+
+# Shared append() / extend() for the spanning and non-spanning layouts
+# New values are packed right after the last one, so a batch costs
+# time proportional to its own size.
+#
+# A column is one or more segments. A segment is a run of values packed with
+# the same k, starting on a word boundary. The segment directory is empty as
+# long as there is only one segment (the usual case), so get() stays as fast.
+class AppendableBitPacking(IntegerCompressor):
+
+    def __init__(self, widen: str = WIDEN_SEGMENT) -> None:
+        super().__init__()
+        self.widen: str = check_widen(widen)
+
+        # Segment directory (one entry per segment, empty if only one segment)
+        self.segment_starts: array = array('Q')  # Position of the first value of the segment
+        self.segment_bits: array = array('B')    # k of the segment
+        self.segment_words: array = array('Q')   # First word of the segment in compressed_data
+
+    # ---- Layout hooks (implemented by the spanning / non-spanning versions) ----
+
+    def _words_for(self, count: int, k: int) -> int:
+        # Number of words used by 'count' values of k bits
+        raise NotImplementedError
+
+    def _pack_at(self, values: List[int], k: int, start_word: int, first_element: int) -> None:
+        # Write 'values' in the segment starting at start_word, from its value first_element on
+        raise NotImplementedError
+
+    def _unpack_at(self, start_word: int, first_element: int, count: int, k: int) -> List[int]:
+        # Read 'count' values of the segment starting at start_word, from its value first_element on
+        raise NotImplementedError
+
+    def _bit_position(self, start_word: int, first_element: int, k: int) -> int:
+        # Global bit position of value first_element of the segment starting at start_word
+        raise NotImplementedError
+
+    # ---- Append ----
+
+    def extend(self, values) -> None:
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        if self.num_elements == 0:
+            self.compress(values)
+            return
+
+        # 1 - k needed by the batch
+        batch_bits = max(max(values).bit_length(), 1)
+        check_value_bits(batch_bits, self.word_bits)
+
+        if batch_bits > self.bits_per_element:
+            if self.widen == WIDEN_REPACK:
+                # Only when k grows, so at most word_bits times in the life of the column
+                self.compress(self.decompress() + values)
+                return
+            self._start_segment(batch_bits)
+
+        # 2 - Grow the words and pack the batch after the last value
+        segment_start, k, start_word = self._last_segment()
+        first_element = self.num_elements - segment_start
+        self._grow(start_word + self._words_for(first_element + len(values), k))
+        self._pack_at(values, k, start_word, first_element)
+        self.num_elements += len(values)
+
+    def _last_segment(self) -> Tuple[int, int, int]:
+        # (first position, k, first word) of the segment that receives the new values
+        if self.segment_starts:
+            return self.segment_starts[-1], self.segment_bits[-1], self.segment_words[-1]
+        return 0, self.bits_per_element, 0
+
+    def _start_segment(self, k: int) -> None:
+        # The new segment starts on the next word boundary
+        self._make_writable()
+        if not self.segment_starts:
+            self.segment_starts.append(0)
+            self.segment_bits.append(self.bits_per_element)
+            self.segment_words.append(0)
+        self.segment_starts.append(self.num_elements)
+        self.segment_bits.append(k)
+        self.segment_words.append(len(self.compressed_data))
+        self.bits_per_element = k
+
+    def _grow(self, num_words: int) -> None:
+        # Add zero words at the end, up to num_words
+        self._make_writable()
+        missing = num_words - len(self.compressed_data)
+        if missing > 0:
+            self.compressed_data.frombytes(bytes(missing * self.compressed_data.itemsize))
+
+    def _make_writable(self) -> None:
+        # Arrays loaded with mmap=True are read-only memoryviews: copy them once
+        self.compressed_data = writable(self.compressed_data)
+        self.segment_starts = writable(self.segment_starts)
+        self.segment_bits = writable(self.segment_bits)
+        self.segment_words = writable(self.segment_words)
+
+    def _reset_segments(self) -> None:
+        # compress() always writes a single segment
+        self.segment_starts = array('Q')
+        self.segment_bits = array('B')
+        self.segment_words = array('Q')
+
+    def _truncate(self, num_elements: int) -> None:
+        # Drop the values from position num_elements on (in the last segment only)
+        # The overflow codec uses it to move its fake max value to the end
+        segment_start, k, start_word = self._last_segment()
+        if not (segment_start <= num_elements <= self.num_elements):
+            raise IndexError(f"Cannot truncate to {num_elements} values")
+
+        self._make_writable()
+        words = self.compressed_data
+        # Clear the bits of the dropped values in the last kept word, then drop the next words
+        word_index, bit_offset = divmod(self._bit_position(start_word, num_elements - segment_start, k),
+                                        self.word_bits)
+        if word_index < len(words):
+            words[word_index] &= (1 << bit_offset) - 1
+        del words[start_word + self._words_for(num_elements - segment_start, k):]
+        self.num_elements = num_elements
+
+    # ---- Reads on a column with several segments ----
+
+    def _get_segmented(self, i: int) -> int:
+        segment = bisect_right(self.segment_starts, i) - 1
+        return self._unpack_at(self.segment_words[segment], i - self.segment_starts[segment],
+                               1, self.segment_bits[segment])[0]
+
+    def _decompress_range_segmented(self, start: int, stop: int) -> List[int]:
+        result: List[int] = []
+        segment = bisect_right(self.segment_starts, start) - 1
+        position = start
+        while position < stop:
+            segment_start = self.segment_starts[segment]
+            segment_stop = (self.segment_starts[segment + 1] if segment + 1 < len(self.segment_starts)
+                            else self.num_elements)
+            count = min(segment_stop, stop) - position
+            result.extend(self._unpack_at(self.segment_words[segment], position - segment_start,
+                                          count, self.segment_bits[segment]))
+            position += count
+            segment += 1
+        return result
+
+    # ---- Size and serialization ----
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Packed values + segment directory (empty with one segment)
+        return super().get_compressed_size_in_bytes() + self.get_segments_size_in_bytes()
+
+    def get_segments_size_in_bytes(self) -> int:
+        return sum(directory.itemsize * len(directory)
+                   for directory in (self.segment_starts, self.segment_bits, self.segment_words))
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["widen"] = self.widen
+        arrays["segment_starts"] = self.segment_starts
+        arrays["segment_bits"] = self.segment_bits
+        arrays["segment_words"] = self.segment_words
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        # Files written before append() existed have no segments
+        self.widen = meta.get("widen", WIDEN_SEGMENT)
+        self.segment_starts = arrays.get("segment_starts", array('Q'))
+        self.segment_bits = arrays.get("segment_bits", array('B'))
+        self.segment_words = arrays.get("segment_words", array('Q'))
@@ -1,124 +1,415 @@
-import timeit
+import argparse
+import csv
+import json
+import os
+import platform
 import random
-from compressor_factory import CompressorFactory, COMPRESSOR_SPANNING, COMPRESSOR_NON_SPANNING, COMPRESSOR_OVERFLOW
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+from compressor_factory import (CompressorFactory, COMPRESSOR_SPANNING, COMPRESSOR_NON_SPANNING,
+                                COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR, COMPRESSOR_DICTIONARY, COMPRESSOR_RLE,
+                                COMPRESSOR_BLOCK_ADAPTIVE, MAIN_BITS_AUTO, PYTHON_ONLY_CODECS)
+from numpy_engine import ENGINE_PYTHON
 from integer_compressor import IntegerCompressor
-from typing import List, Dict
+from instrumentation import traced_peak
 
-def setup_compressor(compressor_name: str, data: List[int], **kwargs) -> IntegerCompressor:
+# Benchmark suite for all the compressors
+#
+# Protocol:
+#   - for each codec x distribution x size, build the dataset once (fixed seed)
+#   - compress / decompress: best of 'repeat' runs (the least noisy value)
+#   - get(i): average time per call, on sequential and on random indices
+#   - compression ratio: original size (4 bytes per int) / compressed size
+#   - peak memory of compress(), measured in a separate run with tracemalloc
+#     (tracemalloc slows the code down, so it is not used for the timings)
+#   - with --stats, the codec counters (word crossings, overflow hits...) of one
+#     more instrumented pass, also kept out of the timings
 
-    # Helper function for the benchmark.
-    # It creates the compressor and runs compress()
-    # so we don't measure that part.
-  
-    compressor = CompressorFactory.create_compressor(compressor_name, **kwargs)
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+FULL_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+ALL_CODECS = [COMPRESSOR_NON_SPANNING, COMPRESSOR_SPANNING, COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR,
+              COMPRESSOR_DICTIONARY, COMPRESSOR_RLE, COMPRESSOR_BLOCK_ADAPTIVE]
+
+# Metrics where bigger is worse / bigger is better (used by the comparison)
+TIME_METRICS = ["compress_s", "decompress_s", "get_sequential_s", "get_random_s", "peak_memory_bytes"]
+RATIO_METRICS = ["compression_ratio"]
+
+
+# ---- Datasets ----
+
+def make_uniform(size: int, rng: random.Random) -> List[int]:
+    # Uniform 20-bit values
+    return [rng.randrange(1 << 20) for _ in range(size)]
+
+
+def make_zipf(size: int, rng: random.Random) -> List[int]:
+    # Zipf-like: small values are much more frequent than big ones
+    # P(value = r) ~ 1 / r for r in 1..65536
+    ranks = range(1, 65537)
+    cum_weights = []
+    total = 0.0
+    for r in ranks:
+        total += 1.0 / r
+        cum_weights.append(total)
+    return rng.choices(ranks, cum_weights=cum_weights, k=size)
+
+
+def make_sorted(size: int, rng: random.Random) -> List[int]:
+    # Sorted column (like timestamps or offsets)
+    return sorted(rng.randrange(1 << 30) for _ in range(size))
+
+
+def make_spiky(size: int, rng: random.Random) -> List[int]:
+    # Mostly 8-bit values with 1% of 32-bit outliers
+    return [rng.randrange(1 << 32) if rng.random() < 0.01 else rng.randrange(256)
+            for _ in range(size)]
+
+
+def make_zeros(size: int, rng: random.Random) -> List[int]:
+    return [0] * size
+
+
+def make_sparse(size: int, rng: random.Random) -> List[int]:
+    # Counter column: 0 about 95% of the time, short bursts of small counts
+    data: List[int] = []
+    while len(data) < size:
+        data += [0] * int(rng.expovariate(1 / 190))
+        data += [rng.randrange(1, 1 << 12)] * rng.randint(1, 20)
+    return data[:size]
+
+
+DISTRIBUTIONS: Dict[str, Callable[[int, random.Random], List[int]]] = {
+    "uniform": make_uniform,
+    "zipf": make_zipf,
+    "sorted": make_sorted,
+    "spiky": make_spiky,
+    "zeros": make_zeros,
+    "sparse": make_sparse,
+}
+
+
+# ---- Measures ----
+
+def codec_engine(codec: str, engine: str) -> str:
+    # Engine the codec really runs with (the Python-only codecs ignore --engine)
+    return ENGINE_PYTHON if codec in PYTHON_ONLY_CODECS else engine
+
+
+def create(codec: str, engine: str) -> IntegerCompressor:
+    # Overflow and PFOR use the automatic k' so every distribution gets a fair setting
+    kwargs = {"engine": codec_engine(codec, engine)}
+    if codec in (COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR):
+        kwargs["main_bits"] = MAIN_BITS_AUTO
+    return CompressorFactory.create_compressor(codec, **kwargs)
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    # Best of 'repeat' runs, in seconds
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_per_get(compressor: IntegerCompressor, indices: List[int]) -> float:
+    # Average time of one get(i), in seconds
+    get = compressor.get
+    start = time.perf_counter()
+    for i in indices:
+        get(i)
+    return (time.perf_counter() - start) / max(len(indices), 1)
+
+
+def peak_memory(codec: str, engine: str, data: List[int]) -> int:
+    # Peak memory allocated by compress(), in bytes
+    compressor = create(codec, engine)
+    _, peak = traced_peak(compressor.compress, data)
+    return peak
+
+
+def run_case(codec: str, distribution: str, data: List[int], args: argparse.Namespace,
+             rng: random.Random) -> Dict[str, object]:
+    # All the measures for one codec on one dataset
+    size = len(data)
+    compressor = create(codec, args.engine)
+
+    compress_s = best_time(lambda: compressor.compress(data), args.repeat)
+
+    decompressed = compressor.decompress()
+    if decompressed != data:
+        raise AssertionError(f"{codec} failed the round trip on {distribution}/{size}")
+    decompress_s = best_time(compressor.decompress, args.repeat)
+
+    # Sequential indices from the start, random indices over the whole column
+    # (this is what shows an O(i) get, the middle index alone does not)
+    sample = min(args.get_samples, size)
+    get_sequential_s = time_per_get(compressor, list(range(sample)))
+    get_random_s = time_per_get(compressor, [rng.randrange(size) for _ in range(sample)])
+
+    compressed_size = compressor.get_compressed_size_in_bytes()
+    result: Dict[str, object] = {
+        "codec": codec,
+        "engine": codec_engine(codec, args.engine),
+        "distribution": distribution,
+        "size": size,
+        "compress_s": compress_s,
+        "decompress_s": decompress_s,
+        "get_sequential_s": get_sequential_s,
+        "get_random_s": get_random_s,
+        "compressed_bytes": compressed_size,
+        "compression_ratio": (size * 4) / compressed_size if compressed_size else float("inf"),
+        "peak_memory_bytes": peak_memory(codec, args.engine, data) if args.memory else None,
+    }
+    if args.stats:
+        result["stats"] = instrumented_pass(compressor, data, rng, sample)
+    return result
+
+
+def instrumented_pass(compressor: IntegerCompressor, data: List[int], rng: random.Random,
+                      sample: int) -> Dict[str, object]:
+    # Same operations as the timings, with the stats enabled
+    compressor.enable_stats()
     compressor.compress(data)
-    return compressor
-
-def run_benchmark() -> None:
-    # Runs the performance benchmarks as requested by the subject.
-    print("===== STARTING BENCHMARK =====")
-    print("Protocol: Using 'timeit' to run each function multiple times.")
-    print("This gives a reliable average time.")
-    print("Testing on a 10,000 integer dataset.")
+    compressor.decompress()
+    for i in range(sample):
+        compressor.get(i)
+    for _ in range(sample):
+        compressor.get(rng.randrange(len(data)))
+    stats = compressor.get_stats()
+    compressor.disable_stats()
+    return stats
+
+
+def run_suite(args: argparse.Namespace) -> List[Dict[str, object]]:
+    results: List[Dict[str, object]] = []
+    for size in args.sizes:
+        for distribution in args.distributions:
+            # Same dataset for every codec
+            rng = random.Random(f"{args.seed}-{distribution}-{size}")
+            data = DISTRIBUTIONS[distribution](size, rng)
+            for codec in args.codecs:
+                result = run_case(codec, distribution, data, args, rng)
+                results.append(result)
+                print(format_result(result))
+                if "stats" in result:
+                    print(format_stats(result["stats"]))
+                sys.stdout.flush()
+    return results
+
+
+# ---- Output ----
+
+def format_result(result: Dict[str, object]) -> str:
+    peak = result["peak_memory_bytes"]
+    peak_text = f"{peak / 1024:10.1f} KiB" if peak is not None else "           -"
+    return (f"  {result['codec']:<15} {result['engine']:<6} {result['distribution']:<8} {result['size']:>9}  "
+            f"compress {result['compress_s']:9.5f}s  decompress {result['decompress_s']:9.5f}s  "
+            f"get seq {result['get_sequential_s'] * 1e6:7.2f}us  get rnd {result['get_random_s'] * 1e6:7.2f}us  "
+            f"ratio {result['compression_ratio']:6.2f}  peak {peak_text}")
+
+
+def format_stats(stats: Dict[str, object]) -> str:
+    # Codec rates + decoded volume, on one line
+    rates = "  ".join(f"{name} {value:.2%}" for name, value in stats.items() if name.endswith("_rate"))
+    counters = stats["counters"]
+    return (f"      stats: {counters.get('values_decoded', 0)} values / "
+            f"{counters.get('bytes_decoded', 0)} bytes decoded  {rates}").rstrip()
+
+
+def save_results(results: List[Dict[str, object]], path: str, args: argparse.Namespace) -> None:
+    # JSON (with the run settings) or CSV, depending on the file extension
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            for result in results:
+                # The stats are nested: one JSON cell
+                if "stats" in result:
+                    result = dict(result, stats=json.dumps(result["stats"]))
+                writer.writerow(result)
+        return
+
+    document = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "engine": args.engine,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path: str) -> List[Dict[str, object]]:
+    # Read a file written by save_results()
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["size"] = int(row["size"])
+            for metric in TIME_METRICS + RATIO_METRICS:
+                row[metric] = float(row[metric]) if row.get(metric) not in (None, "", "None") else None
+        return rows
+    with open(path) as f:
+        document = json.load(f)
+    # Files written before the rows had an engine: the engine of the run
+    engine = document.get("meta", {}).get("engine", ENGINE_PYTHON)
+    for row in document["results"]:
+        row.setdefault("engine", codec_engine(row["codec"], engine))
+    return document["results"]
+
+
+def compare(results: List[Dict[str, object]], baseline: List[Dict[str, object]],
+            threshold: float) -> List[str]:
+    # Flag every metric that is worse than the baseline by more than 'threshold'
+    # Same codec, engine, distribution and size (a numpy run is never compared to a python one)
+    def key(result):
+        return (result["codec"], result.get("engine", ENGINE_PYTHON), result["distribution"], int(result["size"]))
+
+    previous = {key(result): result for result in baseline}
+    regressions: List[str] = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        name = "/".join(str(part) for part in key(result))
+        for metric in TIME_METRICS:
+            if result[metric] is None or old.get(metric) is None or not old[metric]:
+                continue
+            change = result[metric] / old[metric] - 1
+            if change > threshold:
+                regressions.append(f"{name} {metric}: {old[metric]:.6g} -> {result[metric]:.6g} (+{change:.0%})")
+        for metric in RATIO_METRICS:
+            if not old.get(metric):
+                continue
+            change = result[metric] / old[metric] - 1
+            if change < -threshold:
+                regressions.append(f"{name} {metric}: {old[metric]:.6g} -> {result[metric]:.6g} ({change:.0%})")
+    return regressions
+
+
+# ---- Parallel ----
+
+def run_parallel_benchmark(data_size: int = 1_000_000) -> None:
+    # Speedup of parallel=N against the number of cores
+    cores = os.cpu_count() or 1
+    print("===== PARALLEL BENCHMARK =====")
+    print(f"Dataset: {data_size} ints, {cores} core(s) available.")
     print("-" * 50)
 
-    # 1 - Prepare test data
-    k_prime: int = 10
-    max_normal: int = (1 << k_prime) - 1 # Max value for k'
-    data_size: int = 10000
-    test_data: List[int] = []
-    
-    # Create dataset with some overflow values
-    for _ in range(data_size):
-        if random.random() < 0.05: # 5% chance of overflow
-            test_data.append(random.randint(max_normal, max_normal * 10))
-        else:
-            test_data.append(random.randint(0, max_normal - 1))
-
-    print(f"Dataset created: {data_size} ints, k'={k_prime} bits.\n")
-    
-    compressors: Dict[str, IntegerCompressor] = {}
-    
-    # We need to pass the local/global variables to timeit
-    benchmark_context = globals().copy()
-    benchmark_context.update(locals())
-    
-    # 2 - Benchmark compress() 
-    print(f"--- Timing compress() [10 runs] ---")
-    
-    setup_code_spanning_compress = "compressor = CompressorFactory.create_compressor(COMPRESSOR_SPANNING)"
-    
-    # Run compress() 10 times
-    time_spanning_compress = timeit.timeit(
-        stmt="compressor.compress(test_data)", 
-        setup=setup_code_spanning_compress, 
-        globals=benchmark_context,
-        number=10
-    ) / 10
-    print(f"  {COMPRESSOR_SPANNING:<15}: {time_spanning_compress:.6f} seconds (avg over 10)")
-    
-    # Setup the compressor for later tests
-    compressors[COMPRESSOR_SPANNING] = setup_compressor(COMPRESSOR_SPANNING, test_data)
-
-    setup_code_overflow_compress = "compressor = CompressorFactory.create_compressor(COMPRESSOR_OVERFLOW, main_bits=k_prime)"
-    time_overflow_compress = timeit.timeit(
-        stmt="compressor.compress(test_data)", 
-        setup=setup_code_overflow_compress, 
-        globals=benchmark_context,
-        number=10
-    ) / 10
-    print(f"  {COMPRESSOR_OVERFLOW:<15}: {time_overflow_compress:.6f} seconds (avg over 10)")
-    compressors[COMPRESSOR_OVERFLOW] = setup_compressor(COMPRESSOR_OVERFLOW, test_data, main_bits=k_prime)
-    
-    print("\n")
-
-    #3 - Benchmark decompress()
-    print(f"--- Timing decompress() [100 runs] ---")
-    
-    # Run decompress() 100 times
-    time_spanning_decompress = timeit.timeit(
-        stmt="compressors[COMPRESSOR_SPANNING].decompress()",
-        setup="pass", # Compressor is already set up
-        globals=benchmark_context,
-        number=100
-    ) / 100
-    print(f"  {COMPRESSOR_SPANNING:<15}: {time_spanning_decompress:.6f} seconds (avg over 100)")
-
-    time_overflow_decompress = timeit.timeit(
-        stmt="compressors[COMPRESSOR_OVERFLOW].decompress()",
-        setup="pass",
-        globals=benchmark_context,
-        number=100
-    ) / 100
-    print(f"  {COMPRESSOR_OVERFLOW:<15}: {time_overflow_decompress:.6f} seconds (avg over 100)")
-    
-    print("\n")
-
-    # 4 - Benchmark get(i)
-    print(f"--- Timing get(i) [1000 runs] ---")
-    
-    setup_code_get = f"i = {data_size // 2}" # get middle element
-    
-    # Run get() 1000 times
-    time_spanning_get = timeit.timeit(
-        stmt="compressors[COMPRESSOR_SPANNING].get(i)",
-        setup=setup_code_get,
-        globals=benchmark_context,
-        number=1000
-    ) / 1000
-    print(f"  {COMPRESSOR_SPANNING:<15}: {time_spanning_get:.6f} seconds (avg over 1000)")
-
-    time_overflow_get = timeit.timeit(
-        stmt="compressors[COMPRESSOR_OVERFLOW].get(i)",
-        setup=setup_code_get,
-        globals=benchmark_context,
-        number=1000
-    ) / 1000
-    print(f"  {COMPRESSOR_OVERFLOW:<15}: {time_overflow_get:.6f} seconds (avg over 1000)")
-    
+    test_data: List[int] = [random.randint(0, (1 << 20) - 1) for _ in range(data_size)]
+
+    # 1, 2, 4, ... up to the number of cores (and the core count itself)
+    worker_counts = sorted({1 << p for p in range(cores.bit_length()) if (1 << p) <= cores} | {cores})
+
+    for compressor_name in (COMPRESSOR_SPANNING, COMPRESSOR_NON_SPANNING):
+        baseline_compress = baseline_decompress = 0.0
+        for workers in worker_counts:
+            compressor = CompressorFactory.create_compressor(compressor_name, parallel=workers)
+
+            start = time.perf_counter()
+            compressor.compress(test_data)
+            time_compress = time.perf_counter() - start
+
+            start = time.perf_counter()
+            compressor.decompress()
+            time_decompress = time.perf_counter() - start
+
+            if workers == 1:
+                baseline_compress, baseline_decompress = time_compress, time_decompress
+            print(f"  {compressor_name:<15} parallel={workers:<3}: "
+                  f"compress {time_compress:.3f}s (x{baseline_compress / time_compress:.2f}), "
+                  f"decompress {time_decompress:.3f}s (x{baseline_decompress / time_decompress:.2f})")
+
     print("-" * 50)
+    print("===== PARALLEL BENCHMARK FINISHED =====")
+
+
+# ---- Command line ----
+
+def parse_sizes(text: str) -> List[int]:
+    # "1e3,1e4" or "1000,10000"
+    return [int(float(part)) for part in text.split(",") if part.strip()]
+
+
+def parse_names(allowed: List[str]) -> Callable[[str], List[str]]:
+    def parse(text: str) -> List[str]:
+        names = [part.strip() for part in text.split(",") if part.strip()]
+        for name in names:
+            if name not in allowed:
+                raise argparse.ArgumentTypeError(f"unknown name '{name}' (allowed: {', '.join(allowed)})")
+        return names
+    return parse
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark suite for the integer compressors.")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help="comma-separated input sizes (default: 1e3,1e4,1e5)")
+    parser.add_argument("--full", action="store_true", help="use all the sizes from 1e3 to 1e7")
+    parser.add_argument("--distributions", type=parse_names(list(DISTRIBUTIONS)), default=list(DISTRIBUTIONS),
+                        help=f"comma-separated distributions (default: {','.join(DISTRIBUTIONS)})")
+    parser.add_argument("--codecs", type=parse_names(ALL_CODECS), default=ALL_CODECS,
+                        help=f"comma-separated codecs (default: {','.join(ALL_CODECS)})")
+    parser.add_argument("--engine", choices=["python", "numpy"], default="python",
+                        help="engine for the codecs that have one (default: python)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per compress/decompress timing (default: 3)")
+    parser.add_argument("--get-samples", type=int, default=1000, help="get(i) calls per access pattern (default: 1000)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the peak memory measure")
+    parser.add_argument("--stats", action="store_true",
+                        help="add the codec counters (word crossings, overflow hits...) to the results")
+    parser.add_argument("--seed", type=int, default=42, help="dataset seed (default: 42)")
+    parser.add_argument("--output", help="write the results to this .json or .csv file")
+    parser.add_argument("--baseline", help="compare with a previous .json/.csv result file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change flagged as a regression (default: 0.10)")
+    parser.add_argument("--parallel", action="store_true", help="also run the parallel=N speedup benchmark")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.full:
+        args.sizes = FULL_SIZES
+
+    print("===== STARTING BENCHMARK SUITE =====")
+    print(f"Codecs: {', '.join(args.codecs)}")
+    print(f"Distributions: {', '.join(args.distributions)}")
+    print(f"Sizes: {', '.join(str(size) for size in args.sizes)}")
+    print("-" * 50)
+
+    results = run_suite(args)
+
+    if args.output:
+        save_results(results, args.output, args)
+        print(f"Results written to {args.output}")
+
+    exit_code = 0
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        print("-" * 50)
+        if regressions:
+            print(f"REGRESSIONS against {args.baseline} (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print(f"No regression against {args.baseline} (threshold {args.threshold:.0%}).")
+
+    if args.parallel:
+        run_parallel_benchmark()
+
     print("===== BENCHMARK FINISHED =====")
+    return exit_code
+
 
 # Run the benchmark
 if __name__ == "__main__":
-    run_benchmark()
\ No newline at end of file
+    sys.exit(main())
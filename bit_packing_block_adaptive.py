@@ -0,0 +1,252 @@
+import math
+from array import array
+from typing import List, Tuple
+from integer_compressor import (IntegerCompressor, WORD_TYPECODES, check_value_bits, check_word_bits,
+                                count_in_range, predicate_bounds, select_in_range, writable, zero_array)
+from bit_packing_spanning import pack_values, unpack_values
+
+# Default number of values per block
+DEFAULT_BLOCK_SIZE = 128
+
+# This is the "block adaptive" version (frame of reference per block)
+# The data is cut in blocks, and each block stores:
+#   - its own min (the "frame of reference")
+#   - its own k = (max - min).bit_length()
+#   - the values (value - min) packed with the spanning layout
+# So one big value only makes its own block wider.
+class BitPackingBlockAdaptive(IntegerCompressor):
+
+    codec_name = "block_adaptive"
+
+    def __init__(self, block_size: int = DEFAULT_BLOCK_SIZE, word_bits: int = 32) -> None:
+        super().__init__()
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+
+        # A multiple of word_bits values always fills whole words,
+        # so every block starts on a word boundary
+        if block_size <= 0 or block_size % word_bits != 0:
+            raise ValueError(f"block_size must be a positive multiple of {word_bits}, got {block_size}")
+        self.block_size: int = block_size
+
+        # Block directory (one entry per block)
+        self.block_mins: array = array(WORD_TYPECODES[word_bits])  # Frame of reference
+        self.block_bits: array = array('B')     # k of the block (0 = all values equal)
+        self.block_offsets: array = array('I')  # First word of the block in compressed_data
+
+    def compress(self, data: List[int]) -> None:
+        typecode = WORD_TYPECODES[self.word_bits]
+        self.num_elements = 0
+        self.bits_per_element = 0
+        self.compressed_data = array(typecode)
+        self.block_mins = array(typecode)
+        self.block_bits = array('B')
+        self.block_offsets = array('I')
+
+        if len(data):
+            self._append_blocks(data.tolist() if hasattr(data, "tolist") else data)
+
+    def extend(self, values) -> None:
+        # Only the last block is packed again (if it is not full)
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        self._make_writable()
+
+        tail: List[int] = []
+        if self.num_elements % self.block_size:
+            # Reopen the last partial block: drop it from the directory and the words
+            tail = self.decompress_range(len(self.block_mins) * self.block_size - self.block_size,
+                                         self.num_elements)
+            del self.compressed_data[self.block_offsets[-1]:]
+            del self.block_mins[-1]
+            del self.block_bits[-1]
+            del self.block_offsets[-1]
+            self.num_elements -= len(tail)
+        self._append_blocks(tail + values)
+
+    def _append_blocks(self, data: List[int]) -> None:
+        # Add the blocks of 'data' after the last one
+        # (the column always ends on a block boundary here)
+        first_block = len(self.block_mins)
+        word_bits = self.word_bits
+
+        # 1 - Build the block directory
+        output_size = len(self.compressed_data)
+        for start in range(0, len(data), self.block_size):
+            block = data[start:start + self.block_size]
+            block_min = min(block)
+            block_max = max(block)
+            # The min is stored in a word too: check the widest value, not only k
+            check_value_bits(block_max.bit_length(), word_bits)
+            k = (block_max - block_min).bit_length()
+
+            self.block_mins.append(block_min)
+            self.block_bits.append(k)
+            self.block_offsets.append(output_size)
+            output_size += math.ceil(len(block) * k / word_bits)
+
+        # 2 - Pack each block at its offset
+        self.compressed_data.extend(zero_array(self.compressed_data.typecode,
+                                               output_size - len(self.compressed_data)))
+        for block_index, start in enumerate(range(0, len(data), self.block_size), first_block):
+            k = self.block_bits[block_index]
+            if k == 0:
+                # Constant block: the min is enough
+                continue
+            block_min = self.block_mins[block_index]
+            block = [val - block_min for val in data[start:start + self.block_size]]
+            pack_values(block, k, self.compressed_data, self.block_offsets[block_index], word_bits)
+
+        self.num_elements += len(data)
+        # Widest block, for information (the other codecs use one global k)
+        self.bits_per_element = max(self.bits_per_element, max(self.block_bits[first_block:]))
+
+    def _make_writable(self) -> None:
+        # Arrays loaded with mmap=True are read-only memoryviews: copy them once
+        self.compressed_data = writable(self.compressed_data)
+        self.block_mins = writable(self.block_mins)
+        self.block_bits = writable(self.block_bits)
+        self.block_offsets = writable(self.block_offsets)
+
+    def get(self, i: int) -> int:
+        if not (0 <= i < self.num_elements):
+            raise IndexError(f"Index {i} is out of bounds")
+
+        # 1 - Find the block in the directory (O(1))
+        block_index, index_in_block = divmod(i, self.block_size)
+        k = self.block_bits[block_index]
+        if k == 0:
+            return self.block_mins[block_index]
+
+        # 2 - Same read as the spanning version, inside the block
+        word_bits = self.word_bits
+        bit_cursor = index_in_block * k
+        array_index = self.block_offsets[block_index] + bit_cursor // word_bits
+        bit_offset = bit_cursor % word_bits
+
+        value = self.compressed_data[array_index] >> bit_offset
+        if bit_offset + k > word_bits:
+            value |= self.compressed_data[array_index + 1] << (word_bits - bit_offset)
+
+        return self.block_mins[block_index] + (value & ((1 << k) - 1))
+
+    def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+
+        result: List[int] = []
+        position = start
+        while position < stop:
+            # Decode the part of the block that overlaps [start, stop)
+            block_index, index_in_block = divmod(position, self.block_size)
+            count = min(self.block_size - index_in_block, stop - position)
+            block_min = self.block_mins[block_index]
+            k = self.block_bits[block_index]
+
+            if k == 0:
+                result.extend([block_min] * count)
+            else:
+                bit_cursor = self.block_offsets[block_index] * self.word_bits + index_in_block * k
+                offsets = unpack_values(self.compressed_data, bit_cursor, count, k, self.word_bits)
+                result.extend([block_min + offset for offset in offsets])
+
+            position += count
+
+        return result
+
+    # ---- Scan and aggregate operators ----
+    # The directory gives the range of every block: [min, min + 2^k - 1]
+    # so whole blocks can be skipped (or taken) without decoding them
+
+    def _block_range(self, block_index: int) -> Tuple[int, int, int, int]:
+        # (first position, number of values, smallest value, upper bound)
+        start = block_index * self.block_size
+        count = min(self.block_size, self.num_elements - start)
+        block_min = self.block_mins[block_index]
+        return start, count, block_min, block_min + (1 << self.block_bits[block_index]) - 1
+
+    def sum(self) -> int:
+        # Constant blocks are summed from the directory alone
+        total = 0
+        for block_index in range(len(self.block_mins)):
+            start, count, block_min, _ = self._block_range(block_index)
+            if self.block_bits[block_index] == 0:
+                total += block_min * count
+            else:
+                total += sum(self.decompress_range(start, start + count))
+        return total
+
+    def min(self) -> int:
+        # The frame of reference is the real min of its block
+        self._check_not_empty("min")
+        return min(self.block_mins)
+
+    def max(self) -> int:
+        self._check_not_empty("max")
+        best = -1
+        for block_index in range(len(self.block_mins)):
+            start, count, block_min, upper = self._block_range(block_index)
+            # Skip the blocks that cannot beat the current max
+            if upper > best:
+                best = max(best, max(self.decompress_range(start, start + count)))
+        return best
+
+    def count_where(self, lo=None, hi=None) -> int:
+        lo, hi = predicate_bounds(lo, hi)
+        count = 0
+        for block_index in range(len(self.block_mins)):
+            start, block_count, block_min, upper = self._block_range(block_index)
+            if upper < lo or block_min >= hi:
+                continue                     # No value can match
+            if lo <= block_min and upper < hi:
+                count += block_count         # Every value matches
+            else:
+                count += count_in_range(self.decompress_range(start, start + block_count), lo, hi)
+        return count
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        lo, hi = predicate_bounds(lo, hi)
+        indices: List[int] = []
+        for block_index in range(len(self.block_mins)):
+            start, block_count, block_min, upper = self._block_range(block_index)
+            if upper < lo or block_min >= hi:
+                continue
+            if lo <= block_min and upper < hi:
+                indices.extend(range(start, start + block_count))
+            else:
+                indices.extend(select_in_range(self.decompress_range(start, start + block_count),
+                                               start, lo, hi))
+        return indices
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["block_size"] = self.block_size
+        meta["word_bits"] = self.word_bits
+        arrays["block_mins"] = self.block_mins
+        arrays["block_bits"] = self.block_bits
+        arrays["block_offsets"] = self.block_offsets
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        self.block_mins = arrays["block_mins"]
+        self.block_bits = arrays["block_bits"]
+        self.block_offsets = arrays["block_offsets"]
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "BitPackingBlockAdaptive":
+        compressor = cls(block_size=meta["block_size"], word_bits=meta.get("word_bits", 32))
+        compressor._set_state(meta, arrays)
+        return compressor
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Packed values + block directory
+        return super().get_compressed_size_in_bytes() + self.get_directory_size_in_bytes()
+
+    def get_directory_size_in_bytes(self) -> int:
+        # Memory cost of the per-block headers (min, k, offset)
+        return sum(header.itemsize * len(header)
+                   for header in (self.block_mins, self.block_bits, self.block_offsets))
@@ -0,0 +1,271 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List
+from integer_compressor import (IntegerCompressor, WORD_TYPECODES, check_value_bits, check_word_bits,
+                                codec_from_state, predicate_bounds, writable)
+from bit_packing_spanning import BitPackingSpanning
+from numpy_engine import ENGINE_PYTHON
+from instrumentation import rate
+
+# Order of the dictionary
+DICTIONARY_SORTED = "sorted"        # Code order = value order: a value range is a code range
+DICTIONARY_FREQUENCY = "frequency"  # Most frequent value first: hot values get the smallest codes
+
+# Above this many distinct values, the codes are the values themselves (plain packing)
+DEFAULT_MAX_CARDINALITY = 4096
+
+
+def check_order(order: str) -> str:
+    # Validate the dictionary order given to the codec
+    if order not in (DICTIONARY_SORTED, DICTIONARY_FREQUENCY):
+        raise ValueError(f"Unknown dictionary order: '{order}'")
+    return order
+
+
+# This is the "dictionary" version, for low-cardinality columns
+# (status codes, region IDs...: a few distinct values, maybe big ones)
+# It is a Decorator (like the overflow version) around BitPackingSpanning:
+#   - 'dictionary' holds every distinct value once
+#   - the wrapped compressor packs, for every value, its code = its index
+#     in the dictionary, so a column with 40 distinct values costs 6 bits
+#     per value whatever the values are
+# The predicates (count_where, select_where) run on the codes: the value
+# range is turned into codes once, then only the codes are decoded.
+class BitPackingDictionary(IntegerCompressor):
+
+    codec_name = "dictionary"
+
+    def __init__(self, order: str = DICTIONARY_SORTED, max_cardinality: int = DEFAULT_MAX_CARDINALITY,
+                 engine: str = ENGINE_PYTHON, parallel: int = 1, word_bits: int = 32) -> None:
+        super().__init__()
+        if max_cardinality <= 0:
+            raise ValueError(f"max_cardinality must be positive, got {max_cardinality}")
+
+        self.order: str = check_order(order)
+        self.max_cardinality: int = max_cardinality
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+
+        # The compressor of the codes
+        self.wrapped_compressor: IntegerCompressor = BitPackingSpanning(engine=engine, parallel=parallel,
+                                                                        word_bits=word_bits)
+
+        # Code -> value (empty = fallback: the wrapped compressor holds the values)
+        self.dictionary: array = array(WORD_TYPECODES[word_bits])
+        # Value -> code, rebuilt from the dictionary when needed
+        self._codes: Dict[int, int] = {}
+
+    def compress(self, data: List[int]) -> None:
+        self.num_elements = len(data)
+        self.dictionary = array(WORD_TYPECODES[self.word_bits])
+        self._codes = {}
+
+        # 1 - Distinct values (+ their counts for the frequency order)
+        counts = Counter(data)
+        if counts and self._use_dictionary(len(counts), max(counts)):
+            if self.order == DICTIONARY_FREQUENCY:
+                # Most frequent first, ties by value (so the result does not depend on the input order)
+                values = sorted(counts, key=lambda value: (-counts[value], value))
+            else:
+                values = sorted(counts)
+            self.dictionary = array(WORD_TYPECODES[self.word_bits], values)
+            self._codes = {value: code for code, value in enumerate(values)}
+
+            # 2 - Pack the codes as they are looked up (no list of n codes)
+            code_bits = max((len(values) - 1).bit_length(), 1)
+            self.wrapped_compressor._compress_known_bits(map(self._codes.__getitem__, data),
+                                                         self.num_elements, code_bits)
+        else:
+            # Fallback: too many distinct values, plain packing
+            self.wrapped_compressor.compress(data)
+        self._sync()
+
+    def _use_dictionary(self, cardinality: int, max_value: int) -> bool:
+        # Dictionary only below the cardinality threshold, and only if it makes the column smaller
+        check_value_bits(max_value.bit_length(), self.word_bits)
+        if cardinality > self.max_cardinality:
+            return False
+        code_bits = max((cardinality - 1).bit_length(), 1)
+        plain_bits = max(max_value.bit_length(), 1)
+        dictionary_bits = cardinality * self.word_bits
+        return self.num_elements * code_bits + dictionary_bits < self.num_elements * plain_bits
+
+    def _sync(self) -> None:
+        # Copy the wrapped codec fields (bits_per_element = bits per code)
+        self.compressed_data = self.wrapped_compressor.compressed_data
+        self.bits_per_element = self.wrapped_compressor.bits_per_element
+
+    def is_fallback(self) -> bool:
+        # True if the column was packed without a dictionary
+        return self.num_elements > 0 and not self.dictionary
+
+    def code_of(self, value: int) -> int:
+        # Code of a value of the dictionary (KeyError if it is not in the column)
+        return self._value_codes()[value]
+
+    def _value_codes(self) -> Dict[int, int]:
+        # Value -> code (not saved: rebuilt the first time after load())
+        if len(self._codes) != len(self.dictionary):
+            self._codes = {value: code for code, value in enumerate(self.dictionary)}
+        return self._codes
+
+    # ---- Reads ----
+
+    def get(self, i: int) -> int:
+        if not (0 <= i < self.num_elements):
+            raise IndexError(f"Index {i} is out of bounds")
+        code = self.wrapped_compressor.get(i)
+        return self.dictionary[code] if self.dictionary else code
+
+    def get_many(self, indices) -> List[int]:
+        codes = self.wrapped_compressor.get_many(self._check_indices(indices))
+        return list(map(self.dictionary.__getitem__, codes)) if self.dictionary else codes
+
+    def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        codes = self.wrapped_compressor.decompress_range(start, stop)
+        return list(map(self.dictionary.__getitem__, codes)) if self.dictionary else codes
+
+    # ---- Append ----
+
+    def extend(self, values) -> None:
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        if self.num_elements == 0:
+            self.compress(values)
+            return
+
+        batch = values
+        if self.dictionary:
+            codes = self._value_codes()
+            new_values = sorted(set(values).difference(codes))
+            if new_values:
+                # Sorted order: the codes of the values already packed would change
+                if (self.order == DICTIONARY_SORTED
+                        or len(self.dictionary) + len(new_values) > self.max_cardinality):
+                    self.compress(self.decompress() + values)
+                    return
+                # Frequency order: the new values get the next codes
+                check_value_bits(new_values[-1].bit_length(), self.word_bits)
+                self.dictionary = writable(self.dictionary)
+                for value in new_values:
+                    codes[value] = len(self.dictionary)
+                    self.dictionary.append(value)
+            batch = list(map(codes.__getitem__, values))
+
+        # Fallback: the values go as they are (the wrapped codec widens k if needed)
+        self.wrapped_compressor.extend(batch)
+        self.num_elements += len(values)
+        self._sync()
+
+    # ---- Scans on the codes ----
+
+    def _matching_codes(self, lo, hi) -> List[int]:
+        # Codes of the dictionary values with lo <= v < hi
+        if self.order == DICTIONARY_SORTED:
+            return list(range(bisect_left(self.dictionary, lo), bisect_left(self.dictionary, hi)))
+        return [code for code, value in enumerate(self.dictionary) if lo <= value < hi]
+
+    def count_where(self, lo=None, hi=None) -> int:
+        if not self.dictionary:
+            return self.wrapped_compressor.count_where(lo, hi)
+        codes = self._matching_codes(*predicate_bounds(lo, hi))
+        if not codes:
+            return 0
+        if codes[-1] - codes[0] + 1 == len(codes):
+            # One code range (always with the sorted order): the wrapped codec scans it
+            return self.wrapped_compressor.count_where(codes[0], codes[-1] + 1)
+        table = self._code_table(codes)
+        return sum(sum(map(table.__getitem__, block)) for _, block in self.wrapped_compressor._iter_blocks())
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        if not self.dictionary:
+            return self.wrapped_compressor.select_where(lo, hi)
+        codes = self._matching_codes(*predicate_bounds(lo, hi))
+        if not codes:
+            return []
+        if codes[-1] - codes[0] + 1 == len(codes):
+            return self.wrapped_compressor.select_where(codes[0], codes[-1] + 1)
+        table = self._code_table(codes)
+        indices: List[int] = []
+        for block_start, block in self.wrapped_compressor._iter_blocks():
+            indices.extend(position for position, code in enumerate(block, block_start) if table[code])
+        return indices
+
+    def _code_table(self, codes: List[int]) -> bytes:
+        # table[code] = 1 if the code matches
+        table = bytearray(len(self.dictionary))
+        for code in codes:
+            table[code] = 1
+        return bytes(table)
+
+    def sum(self) -> int:
+        if not self.dictionary:
+            return self.wrapped_compressor.sum()
+        # Number of times each code is used, then one multiplication per distinct value
+        code_counts: Counter = Counter()
+        for _, block in self.wrapped_compressor._iter_blocks():
+            code_counts.update(block)
+        return sum(self.dictionary[code] * count for code, count in code_counts.items())
+
+    def min(self) -> int:
+        # Every value of the dictionary is in the column
+        self._check_not_empty("min")
+        return min(self.dictionary) if self.dictionary else self.wrapped_compressor.min()
+
+    def max(self) -> int:
+        self._check_not_empty("max")
+        return max(self.dictionary) if self.dictionary else self.wrapped_compressor.max()
+
+    # ---- Stats, size and serialization ----
+
+    def _record_get(self, i: int, stats) -> None:
+        self.wrapped_compressor._record_get(i, stats)
+
+    def _stats_gauges(self, counters):
+        gauges = self.wrapped_compressor._stats_gauges(counters)
+        gauges["cardinality"] = len(self.dictionary)
+        gauges["dictionary_fallback"] = self.is_fallback()
+        gauges["dictionary_share"] = rate(self.get_dictionary_size_in_bytes(), self.get_compressed_size_in_bytes())
+        return gauges
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Packed codes + dictionary
+        return self.wrapped_compressor.get_compressed_size_in_bytes() + self.get_dictionary_size_in_bytes()
+
+    def get_dictionary_size_in_bytes(self) -> int:
+        return self.dictionary.itemsize * len(self.dictionary)
+
+    def _get_state(self):
+        # Our own fields + the full state of the wrapped codec (it can have segments)
+        wrapped_meta, wrapped_arrays = self.wrapped_compressor._get_state()
+        meta = {
+            "num_elements": self.num_elements,
+            "order": self.order,
+            "max_cardinality": self.max_cardinality,
+            "word_bits": self.word_bits,
+            "wrapped_codec": self.wrapped_compressor.codec_name,
+            "wrapped_meta": wrapped_meta,
+        }
+        arrays = {"dictionary": self.dictionary}
+        for name, data in wrapped_arrays.items():
+            arrays["wrapped." + name] = data
+        return meta, arrays
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "BitPackingDictionary":
+        wrapped_arrays = {name[len("wrapped."):]: data for name, data in arrays.items()
+                          if name.startswith("wrapped.")}
+        compressor = cls(order=meta["order"], max_cardinality=meta["max_cardinality"],
+                         word_bits=meta["word_bits"])
+        compressor.wrapped_compressor = codec_from_state(meta["wrapped_codec"], meta["wrapped_meta"],
+                                                         wrapped_arrays)
+        compressor.num_elements = meta["num_elements"]
+        compressor.dictionary = arrays["dictionary"]
+        compressor._sync()
+        return compressor
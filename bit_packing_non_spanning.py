@@ -1,21 +1,119 @@
 import math
 from array import array
 from typing import List
-from integer_compressor import IntegerCompressor 
+from integer_compressor import WORD_TYPECODES, check_value_bits, check_word_bits, zero_array
+from appendable import AppendableBitPacking, WIDEN_SEGMENT
+import numpy_engine
+import parallel_engine
+import unpack_kernels
+from numpy_engine import ENGINE_PYTHON, ENGINE_NUMPY
+
+# Shared helpers for the non-spanning layout
+
+def pack_values(data: List[int], k: int, output: array, word_bits: int = 32, start: int = 0) -> None:
+    # Write the values with k bits each, word_bits // k values per int,
+    # the first one at element 'start' (to append to packed values)
+    # The bits to write must be zero in 'output'
+    output_index, index_in_int = divmod(start, word_bits // k)
+    bit_offset = index_in_int * k
+    
+    # Mask to keep only k bits
+    mask = (1 << k) - 1
+
+    for val in data:
+        # Check if we need to move to the next word
+        if bit_offset + k > word_bits:
+            # Move to next int
+            output_index += 1
+            bit_offset = 0
+
+        # Get value and mask it
+        value = val & mask
+        
+        # Shift it to its position and add it with a bitwise OR
+        output[output_index] |= (value << bit_offset)
+
+        # Move the bit "cursor" for the next number
+        bit_offset += k
+
+
+def unpack_values(words: array, start: int, count: int, k: int, word_bits: int = 32) -> List[int]:
+    # Read 'count' values of k bits each, starting at element 'start'
+    if count < unpack_kernels.MIN_KERNEL_VALUES:
+        return _unpack_loop(words, start, count, k, word_bits)
+
+    # 1 - Head: the values before the next word
+    elements_per_int = word_bits // k
+    head = min(-start % elements_per_int, count)
+    result = _unpack_loop(words, start, head, k, word_bits)
+
+    # 2 - Full words with the kernel for k
+    num_words = (count - head) // elements_per_int
+    unpack_kernels.non_spanning_kernel(k, word_bits)(words, (start + head) // elements_per_int,
+                                                     num_words, result)
+
+    # 3 - Tail: the values of the last partial word
+    done = head + num_words * elements_per_int
+    result.extend(_unpack_loop(words, start + done, count - done, k, word_bits))
+    return result
+
+
+def _unpack_loop(words: array, start: int, count: int, k: int, word_bits: int) -> List[int]:
+    # Generic decoder (any k, any position), used for short runs
+    result: List[int] = []
+    if count == 0:
+        return result
+
+    mask = (1 << k) - 1
+    elements_per_int = word_bits // k
+
+    # 1 - Jump to the first word
+    array_index, index_in_int = divmod(start, elements_per_int)
+    word = words[array_index] >> (index_in_int * k)
+    left_in_int = elements_per_int - index_in_int
+
+    # 2 - Decode sequentially, word by word
+    for _ in range(count):
+        if left_in_int == 0:
+            array_index += 1
+            word = words[array_index]
+            left_in_int = elements_per_int
+        result.append(word & mask)
+        word >>= k
+        left_in_int -= 1
+
+    return result
+
 
 # This is the "non-spanning" version
-# Compressed ints do not span across two 32-bit ints.
-class BitPackingNonSpanning(IntegerCompressor):
+# Compressed ints do not span across two 32-bit (or 64-bit) ints.
+class BitPackingNonSpanning(AppendableBitPacking):
 
-    def __init__(self) -> None:
-        super().__init__()
-        # How many elements we can fit in one 32-bit int
+    codec_name = "non_spanning"
+
+    def __init__(self, engine: str = ENGINE_PYTHON, parallel: int = 1, word_bits: int = 32,
+                 widen: str = WIDEN_SEGMENT) -> None:
+        # widen: what extend() does when a value needs a wider k (see appendable.py)
+        super().__init__(widen)
+        # Size of the storage words: 32 ('I') or 64 ('Q')
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+        # How many elements we can fit in one word
         self.elements_per_int: int = 0
+        # "python" (loops) or "numpy" (vectorized, same layout)
+        self.engine: str = numpy_engine.check_engine(engine)
+        # Number of worker processes for big inputs (Python engine only)
+        self.parallel: int = parallel_engine.check_parallel(parallel)
 
     def compress(self, data: List[int]) -> None:
+        self._reset_segments()
+        if self.engine == ENGINE_NUMPY:
+            self._compress_numpy(data)
+            return
+
         if not data:
             self.num_elements = 0
-            self.compressed_data = array('I')
+            self.compressed_data = array(WORD_TYPECODES[self.word_bits])
             return
 
         self.num_elements = len(data)
@@ -28,56 +126,145 @@ class BitPackingNonSpanning(IntegerCompressor):
             self.bits_per_element = 1 
         else:
             self.bits_per_element = max_val.bit_length() 
+        check_value_bits(self.bits_per_element, self.word_bits)
 
-        # 3 - How many elements per 32-bit int?
+        # 3 - How many elements per word?
         # This is the main logic for "non-spanning" 
-        self.elements_per_int = 32 // self.bits_per_element # ex: 32 // 3 = 10 elements
+        self.elements_per_int = self.word_bits // self.bits_per_element # ex: 32 // 3 = 10 elements
 
         # 4 - Size of the output array
         output_size = math.ceil(self.num_elements / self.elements_per_int)
-        self.compressed_data = array('I', [0] * output_size) 
+        if parallel_engine.use_parallel(self.parallel, self.num_elements):
+            # Same layout, packed by several processes
+            self.compressed_data = parallel_engine.parallel_pack(
+                parallel_engine.LAYOUT_NON_SPANNING, data, self.bits_per_element, self.parallel, self.word_bits)
+            return
+        self.compressed_data = zero_array(WORD_TYPECODES[self.word_bits], output_size)
 
         # 5 - Fill the array
-        output_index = 0
-        bit_offset = 0
-        
-        # Mask to keep only k bits
-        mask = (1 << self.bits_per_element) - 1
-
-        for i in range(self.num_elements):
-            # Check if we need to move to the next 32-bit int
-            if bit_offset + self.bits_per_element > 32:
-                # Move to next int
-                output_index += 1
-                bit_offset = 0
-
-            # Get value and mask it
-            value = data[i] & mask
-            
-            # Shift it to its position and add it with a bitwise OR
-            self.compressed_data[output_index] |= (value << bit_offset)
-
-            # Move the bit "cursor" for the next number
-            bit_offset += self.bits_per_element
+        pack_values(data, self.bits_per_element, self.compressed_data, self.word_bits)
 
     def get(self, i: int) -> int:
         if not (0 <= i < self.num_elements):
             raise IndexError(f"Index {i} is out of bounds")
+        if self.segment_starts:
+            return self._get_segmented(i)
 
         # 1 - Find the index in the compressed array
-        array_index = i // self.elements_per_int
+        #     and the index inside that word (one divmod)
+        array_index, index_in_int = divmod(i, self.elements_per_int)
 
-        # 2 - Find the offset inside that 32-bit int
-        index_in_int = i % self.elements_per_int
-        bit_offset = index_in_int * self.bits_per_element
+        # 2 - Find the offset inside that word
+        k = self.bits_per_element
+        bit_offset = index_in_int * k
 
         # 3 - Extract the value
-        mask = (1 << self.bits_per_element) - 1
-        # Shift all the way to the right, then mask
-        value = (self.compressed_data[array_index] >> bit_offset) & mask
+        # Shift all the way to the right, then mask (precomputed mask)
+        value = (self.compressed_data[array_index] >> bit_offset) & unpack_kernels.MASKS[k]
         
         return value
 
+    def get_many(self, indices) -> List[int]:
+        if self.segment_starts:
+            return [self._get_segmented(i) for i in self._check_indices(indices)]
+        if self.engine == ENGINE_NUMPY:
+            positions = numpy_engine.check_indices(indices, self.num_elements)
+            if len(positions) == 0:
+                # Nothing to read (and k may be 0 if nothing was compressed)
+                return []
+            words = numpy_engine.array_to_words(self.compressed_data)
+            values = numpy_engine.gather_non_spanning(words, positions, self.bits_per_element, self.word_bits)
+            return numpy_engine.to_list(values)
+
+        indices = self._check_indices(indices)
+        result: List[int] = [0] * len(indices)
+
+        k = self.bits_per_element
+        mask = (1 << k) - 1
+        elements_per_int = self.elements_per_int
+        words = self.compressed_data
+
+        # Consecutive indices that live in the same word
+        # reuse the same read (no sort: it costs more than it saves)
+        current_index = -1
+        word = 0
+        for position, i in enumerate(indices):
+            array_index, index_in_int = divmod(i, elements_per_int)
+            if array_index != current_index:
+                word = words[array_index]
+                current_index = array_index
+            result[position] = (word >> (index_in_int * k)) & mask
+
+        return result
+
     def decompress(self) -> List[int]:
-        # Just loop and call get() for each element
-        return [self.get(i) for i in range(self.num_elements)]
\ No newline at end of file
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        if self.segment_starts:
+            return self._decompress_range_segmented(start, stop)
+        if self.engine == ENGINE_NUMPY:
+            return self._decompress_range_numpy(start, stop)
+
+        if parallel_engine.use_parallel(self.parallel, stop - start):
+            return parallel_engine.parallel_unpack(parallel_engine.LAYOUT_NON_SPANNING, self.compressed_data,
+                                                   start, stop, self.bits_per_element, self.parallel,
+                                                   self.word_bits)
+
+        return unpack_values(self.compressed_data, start, stop - start, self.bits_per_element, self.word_bits)
+
+    # Layout hooks for append() / extend()
+    # A segment starts on a word boundary, so its values are numbered
+    # from start_word * elements_per_int in the non-spanning layout
+
+    def _words_for(self, count: int, k: int) -> int:
+        return math.ceil(count / (self.word_bits // k))
+
+    def _pack_at(self, values: List[int], k: int, start_word: int, first_element: int) -> None:
+        pack_values(values, k, self.compressed_data, self.word_bits,
+                    start_word * (self.word_bits // k) + first_element)
+        # elements_per_int of the last segment, like after compress()
+        self.elements_per_int = self.word_bits // k
+
+    def _unpack_at(self, start_word: int, first_element: int, count: int, k: int) -> List[int]:
+        return unpack_values(self.compressed_data, start_word * (self.word_bits // k) + first_element,
+                             count, k, self.word_bits)
+
+    def _bit_position(self, start_word: int, first_element: int, k: int) -> int:
+        word, index_in_int = divmod(first_element, self.word_bits // k)
+        return (start_word + word) * self.word_bits + index_in_int * k
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["elements_per_int"] = self.elements_per_int
+        meta["word_bits"] = self.word_bits
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        self.elements_per_int = meta["elements_per_int"]
+        # Files written before 64-bit words existed have no "word_bits"
+        self.word_bits = meta.get("word_bits", 32)
+
+    def _compress_numpy(self, data: List[int]) -> None:
+        # Vectorized version of compress(), bit-identical output
+        values = numpy_engine.to_numpy(data)
+        self.num_elements = len(values)
+        if self.num_elements == 0:
+            self.compressed_data = array(WORD_TYPECODES[self.word_bits])
+            return
+
+        self.bits_per_element = numpy_engine.bits_for(values)
+        check_value_bits(self.bits_per_element, self.word_bits)
+        self.elements_per_int = self.word_bits // self.bits_per_element
+        words = numpy_engine.pack_non_spanning(values, self.bits_per_element, self.word_bits)
+        self.compressed_data = numpy_engine.words_to_array(words, self.word_bits)
+
+    def _decompress_range_numpy(self, start: int, stop: int) -> List[int]:
+        # Vectorized version of decompress_range()
+        if start == stop:
+            return []
+        values = numpy_engine.unpack_non_spanning_range(self.compressed_data, start, stop,
+                                                        self.bits_per_element, self.word_bits)
+        return numpy_engine.to_list(values)
\ No newline at end of file
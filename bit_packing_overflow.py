@@ -1,62 +1,286 @@
 import math
 from array import array
-from typing import List, Tuple
-from integer_compressor import IntegerCompressor
-from bit_packing_spanning import BitPackingSpanning 
+# itertools.compress() is renamed: compress() is the method of every codec here
+from itertools import chain, compress as keep_selected, repeat
+from operator import ge
+from typing import List, Tuple, Union
+from integer_compressor import (IntegerCompressor, WORD_TYPECODES, check_value_bits, check_word_bits,
+                                count_in_range, predicate_bounds, select_in_range, writable, zero_array)
+from bit_packing_spanning import BitPackingSpanning
+import numpy_engine
+from numpy_engine import ENGINE_PYTHON, ENGINE_NUMPY
+from instrumentation import rate
+
+# Number of positions covered by one word of the sentinel bitmap
+RANK_BLOCK_SIZE = 64
+
+# main_bits value that lets compress() choose k' from the data
+MAIN_BITS_AUTO = "auto"
+
+
+def predict_overflow_size(num_elements: int, main_bits: int, num_overflow: int,
+                          word_bits: int = 32) -> int:
+    # Exact size in bytes of an overflow compressor for a given k'
+    # (same rules as compress() and get_compressed_size_in_bytes())
+    # main area: n values + the fake max value, k' bits each
+    word_size = word_bits // 8
+    main_size = math.ceil((num_elements + 1) * main_bits / word_bits) * word_size
+    overflow_size = num_overflow * word_size
+    # rank index: one 64-bit bitmap word + one 32-bit count per block
+    index_size = 0
+    if num_overflow > 0:
+        index_size = math.ceil(num_elements / RANK_BLOCK_SIZE) * (8 + 4)
+    return main_size + overflow_size + index_size
+
+
+def choose_main_bits(bit_length_counts: List[int], all_ones_counts: List[int],
+                     num_elements: int, word_bits: int = 32) -> Tuple[int, int]:
+    # Pick the k' that gives the smallest total size
+    # bit_length_counts[b] = number of values with bit_length() == b
+    # all_ones_counts[b]   = number of values equal to (1 << b) - 1
+    # Returns (k', predicted size in bytes)
+    max_bits = max((b for b, count in enumerate(bit_length_counts) if count), default=0)
+
+    best_bits = 1
+    best_size = -1
+    # Values wider than k' go to the overflow area, plus the values
+    # equal to the sentinel (1 << k') - 1 itself
+    wider_count = num_elements - bit_length_counts[0]
+    for main_bits in range(1, min(max_bits + 1, word_bits) + 1):
+        wider_count -= bit_length_counts[main_bits] if main_bits < len(bit_length_counts) else 0
+        num_overflow = wider_count
+        if main_bits < len(all_ones_counts):
+            num_overflow += all_ones_counts[main_bits]
+        size = predict_overflow_size(num_elements, main_bits, num_overflow, word_bits)
+        if best_size < 0 or size < best_size:
+            best_bits = main_bits
+            best_size = size
+
+    return best_bits, best_size
 
 # This is the "overflow" version
 # I used the "Decorator" design pattern
 # to wrap around the BitPackingSpanning compressor
 class BitPackingOverflow(IntegerCompressor):
 
-    def __init__(self, main_bits: int) -> None:
+    codec_name = "overflow"
+
+    def __init__(self, main_bits: Union[int, str], engine: str = ENGINE_PYTHON,
+                 parallel: int = 1, word_bits: int = 32) -> None:
         super().__init__()
+
+        # "python" (loops) or "numpy" (vectorized, same layout)
+        self.engine: str = numpy_engine.check_engine(engine)
+
+        # Size of the storage words, for the main area and the overflow area
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
         
         # The wrapped compressor
-        self.wrapped_compressor: IntegerCompressor = BitPackingSpanning()
+        # (it also does the parallel pack/unpack of the main area)
+        self.wrapped_compressor: IntegerCompressor = BitPackingSpanning(engine=engine, parallel=parallel,
+                                                                        word_bits=word_bits)
         
         # Number of bits for the main area (k')
-        self.main_bits: int = main_bits
+        # With "auto", k' is chosen by compress() to minimize the total size
+        self.auto_main_bits: bool = main_bits == MAIN_BITS_AUTO
+        self.main_bits: int = 0
+        self.overflow_sentinel: int = 0
+        if not self.auto_main_bits:
+            check_value_bits(main_bits, word_bits)
+            self._set_main_bits(main_bits)
+
+        # Size announced by the cost model when k' is chosen automatically
+        self.predicted_size_in_bytes: int = 0
+        
+        # Array to store the "big" numbers (one full word each)
+        self.overflow_area: array = array(WORD_TYPECODES[word_bits])
+
+        # Rank index over the sentinel positions
+        # Bit j of sentinel_bitmap[b] is set if element b*64 + j is a sentinel
+        # sentinel_ranks[b] is the number of sentinels before block b
+        self.sentinel_bitmap: array = array('Q')
+        self.sentinel_ranks: array = array('I')
+
+    def _set_main_bits(self, main_bits: int) -> None:
+        self.main_bits = main_bits
         
         # The sentinel value
         # Values >= this will go to the overflow area
-        self.overflow_sentinel: int = (1 << main_bits) - 1
-        
-        # Array to store the "big" numbers
-        self.overflow_area: array = array('I')
+        self.overflow_sentinel = (1 << main_bits) - 1
+
+    def _select_main_bits(self, data: List[int]) -> None:
+        # One pass over the data to build the bit-length histogram,
+        # then the cost model picks the best k'
+        if self.engine == ENGINE_NUMPY:
+            bit_length_counts, all_ones_counts = self._bit_length_histogram_numpy(data)
+        else:
+            bit_length_counts = [0] * (self.word_bits + 1)
+            all_ones_counts = [0] * (self.word_bits + 1)
+            for val in data:
+                bits = val.bit_length()
+                if bits > self.word_bits:
+                    check_value_bits(bits, self.word_bits)
+                bit_length_counts[bits] += 1
+                if val & (val + 1) == 0:
+                    # val is (1 << bits) - 1, it would be a sentinel for k' = bits
+                    all_ones_counts[bits] += 1
+
+        main_bits, self.predicted_size_in_bytes = choose_main_bits(
+            bit_length_counts, all_ones_counts, len(data), self.word_bits)
+        self._set_main_bits(main_bits)
+
+    def _bit_length_histogram_numpy(self, data: List[int]) -> Tuple[List[int], List[int]]:
+        # Vectorized version of the histogram in _select_main_bits()
+        np = numpy_engine.np
+        values = numpy_engine.to_numpy(data)
+        # bit_length(v) = number of powers of two <= v
+        powers = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+        bit_lengths = np.searchsorted(powers, values, side='right')
+        all_ones = (values & (values + np.uint64(1))) == 0
+        bit_length_counts = np.bincount(bit_lengths, minlength=65).tolist()
+        all_ones_counts = np.bincount(bit_lengths[all_ones], minlength=65).tolist()
+        check_value_bits(numpy_engine.bits_for(values), self.word_bits)
+        return bit_length_counts, all_ones_counts
 
     def compress(self, data: List[int]) -> None:
+        if self.auto_main_bits and len(data) > 0:
+            self._select_main_bits(data)
+
+        if self.engine == ENGINE_NUMPY:
+            self._compress_numpy(data)
+            return
+
+        typecode = WORD_TYPECODES[self.word_bits]
         if not data:
             self.num_elements = 0
-            self.compressed_data = array('I')
+            self.compressed_data = array(typecode)
+            self.overflow_area = array(typecode)
+            self.sentinel_bitmap = array('Q')
+            self.sentinel_ranks = array('I')
             return
 
         self.num_elements = len(data)
-        
-        # 1 - Split the data into two lists
+        k = self.main_bits
+        sentinel = self.overflow_sentinel
+
+        # 1 - Pre-pass: positions of the overflow values (the loop runs in C:
+        # keep_selected() keeps the positions where val >= sentinel),
+        # kept in a flat array so overflow-heavy inputs stay small
+        overflow_positions = array('Q', keep_selected(range(self.num_elements),
+                                                      map(ge, data, repeat(sentinel))))
+
+        # An overflow value must fit in one word, never truncate it
+        overflow_area = array(typecode)
+        if overflow_positions:
+            check_value_bits(max(map(data.__getitem__, overflow_positions)).bit_length(), self.word_bits)
+            overflow_area = array(typecode, map(data.__getitem__, overflow_positions))
+
+        # 2 - Main area, in one packing pass: every value (the sentinel for an
+        # overflow value) + the fake max value (sentinel - 1, so the main area
+        # always has k' bits), packed in place by the wrapped compressor
+        main_values = (val if val < sentinel else sentinel for val in data)
+        self.wrapped_compressor._compress_known_bits(chain(main_values, [sentinel - 1]),
+                                                     self.num_elements + 1, k)
+        main_words = self.wrapped_compressor.compressed_data
+
+        # 3 - Store the results
+        self.compressed_data = main_words
+        self.overflow_area = overflow_area
+        self.bits_per_element = self.wrapped_compressor.bits_per_element
+
+        # 4 - Build the rank index (only needed if we have overflow values)
+        if overflow_positions:
+            sentinel_bitmap = zero_array('Q', math.ceil(self.num_elements / RANK_BLOCK_SIZE))
+            for i in overflow_positions:
+                sentinel_bitmap[i // RANK_BLOCK_SIZE] |= 1 << (i % RANK_BLOCK_SIZE)
+            self.sentinel_bitmap = sentinel_bitmap
+            self.sentinel_ranks = self._build_sentinel_ranks(sentinel_bitmap)
+        else:
+            self.sentinel_bitmap = array('Q')
+            self.sentinel_ranks = array('I')
+
+    def extend(self, values) -> None:
+        # k' never changes: a new value that does not fit goes to the overflow area
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        if self.num_elements == 0:
+            self.compress(values)
+            return
+
+        # 1 - Split the batch, like compress()
+        old_num_elements = self.num_elements
         main_data: List[int] = []
         overflow_list: List[int] = []
-        
-        for val in data:
+        overflow_positions: List[int] = []
+        for i, val in enumerate(values, old_num_elements):
             if val < self.overflow_sentinel:
-                # Normal value
                 main_data.append(val)
             else:
-                # Overflow value
-                main_data.append(self.overflow_sentinel) # Write sentinel
-                overflow_list.append(val)                # Store real value
-        
-        # 2 - Compress the main data
-        # Use the wrapped compressor
-        fake_max_val_data = list(main_data)
-        fake_max_val_data.append(self.overflow_sentinel - 1)
-        
-        self.wrapped_compressor.compress(fake_max_val_data)
-        
-        # 3 - Store the results
+                main_data.append(self.overflow_sentinel)
+                overflow_list.append(val)
+                overflow_positions.append(i)
+        if overflow_list:
+            check_value_bits(max(overflow_list).bit_length(), self.word_bits)
+
+        # 2 - Main area: move the fake max value after the new values
+        # (all the main values fit in k', so the wrapped codec never widens)
+        main_data.append(self.overflow_sentinel - 1)
+        self.wrapped_compressor._truncate(old_num_elements)
+        self.wrapped_compressor.extend(main_data)
         self.compressed_data = self.wrapped_compressor.compressed_data
-        self.overflow_area = array('I', overflow_list)
-        self.bits_per_element = self.wrapped_compressor.bits_per_element
+        self.num_elements = old_num_elements + len(values)
+
+        # 3 - Overflow area + rank index
+        if overflow_list:
+            self.overflow_area = writable(self.overflow_area)
+            self.overflow_area.extend(overflow_list)
+        if self.overflow_area:
+            self._extend_sentinel_index(old_num_elements, overflow_positions)
+
+    def _extend_sentinel_index(self, old_num_elements: int, overflow_positions: List[int]) -> None:
+        # Add the new blocks to the bitmap, set the new sentinels and
+        # update the prefix counts from the first block that changed
+        # (the first overflow value also builds the empty index of the old values)
+        sentinel_bitmap = writable(self.sentinel_bitmap)
+        sentinel_ranks = writable(self.sentinel_ranks)
+        num_blocks = math.ceil(self.num_elements / RANK_BLOCK_SIZE)
+        first_block = min(len(sentinel_bitmap), old_num_elements // RANK_BLOCK_SIZE)
+        missing = num_blocks - len(sentinel_bitmap)
+        sentinel_bitmap.frombytes(bytes(missing * sentinel_bitmap.itemsize))
+        sentinel_ranks.frombytes(bytes(missing * sentinel_ranks.itemsize))
+
+        for i in overflow_positions:
+            sentinel_bitmap[i // RANK_BLOCK_SIZE] |= 1 << (i % RANK_BLOCK_SIZE)
+
+        running_count = 0
+        if first_block > 0:
+            running_count = sentinel_ranks[first_block - 1] + sentinel_bitmap[first_block - 1].bit_count()
+        for block in range(first_block, num_blocks):
+            sentinel_ranks[block] = running_count
+            running_count += sentinel_bitmap[block].bit_count()
+
+        self.sentinel_bitmap = sentinel_bitmap
+        self.sentinel_ranks = sentinel_ranks
+
+    @staticmethod
+    def _build_sentinel_ranks(sentinel_bitmap: array) -> array:
+        # Prefix count of sentinels before each block
+        sentinel_ranks = zero_array('I', len(sentinel_bitmap))
+        running_count = 0
+        for block, bits in enumerate(sentinel_bitmap):
+            sentinel_ranks[block] = running_count
+            running_count += bits.bit_count()
+        return sentinel_ranks
+
+    def _overflow_index(self, i: int) -> int:
+        # Number of sentinels before position i, in O(1):
+        # prefix count of the block + popcount of the lower bits in the block
+        block = i // RANK_BLOCK_SIZE
+        lower_bits_mask = (1 << (i % RANK_BLOCK_SIZE)) - 1
+        in_block = self.sentinel_bitmap[block] & lower_bits_mask
+        return self.sentinel_ranks[block] + in_block.bit_count()
 
 
     def get(self, i: int) -> int:
@@ -68,29 +292,255 @@ class BitPackingOverflow(IntegerCompressor):
         
         # 2 - Check if it's a sentinel
         if value == self.overflow_sentinel:
-            overflow_index = 0
-            for j in range(i):
-                if self.wrapped_compressor.get(j) == self.overflow_sentinel:
-                    overflow_index += 1
-            
-            # This count is the index in the overflow_area
-            return self.overflow_area[overflow_index]
+            # The rank of i among sentinels is the index in the overflow_area
+            return self.overflow_area[self._overflow_index(i)]
         else:
             # 3 - Otherwise, it's a normal value
             return value
 
+    def _record_get(self, i: int, stats) -> None:
+        # Word crossings of the main area + overflow hits
+        self.wrapped_compressor._record_get(i, stats)
+        if self.sentinel_bitmap and (self.sentinel_bitmap[i // RANK_BLOCK_SIZE] >> (i % RANK_BLOCK_SIZE)) & 1:
+            stats.add("overflow_hits")
+            # Every hit reads the rank index once (_overflow_index)
+            stats.add("index_lookups")
+
+    def _stats_gauges(self, counters):
+        gauges = self.wrapped_compressor._stats_gauges(counters)
+        # Share of the values stored in the overflow area / share of the get() that went there
+        gauges["overflow_rate"] = rate(len(self.overflow_area), self.num_elements)
+        gauges["overflow_hit_rate"] = rate(counters.get("overflow_hits", 0), counters.get("gets", 0))
+        return gauges
+
+    def get_many(self, indices) -> List[int]:
+        # 1 - Read all the main values with the wrapped compressor
+        # (we check the bounds here: the wrapped one has one extra element)
+        indices = self._check_indices(indices)
+        result = self.wrapped_compressor.get_many(indices)
+
+        # 2 - Resolve the sentinels in one pass
+        # Consecutive sentinels in the same block share the bitmap word
+        # and its prefix count (the rank index makes each lookup O(1),
+        # so we don't need to sort the indices)
+        sentinel = self.overflow_sentinel
+        sentinel_bitmap = self.sentinel_bitmap
+        sentinel_ranks = self.sentinel_ranks
+        overflow_area = self.overflow_area
+
+        current_block = -1
+        block_bits = 0
+        block_rank = 0
+        for position, value in enumerate(result):
+            if value != sentinel:
+                continue
+            i = indices[position]
+            block = i // RANK_BLOCK_SIZE
+            if block != current_block:
+                block_bits = sentinel_bitmap[block]
+                block_rank = sentinel_ranks[block]
+                current_block = block
+            in_block = block_bits & ((1 << (i % RANK_BLOCK_SIZE)) - 1)
+            result[position] = overflow_area[block_rank + in_block.bit_count()]
+
+        return result
+
     def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        if start == stop:
+            return []
+        if self.engine == ENGINE_NUMPY:
+            return self._decompress_range_numpy(start, stop)
+
         decompressed_list: List[int] = []
-        
-        # Simple loop calling get()
-        for i in range(self.num_elements):
-            value = self.get(i)
+
+        # Single pass: the overflow values appear in the same order
+        # as the sentinels, so we start at the rank of 'start'
+        # in the overflow area and then use a running counter
+        main_values = self.wrapped_compressor.decompress_range(start, stop)
+        overflow_index = self._overflow_index(start) if self.overflow_area else 0
+        for value in main_values:
+            if value == self.overflow_sentinel:
+                value = self.overflow_area[overflow_index]
+                overflow_index += 1
             decompressed_list.append(value)
                 
         return decompressed_list
 
+    # ---- Scan and aggregate operators ----
+    # Every overflow value is >= the sentinel and every main value is < the sentinel,
+    # so a range predicate tells us which of the two areas we can skip
+
+    def _iter_main_blocks(self):
+        # Blocks of the main area (without the fake max value)
+        return self.wrapped_compressor._iter_blocks(0, self.num_elements)
+
+    def sum(self) -> int:
+        # Main values + overflow values - the sentinels written in their place
+        main_sum = sum(sum(block) for _, block in self._iter_main_blocks())
+        return main_sum - len(self.overflow_area) * self.overflow_sentinel + sum(self.overflow_area)
+
+    def min(self) -> int:
+        self._check_not_empty("min")
+        main_min = min(min(block) for _, block in self._iter_main_blocks())
+        if main_min == self.overflow_sentinel:
+            # Only sentinels: every value is in the overflow area
+            return min(self.overflow_area)
+        return main_min
+
+    def max(self) -> int:
+        self._check_not_empty("max")
+        if self.overflow_area:
+            # No need to read the main area
+            return max(self.overflow_area)
+        return max(max(block) for _, block in self._iter_main_blocks())
+
+    def count_where(self, lo=None, hi=None) -> int:
+        lo, hi = predicate_bounds(lo, hi)
+        count = 0
+        if lo < self.overflow_sentinel:
+            # Stop at the sentinel, so the sentinels themselves never match
+            main_hi = min(hi, self.overflow_sentinel)
+            for _, block in self._iter_main_blocks():
+                count += count_in_range(block, lo, main_hi)
+        if hi > self.overflow_sentinel:
+            count += count_in_range(self.overflow_area, lo, hi)
+        return count
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        lo, hi = predicate_bounds(lo, hi)
+        indices: List[int] = []
+        if lo < self.overflow_sentinel:
+            main_hi = min(hi, self.overflow_sentinel)
+            for block_start, block in self._iter_main_blocks():
+                indices.extend(select_in_range(block, block_start, lo, main_hi))
+        if hi > self.overflow_sentinel and self.overflow_area:
+            overflow_indices = self._select_overflow(lo, hi)
+            if indices:
+                # Both lists are sorted: Timsort merges the two runs in linear time
+                indices.extend(overflow_indices)
+                indices.sort()
+            else:
+                indices = overflow_indices
+        return indices
+
+    def _select_overflow(self, lo, hi) -> List[int]:
+        # Positions of the overflow values in [lo, hi), read from the sentinel bitmap
+        # (the overflow values are in the same order as the set bits)
+        indices: List[int] = []
+        overflow_index = 0
+        for block, bits in enumerate(self.sentinel_bitmap):
+            while bits:
+                lowest_bit = bits & -bits
+                if lo <= self.overflow_area[overflow_index] < hi:
+                    indices.append(block * RANK_BLOCK_SIZE + lowest_bit.bit_length() - 1)
+                overflow_index += 1
+                bits ^= lowest_bit
+        return indices
+
+    def _compress_numpy(self, data: List[int]) -> None:
+        # Vectorized version of compress(), same layout and same index
+        np = numpy_engine.np
+        values = numpy_engine.to_numpy(data)
+        self.num_elements = len(values)
+        typecode = WORD_TYPECODES[self.word_bits]
+        if self.num_elements == 0:
+            self.compressed_data = array(typecode)
+            self.overflow_area = array(typecode)
+            self.sentinel_bitmap = array('Q')
+            self.sentinel_ranks = array('I')
+            return
+
+        # 1 - Split: sentinels in the main area, real values in the overflow area
+        sentinel = np.uint64(self.overflow_sentinel)
+        is_overflow = values >= sentinel
+        # An overflow value must fit in one word, never truncate it
+        check_value_bits(numpy_engine.bits_for(values), self.word_bits)
+
+        # 2 - Compress the main data (+ the same fake max value as the Python path),
+        # written straight into one array of n + 1 values
+        main_data = np.empty(self.num_elements + 1, dtype=np.uint64)
+        np.minimum(values, sentinel, out=main_data[:self.num_elements])
+        main_data[self.num_elements] = sentinel - np.uint64(1)
+        self.wrapped_compressor.compress(main_data)
+        self.compressed_data = self.wrapped_compressor.compressed_data
+        self.overflow_area = numpy_engine.words_to_array(values[is_overflow], self.word_bits)
+        self.bits_per_element = self.wrapped_compressor.bits_per_element
+
+        # 3 - Rank index: bitmap of sentinels + prefix counts per block
+        if len(self.overflow_area) == 0:
+            self.sentinel_bitmap = array('Q')
+            self.sentinel_ranks = array('I')
+            return
+
+        num_blocks = math.ceil(self.num_elements / RANK_BLOCK_SIZE)
+        padded = np.zeros(num_blocks * RANK_BLOCK_SIZE, dtype=bool)
+        padded[:self.num_elements] = is_overflow
+        bitmap_bytes = np.packbits(padded, bitorder='little')
+        self.sentinel_bitmap = array('Q', bitmap_bytes.view('<u8').astype(np.uint64).tobytes())
+
+        block_counts = padded.reshape(num_blocks, RANK_BLOCK_SIZE).sum(axis=1)
+        ranks = np.cumsum(block_counts) - block_counts
+        self.sentinel_ranks = array('I', ranks.astype(np.uint32).tobytes())
+
+    def _decompress_range_numpy(self, start: int, stop: int) -> List[int]:
+        # Vectorized version of decompress_range(): patch the sentinels in one go
+        np = numpy_engine.np
+        values = numpy_engine.unpack_spanning_range(self.compressed_data, start, stop,
+                                                    self.bits_per_element, self.word_bits)
+        is_overflow = values == np.uint64(self.overflow_sentinel)
+        if self.overflow_area:
+            first = self._overflow_index(start)
+            overflow_values = numpy_engine.array_to_words(self.overflow_area)
+            values[is_overflow] = overflow_values[first:first + int(is_overflow.sum())]
+        return numpy_engine.to_list(values)
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["main_bits"] = self.main_bits
+        meta["auto_main_bits"] = self.auto_main_bits
+        meta["predicted_size_in_bytes"] = self.predicted_size_in_bytes
+        meta["word_bits"] = self.word_bits
+        arrays["overflow_area"] = self.overflow_area
+        arrays["sentinel_bitmap"] = self.sentinel_bitmap
+        arrays["sentinel_ranks"] = self.sentinel_ranks
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        self._set_main_bits(meta["main_bits"])
+        self.auto_main_bits = meta["auto_main_bits"]
+        self.predicted_size_in_bytes = meta["predicted_size_in_bytes"]
+        # Files written before 64-bit words existed have no "word_bits"
+        self.word_bits = meta.get("word_bits", 32)
+        self.overflow_area = arrays["overflow_area"]
+        self.sentinel_bitmap = arrays["sentinel_bitmap"]
+        self.sentinel_ranks = arrays["sentinel_ranks"]
+
+        # The wrapped compressor reads the same words (+ the fake max value)
+        self.wrapped_compressor.compressed_data = self.compressed_data
+        self.wrapped_compressor.num_elements = self.num_elements + 1 if self.num_elements else 0
+        self.wrapped_compressor.bits_per_element = self.bits_per_element
+        self.wrapped_compressor.word_bits = self.word_bits
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "BitPackingOverflow":
+        main_bits = MAIN_BITS_AUTO if meta["auto_main_bits"] else meta["main_bits"]
+        compressor = cls(main_bits=main_bits, word_bits=meta.get("word_bits", 32))
+        compressor._set_state(meta, arrays)
+        return compressor
+
     def get_compressed_size_in_bytes(self) -> int:
-        # Get the total size main + overflow
+        # Get the total size main + overflow + rank index
         main_size = self.wrapped_compressor.get_compressed_size_in_bytes()
         overflow_size = self.overflow_area.itemsize * len(self.overflow_area)
-        return main_size + overflow_size
\ No newline at end of file
+        return main_size + overflow_size + self.get_index_size_in_bytes()
+
+    def get_index_size_in_bytes(self) -> int:
+        # Memory cost of the rank index used by get()
+        bitmap_size = self.sentinel_bitmap.itemsize * len(self.sentinel_bitmap)
+        ranks_size = self.sentinel_ranks.itemsize * len(self.sentinel_ranks)
+        return bitmap_size + ranks_size
\ No newline at end of file
@@ -0,0 +1,245 @@
+import math
+from array import array
+from bisect import bisect_left
+from typing import List, Tuple, Union
+from integer_compressor import IntegerCompressor, WORD_TYPECODES, check_value_bits, check_word_bits, zero_array
+from bit_packing_spanning import pack_values, unpack_values
+from bit_packing_overflow import MAIN_BITS_AUTO
+import unpack_kernels
+from instrumentation import rate
+
+# Number of values per exception block
+# (a position inside a block fits in one byte)
+PFOR_BLOCK_SIZE = 128
+
+
+def predict_pfor_size(num_elements: int, main_bits: int, num_exceptions: int,
+                      word_bits: int = 32) -> int:
+    # Exact size in bytes of a PFOR compressor for a given k'
+    # (same rules as compress() and get_compressed_size_in_bytes())
+    word_size = word_bits // 8
+    main_size = math.ceil(num_elements * main_bits / word_bits) * word_size
+    # one exception: its position in the block (1 byte) + its high bits (one word)
+    exceptions_size = num_exceptions * (1 + word_size)
+    # exception directory: first exception of every block + the end (only if there are exceptions)
+    directory_size = 0
+    if num_exceptions > 0:
+        directory_size = (math.ceil(num_elements / PFOR_BLOCK_SIZE) + 1) * 4
+    return main_size + exceptions_size + directory_size
+
+
+def choose_pfor_bits(bit_length_counts: List[int], num_elements: int,
+                     word_bits: int = 32) -> Tuple[int, int]:
+    # Pick the k' that gives the smallest total size
+    # bit_length_counts[b] = number of values with bit_length() == b
+    # No sentinel here: only the values wider than k' are exceptions
+    # Returns (k', predicted size in bytes)
+    max_bits = max((b for b, count in enumerate(bit_length_counts) if count), default=0)
+
+    best_bits = 1
+    best_size = -1
+    wider_count = num_elements - bit_length_counts[0]
+    for main_bits in range(1, min(max(max_bits, 1), word_bits) + 1):
+        wider_count -= bit_length_counts[main_bits] if main_bits < len(bit_length_counts) else 0
+        size = predict_pfor_size(num_elements, main_bits, wider_count, word_bits)
+        if best_size < 0 or size < best_size:
+            best_bits = main_bits
+            best_size = size
+
+    return best_bits, best_size
+
+
+# This is the "patched" version (PFOR, like in PForDelta)
+# Same idea as the overflow version, but no sentinel:
+#   - the main area holds the low k' bits of EVERY value (spanning layout)
+#   - a value wider than k' is an "exception": its high bits (value >> k')
+#     are stored with its position, in the exception list of its block
+# Decoding = unpack the main area, then patch the exceptions of each block
+# in one pass. get(i) only looks at the small exception list of i's block.
+class BitPackingPFor(IntegerCompressor):
+
+    codec_name = "pfor"
+
+    def __init__(self, main_bits: Union[int, str] = MAIN_BITS_AUTO, word_bits: int = 32) -> None:
+        super().__init__()
+
+        # Size of the storage words, for the main area and the high bits
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+
+        # Number of bits for the main area (k'), "auto" = chosen by compress()
+        self.auto_main_bits: bool = main_bits == MAIN_BITS_AUTO
+        self.main_bits: int = 0
+        if not self.auto_main_bits:
+            check_value_bits(main_bits, word_bits)
+            self.main_bits = main_bits
+
+        # Size announced by the cost model when k' is chosen automatically
+        self.predicted_size_in_bytes: int = 0
+
+        # Exceptions, block by block (the directory is empty if there are none)
+        # exceptions of block b = exception_starts[b] .. exception_starts[b + 1] - 1
+        self.exception_starts: array = array('I')
+        self.exception_positions: array = array('B')                   # Position in the block
+        self.exception_highs: array = array(WORD_TYPECODES[word_bits])  # value >> k'
+
+    def compress(self, data: List[int]) -> None:
+        typecode = WORD_TYPECODES[self.word_bits]
+        self.num_elements = len(data)
+        self.compressed_data = array(typecode)
+        self.exception_starts = array('I')
+        self.exception_positions = array('B')
+        self.exception_highs = array(typecode)
+        if not data:
+            return
+
+        # 1 - Choose k' (or check the values fit the words)
+        if self.auto_main_bits:
+            bit_length_counts = [0] * (self.word_bits + 1)
+            for val in data:
+                bits = val.bit_length()
+                if bits > self.word_bits:
+                    check_value_bits(bits, self.word_bits)
+                bit_length_counts[bits] += 1
+            self.main_bits, self.predicted_size_in_bytes = choose_pfor_bits(
+                bit_length_counts, self.num_elements, self.word_bits)
+        else:
+            check_value_bits(max(data).bit_length(), self.word_bits)
+        k = self.main_bits
+        self.bits_per_element = k
+
+        # 2 - Low bits of every value (pack_values() keeps the low k' bits)
+        num_words = math.ceil(self.num_elements * k / self.word_bits)
+        self.compressed_data = zero_array(typecode, num_words)
+        pack_values(data, k, self.compressed_data, word_bits=self.word_bits)
+
+        # 3 - Exceptions: only the blocks with a value wider than k' are scanned
+        mask = unpack_kernels.MASKS[k]
+        starts = array('I')
+        positions = array('B')
+        highs: List[int] = []
+        for block_start in range(0, self.num_elements, PFOR_BLOCK_SIZE):
+            starts.append(len(positions))
+            block = data[block_start:block_start + PFOR_BLOCK_SIZE]
+            if max(block) > mask:
+                for position, val in enumerate(block):
+                    if val > mask:
+                        positions.append(position)
+                        highs.append(val >> k)
+        starts.append(len(positions))
+
+        if highs:
+            self.exception_starts = starts
+            self.exception_positions = positions
+            self.exception_highs = array(typecode, highs)
+
+    def get(self, i: int) -> int:
+        if not (0 <= i < self.num_elements):
+            raise IndexError(f"Index {i} is out of bounds")
+
+        # 1 - Low bits from the main area (same as the spanning get)
+        k = self.bits_per_element
+        word_bits = self.word_bits
+        words = self.compressed_data
+        array_index, bit_offset = divmod(i * k, word_bits)
+        value = words[array_index] >> bit_offset
+        if bit_offset + k > word_bits:
+            value |= words[array_index + 1] << (word_bits - bit_offset)
+        value &= unpack_kernels.MASKS[k]
+
+        # 2 - High bits, if i is in the exception list of its block (sorted positions)
+        if self.exception_starts:
+            block, position = divmod(i, PFOR_BLOCK_SIZE)
+            first = self.exception_starts[block]
+            last = self.exception_starts[block + 1]
+            if first != last:
+                j = bisect_left(self.exception_positions, position, first, last)
+                if j < last and self.exception_positions[j] == position:
+                    value |= self.exception_highs[j] << k
+        return value
+
+    def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        if start == stop:
+            return []
+
+        # 1 - Low bits of the whole range, with the unpack kernels
+        k = self.bits_per_element
+        result = unpack_values(self.compressed_data, start * k, stop - start, k, self.word_bits)
+
+        # 2 - Patch the exceptions, block by block
+        if self.exception_starts:
+            starts = self.exception_starts
+            positions = self.exception_positions
+            highs = self.exception_highs
+            count = stop - start
+            for block in range(start // PFOR_BLOCK_SIZE, (stop - 1) // PFOR_BLOCK_SIZE + 1):
+                base = block * PFOR_BLOCK_SIZE - start
+                for j in range(starts[block], starts[block + 1]):
+                    index = base + positions[j]
+                    if 0 <= index < count:
+                        result[index] |= highs[j] << k
+        return result
+
+    def get_num_exceptions(self) -> int:
+        return len(self.exception_highs)
+
+    def _record_get(self, i: int, stats) -> None:
+        # A value that spans two words costs a second word read,
+        # an exception costs a search in the list of its block
+        k = self.bits_per_element
+        if (i * k) % self.word_bits + k > self.word_bits:
+            stats.add("word_crossing_gets")
+        if self.exception_starts:
+            block, position = divmod(i, PFOR_BLOCK_SIZE)
+            first = self.exception_starts[block]
+            last = self.exception_starts[block + 1]
+            if position in self.exception_positions[first:last]:
+                stats.add("exception_hits")
+
+    def _stats_gauges(self, counters):
+        gets = counters.get("gets", 0)
+        return {
+            "word_crossing_rate": rate(counters.get("word_crossing_gets", 0), gets),
+            "exception_rate": rate(self.get_num_exceptions(), self.num_elements),
+            "exception_hit_rate": rate(counters.get("exception_hits", 0), gets),
+        }
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["main_bits"] = self.main_bits
+        meta["auto_main_bits"] = self.auto_main_bits
+        meta["predicted_size_in_bytes"] = self.predicted_size_in_bytes
+        meta["word_bits"] = self.word_bits
+        arrays["exception_starts"] = self.exception_starts
+        arrays["exception_positions"] = self.exception_positions
+        arrays["exception_highs"] = self.exception_highs
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        self.main_bits = meta["main_bits"]
+        self.auto_main_bits = meta["auto_main_bits"]
+        self.predicted_size_in_bytes = meta["predicted_size_in_bytes"]
+        self.word_bits = meta["word_bits"]
+        self.exception_starts = arrays["exception_starts"]
+        self.exception_positions = arrays["exception_positions"]
+        self.exception_highs = arrays["exception_highs"]
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "BitPackingPFor":
+        main_bits = MAIN_BITS_AUTO if meta["auto_main_bits"] else meta["main_bits"]
+        compressor = cls(main_bits=main_bits, word_bits=meta["word_bits"])
+        compressor._set_state(meta, arrays)
+        return compressor
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Main area + exceptions + exception directory
+        return super().get_compressed_size_in_bytes() + self.get_exceptions_size_in_bytes()
+
+    def get_exceptions_size_in_bytes(self) -> int:
+        return sum(part.itemsize * len(part)
+                   for part in (self.exception_starts, self.exception_positions, self.exception_highs))
@@ -0,0 +1,223 @@
+from array import array
+from bisect import bisect_right
+from itertools import groupby
+from typing import Iterator, List, Tuple
+from integer_compressor import (IntegerCompressor, SCAN_BLOCK_SIZE, WORD_TYPECODES, check_word_bits,
+                                codec_from_state, predicate_bounds)
+from bit_packing_spanning import BitPackingSpanning
+from numpy_engine import ENGINE_PYTHON
+from instrumentation import rate
+
+
+def find_runs(data, first_position: int = 0) -> Tuple[List[int], List[int]]:
+    # (value of every run, end of every run) - the end is the position after
+    # the last value of the run, so the ends are sorted and the last one is len(data)
+    values: List[int] = []
+    ends: List[int] = []
+    position = first_position
+    for value, group in groupby(data):
+        position += len(list(group))
+        values.append(value)
+        ends.append(position)
+    return values, ends
+
+
+# This is the "run-length" version, for columns with long runs of the same
+# value (counters that are 0 most of the time, flags, sorted status codes...)
+#   - values_compressor packs the value of every run
+#   - ends_compressor packs the end of every run (sorted, last one = num_elements)
+# Both are BitPackingSpanning, so a column of 1M zeros costs two words.
+# get(i) = binary search of the first run end > i (O(log runs) get() calls),
+# decompress() = [value] * length for every run, and the scans work on whole runs.
+class BitPackingRLE(IntegerCompressor):
+
+    codec_name = "rle"
+
+    def __init__(self, engine: str = ENGINE_PYTHON, parallel: int = 1, word_bits: int = 32) -> None:
+        super().__init__()
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+
+        # The two packed halves of the runs
+        self.values_compressor: IntegerCompressor = BitPackingSpanning(engine=engine, parallel=parallel,
+                                                                       word_bits=word_bits)
+        self.ends_compressor: IntegerCompressor = BitPackingSpanning(engine=engine, parallel=parallel,
+                                                                     word_bits=word_bits)
+
+    def compress(self, data: List[int]) -> None:
+        self.num_elements = len(data)
+
+        # 1 - Find the runs, 2 - pack both halves
+        values, ends = find_runs(data)
+        self.values_compressor.compress(values)
+        self.ends_compressor.compress(ends)
+        self._sync()
+
+    def _sync(self) -> None:
+        # compressed_data / bits_per_element are the ones of the run values
+        self.compressed_data = self.values_compressor.compressed_data
+        self.bits_per_element = self.values_compressor.bits_per_element
+
+    def get_num_runs(self) -> int:
+        return self.values_compressor.num_elements
+
+    def _run_of(self, i: int) -> int:
+        # Index of the run that holds position i: first run whose end is > i
+        ends = self.ends_compressor
+        lo = 0
+        hi = ends.num_elements
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ends.get(mid) <= i:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # ---- Reads ----
+
+    def get(self, i: int) -> int:
+        if not (0 <= i < self.num_elements):
+            raise IndexError(f"Index {i} is out of bounds")
+        return self.values_compressor.get(self._run_of(i))
+
+    def get_many(self, indices) -> List[int]:
+        indices = self._check_indices(indices)
+        num_runs = self.get_num_runs()
+        if len(indices) * num_runs.bit_length() < num_runs:
+            # A few indices: one binary search each
+            return [self.values_compressor.get(self._run_of(i)) for i in indices]
+        # Many indices: decode the run ends once and search them in C
+        ends = self.ends_compressor.decompress()
+        values = self.values_compressor.decompress()
+        return [values[bisect_right(ends, i)] for i in indices]
+
+    def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        if start == stop:
+            return []
+
+        # 1 - Runs that overlap [start, stop)
+        if start == 0 and stop == self.num_elements:
+            first_run = 0
+            last_run = self.get_num_runs() - 1
+        else:
+            first_run = self._run_of(start)
+            last_run = self._run_of(stop - 1)
+
+        # 2 - Expand them (the first and the last one can be cut)
+        result: List[int] = []
+        position = start
+        values = self.values_compressor.decompress_range(first_run, last_run + 1)
+        ends = self.ends_compressor.decompress_range(first_run, last_run + 1)
+        for value, end in zip(values, ends):
+            end = min(end, stop)
+            result += [value] * (end - position)
+            position = end
+        return result
+
+    def _iter_runs(self) -> Iterator[Tuple[int, int, int]]:
+        # Yield (start, end, value) for every run, SCAN_BLOCK_SIZE runs decoded at a time
+        num_runs = self.get_num_runs()
+        start = 0
+        for first_run in range(0, num_runs, SCAN_BLOCK_SIZE):
+            last_run = min(first_run + SCAN_BLOCK_SIZE, num_runs)
+            values = self.values_compressor.decompress_range(first_run, last_run)
+            ends = self.ends_compressor.decompress_range(first_run, last_run)
+            for value, end in zip(values, ends):
+                yield start, end, value
+                start = end
+
+    # ---- Append ----
+
+    def extend(self, values) -> None:
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        if self.num_elements == 0:
+            self.compress(values)
+            return
+
+        run_values, run_ends = find_runs(values, self.num_elements)
+        num_runs = self.get_num_runs()
+        if run_values[0] == self.values_compressor.get(num_runs - 1):
+            # The batch continues the last run: only its end moves
+            self.ends_compressor._truncate(num_runs - 1)
+            run_values = run_values[1:]
+
+        self.values_compressor.extend(run_values)
+        self.ends_compressor.extend(run_ends)
+        self.num_elements += len(values)
+        self._sync()
+
+    # ---- Scans on the runs ----
+
+    def count_where(self, lo=None, hi=None) -> int:
+        lo, hi = predicate_bounds(lo, hi)
+        return sum(end - start for start, end, value in self._iter_runs() if lo <= value < hi)
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        lo, hi = predicate_bounds(lo, hi)
+        indices: List[int] = []
+        for start, end, value in self._iter_runs():
+            if lo <= value < hi:
+                indices.extend(range(start, end))
+        return indices
+
+    def sum(self) -> int:
+        # One multiplication per run
+        return sum(value * (end - start) for start, end, value in self._iter_runs())
+
+    def min(self) -> int:
+        self._check_not_empty("min")
+        return self.values_compressor.min()
+
+    def max(self) -> int:
+        self._check_not_empty("max")
+        return self.values_compressor.max()
+
+    def _lower_bound(self, value: int, lo: int, hi: int, right: bool = False) -> int:
+        # Sorted column = sorted run values: binary search over the runs only,
+        # the answer is the start of the run found (then kept inside [lo, hi])
+        run = self.values_compressor._lower_bound(value, 0, self.get_num_runs(), right)
+        position = self.ends_compressor.get(run - 1) if run > 0 else 0
+        return min(max(position, lo), hi)
+
+    # ---- Stats, size and serialization ----
+
+    def _stats_gauges(self, counters):
+        return {
+            "runs": self.get_num_runs(),
+            "mean_run_length": rate(self.num_elements, self.get_num_runs()),
+        }
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Run values + run ends
+        return (self.values_compressor.get_compressed_size_in_bytes()
+                + self.ends_compressor.get_compressed_size_in_bytes())
+
+    def _get_state(self):
+        # Our own fields + the full state of both halves (they can have segments)
+        meta = {"num_elements": self.num_elements, "word_bits": self.word_bits}
+        arrays = {}
+        for part in ("values", "ends"):
+            part_meta, part_arrays = getattr(self, part + "_compressor")._get_state()
+            meta[part + "_meta"] = part_meta
+            for name, data in part_arrays.items():
+                arrays[part + "." + name] = data
+        return meta, arrays
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "BitPackingRLE":
+        compressor = cls(word_bits=meta["word_bits"])
+        for part in ("values", "ends"):
+            prefix = part + "."
+            part_arrays = {name[len(prefix):]: data for name, data in arrays.items() if name.startswith(prefix)}
+            setattr(compressor, part + "_compressor",
+                    codec_from_state(BitPackingSpanning.codec_name, meta[part + "_meta"], part_arrays))
+        compressor.num_elements = meta["num_elements"]
+        compressor._sync()
+        return compressor
@@ -1,19 +1,139 @@
 import math
 from array import array
+from bisect import bisect_right
 from typing import List
-from integer_compressor import IntegerCompressor
+from integer_compressor import WORD_TYPECODES, check_value_bits, check_word_bits, zero_array
+from appendable import AppendableBitPacking, WIDEN_SEGMENT
+import numpy_engine
+import parallel_engine
+import unpack_kernels
+from numpy_engine import ENGINE_PYTHON, ENGINE_NUMPY
+from instrumentation import rate
+
+# Shared helpers: the spanning layout is also used inside
+# other codecs (ex: one packed run per block)
+
+def pack_values(data: List[int], k: int, output: array, start_word: int = 0,
+                word_bits: int = 32, first_element: int = 0) -> None:
+    # Write the values with k bits each, starting at output[start_word]
+    # (or at value 'first_element' after it, to append to packed values)
+    # The bits to write must be zero in 'output'
+    bit_cursor = start_word * word_bits + first_element * k # Global bit position
+    mask_k_bits = (1 << k) - 1 
+    
+    # This is needed because Python's integers are not limited
+    # to 32 (or 64) bits, which would crash the array
+    mask_word_bits = (1 << word_bits) - 1
+
+    for val in data:
+        array_index = bit_cursor // word_bits # Which word
+        bit_offset = bit_cursor % word_bits   # Offset inside that word
+        
+        value = val & mask_k_bits
+
+        # Part 1: Write the first part
+        # Shift value and mask to the word size
+        output[array_index] |= ((value << bit_offset) & mask_word_bits)
+
+        # Part 2: Check if we need to write to the next word
+        bits_written = word_bits - bit_offset
+        if bits_written < k:
+            # The number didn't fit
+            if array_index + 1 < len(output):
+                # Calculate the wrapped part
+                wrapped_value = value >> bits_written
+                # Write to the next word
+                output[array_index + 1] |= wrapped_value
+        
+        # Move the global cursor
+        bit_cursor += k
+
+
+def unpack_values(words: array, bit_cursor: int, count: int, k: int,
+                  word_bits: int = 32) -> List[int]:
+    # Read 'count' values of k bits each, starting at global bit 'bit_cursor'
+    if count < unpack_kernels.MIN_KERNEL_VALUES:
+        return _unpack_loop(words, bit_cursor, count, k, word_bits)
+
+    # 1 - Head: the values before the first one that starts on a word boundary
+    head = 0
+    while head < word_bits and (bit_cursor + head * k) % word_bits:
+        head += 1
+    if head == word_bits:
+        # Never on a word boundary (only possible for a custom bit_cursor)
+        return _unpack_loop(words, bit_cursor, count, k, word_bits)
+    head = min(head, count)
+    result = _unpack_loop(words, bit_cursor, head, k, word_bits)
+
+    # 2 - Full groups of word_bits values (k words each) with the kernel for k
+    num_groups = (count - head) // word_bits
+    group_cursor = bit_cursor + head * k
+    unpack_kernels.spanning_kernel(k, word_bits)(words, group_cursor // word_bits, num_groups, result)
+
+    # 3 - Tail: the last partial group
+    done = head + num_groups * word_bits
+    result.extend(_unpack_loop(words, bit_cursor + done * k, count - done, k, word_bits))
+    return result
+
+
+def _unpack_loop(words: array, bit_cursor: int, count: int, k: int, word_bits: int) -> List[int]:
+    # Generic decoder (any k, any position), used for short runs
+    result: List[int] = []
+    if count == 0:
+        return result
+
+    mask = (1 << k) - 1
+
+    # 1 - Jump to the first word
+    array_index = bit_cursor // word_bits
+    bit_offset = bit_cursor % word_bits
+
+    # 2 - Decode sequentially with a small bit buffer
+    buffer = words[array_index] >> bit_offset
+    buffered_bits = word_bits - bit_offset
+    array_index += 1
+
+    for _ in range(count):
+        if buffered_bits < k:
+            # The value continues in the next word
+            buffer |= words[array_index] << buffered_bits
+            array_index += 1
+            buffered_bits += word_bits
+        result.append(buffer & mask)
+        buffer >>= k
+        buffered_bits -= k
+
+    return result
+
 
 # This is the "spanning" version
-# Ints can be written across two 32-bit blocks
-class BitPackingSpanning(IntegerCompressor):
+# Ints can be written across two 32-bit (or 64-bit) blocks
+class BitPackingSpanning(AppendableBitPacking):
+
+    codec_name = "spanning"
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, engine: str = ENGINE_PYTHON, parallel: int = 1, word_bits: int = 32,
+                 widen: str = WIDEN_SEGMENT) -> None:
+        # widen: what extend() does when a value needs a wider k (see appendable.py)
+        super().__init__(widen)
+        # Size of the storage words: 32 ('I') or 64 ('Q')
+        # 64-bit words allow values up to 64 bits and cross fewer words
+        self.word_bits: int = check_word_bits(word_bits)
+        self.compressed_data = array(WORD_TYPECODES[word_bits])
+        # "python" (loops) or "numpy" (vectorized, same layout)
+        self.engine: str = numpy_engine.check_engine(engine)
+        # Number of worker processes for big inputs (Python engine only)
+        self.parallel: int = parallel_engine.check_parallel(parallel)
 
     def compress(self, data: List[int]) -> None:
+        self._reset_segments()
+        if self.engine == ENGINE_NUMPY:
+            self._compress_numpy(data)
+            return
+
         if not data:
             self.num_elements = 0
-            self.compressed_data = array('I')
+            self.compressed_data = array(WORD_TYPECODES[self.word_bits])
             return
         
         self.num_elements = len(data)
@@ -24,75 +144,177 @@ class BitPackingSpanning(IntegerCompressor):
             self.bits_per_element = 1
         else:
             self.bits_per_element = max_val.bit_length()
+        check_value_bits(self.bits_per_element, self.word_bits)
         
         # Total bits needed
         total_bits = self.num_elements * self.bits_per_element
-        output_size = math.ceil(total_bits / 32)
+        output_size = math.ceil(total_bits / self.word_bits)
         if output_size == 0 and self.num_elements > 0:
              output_size = 1 # At least one int if we have data
 
-        self.compressed_data = array('I', [0] * output_size)
+        if parallel_engine.use_parallel(self.parallel, self.num_elements):
+            # Same layout, packed by several processes
+            self.compressed_data = parallel_engine.parallel_pack(
+                parallel_engine.LAYOUT_SPANNING, data, self.bits_per_element, self.parallel, self.word_bits)
+            return
 
-        bit_cursor = 0 # Global bit position
-        mask_k_bits = (1 << self.bits_per_element) - 1 
-        
-        # This is needed because Python's integers are not limited
-        # to 32 bits, which would crash the array('I')
-        mask_32_bits = 0xFFFFFFFF 
-
-        for val in data:
-            array_index = bit_cursor // 32 # Which 32-bit int
-            bit_offset = bit_cursor % 32   # Offset inside that int
-            
-            value = val & mask_k_bits
-
-            # Part 1: Write the first part
-            # Shift value and mask to 32 bits
-            self.compressed_data[array_index] |= ((value << bit_offset) & mask_32_bits)
-
-            # Part 2: Check if we need to write to the next int
-            bits_written = 32 - bit_offset
-            if bits_written < self.bits_per_element:
-                # The number didn't fit
-                if array_index + 1 < len(self.compressed_data):
-                    # Calculate the wrapped part
-                    wrapped_value = value >> bits_written
-                    # Write to the next int
-                    self.compressed_data[array_index + 1] |= wrapped_value
-            
-            # Move the global cursor
-            bit_cursor += self.bits_per_element
+        self.compressed_data = zero_array(WORD_TYPECODES[self.word_bits], output_size)
+        pack_values(data, self.bits_per_element, self.compressed_data, word_bits=self.word_bits)
+
+    def _compress_known_bits(self, values, num_elements: int, k: int) -> None:
+        # compress() for a decorator that already knows k from its own pre-pass
+        # (overflow, dictionary): no max() pass, and 'values' can be any iterable
+        # (a map or a generator), so the decorator never builds a second list of n values.
+        # Every value is cut to its low k bits, like pack_values()
+        self._reset_segments()
+        self.num_elements = num_elements
+        self.bits_per_element = k
+        if num_elements == 0:
+            self.compressed_data = array(WORD_TYPECODES[self.word_bits])
+        elif self.engine == ENGINE_NUMPY:
+            words = numpy_engine.pack_spanning(numpy_engine.to_numpy(list(values)), k, self.word_bits)
+            self.compressed_data = numpy_engine.words_to_array(words, self.word_bits)
+        elif parallel_engine.use_parallel(self.parallel, num_elements):
+            self.compressed_data = parallel_engine.parallel_pack(
+                parallel_engine.LAYOUT_SPANNING, list(values), k, self.parallel, self.word_bits)
+        else:
+            # Exact size, written in place
+            self.compressed_data = zero_array(WORD_TYPECODES[self.word_bits], self._words_for(num_elements, k))
+            pack_values(values, k, self.compressed_data, word_bits=self.word_bits)
 
     def get(self, i: int) -> int:
         if not (0 <= i < self.num_elements):
             raise IndexError(f"Index {i} is out of bounds")
+        if self.segment_starts:
+            return self._get_segmented(i)
 
-        # 1 - Find the global bit position
-        bit_cursor = i * self.bits_per_element
-        array_index = bit_cursor // 32
-        bit_offset = bit_cursor % 32
+        k = self.bits_per_element
+        word_bits = self.word_bits
+        words = self.compressed_data
 
-        mask = (1 << self.bits_per_element) - 1
+        # 1 - Find the global bit position: word + offset in one divmod
+        array_index, bit_offset = divmod(i * k, word_bits)
 
         # 2 - Read the first part
-        value = self.compressed_data[array_index] >> bit_offset
-
-        # 3 - Check if we need to read from the next int
-        bits_read = 32 - bit_offset
-        if bits_read < self.bits_per_element:
-            bits_to_read_wrap = self.bits_per_element - bits_read
-            
-            if array_index + 1 < len(self.compressed_data):
-                # Read the wrapped part
-                wrap_mask = (1 << bits_to_read_wrap) - 1
-                wrapped_value = self.compressed_data[array_index + 1] & wrap_mask
-                
-                # Combine the two parts
-                value |= (wrapped_value << bits_read)
-
-        # 4 - Mask the final result to get only k bits
-        return value & mask
+        value = words[array_index] >> bit_offset
+
+        # 3 - Check if we need to read from the next word
+        # (a value that wraps always has its next word, the array is ceil(n * k / word_bits) long)
+        if bit_offset + k > word_bits:
+            value |= words[array_index + 1] << (word_bits - bit_offset)
+
+        # 4 - Mask the final result to get only k bits (precomputed mask)
+        return value & unpack_kernels.MASKS[k]
+
+    def _record_get(self, i: int, stats) -> None:
+        # A value that spans two words costs a second word read
+        k = self.bits_per_element
+        bit_position = i * k
+        if self.segment_starts:
+            segment = bisect_right(self.segment_starts, i) - 1
+            k = self.segment_bits[segment]
+            bit_position = self._bit_position(self.segment_words[segment], i - self.segment_starts[segment], k)
+        if bit_position % self.word_bits + k > self.word_bits:
+            stats.add("word_crossing_gets")
+
+    def _stats_gauges(self, counters):
+        return {"word_crossing_rate": rate(counters.get("word_crossing_gets", 0), counters.get("gets", 0))}
+
+    def get_many(self, indices) -> List[int]:
+        if self.segment_starts:
+            return [self._get_segmented(i) for i in self._check_indices(indices)]
+        if self.engine == ENGINE_NUMPY:
+            positions = numpy_engine.check_indices(indices, self.num_elements)
+            words = numpy_engine.array_to_words(self.compressed_data)
+            values = numpy_engine.gather_spanning(words, positions, self.bits_per_element, self.word_bits)
+            return numpy_engine.to_list(values)
+
+        indices = self._check_indices(indices)
+        result: List[int] = [0] * len(indices)
+
+        k = self.bits_per_element
+        word_bits = self.word_bits
+        mask = (1 << k) - 1
+        words = self.compressed_data
+        last_word = len(words) - 1
+
+        # Consecutive indices that live in the same word
+        # reuse the same read (no sort: it costs more than it saves)
+        current_index = -1
+        window = 0
+        for position, i in enumerate(indices):
+            bit_cursor = i * k
+            array_index = bit_cursor // word_bits
+            if array_index != current_index:
+                # Double window: this word + the next one (for wrapped values)
+                window = words[array_index]
+                if array_index < last_word:
+                    window |= words[array_index + 1] << word_bits
+                current_index = array_index
+            result[position] = (window >> (bit_cursor % word_bits)) & mask
+
+        return result
 
     def decompress(self) -> List[int]:
-        # Simple loop calling get()
-        return [self.get(i) for i in range(self.num_elements)]
\ No newline at end of file
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+        if self.segment_starts:
+            return self._decompress_range_segmented(start, stop)
+        if self.engine == ENGINE_NUMPY:
+            return self._decompress_range_numpy(start, stop)
+
+        if parallel_engine.use_parallel(self.parallel, stop - start):
+            return parallel_engine.parallel_unpack(parallel_engine.LAYOUT_SPANNING, self.compressed_data,
+                                                   start, stop, self.bits_per_element, self.parallel,
+                                                   self.word_bits)
+
+        return unpack_values(self.compressed_data, start * self.bits_per_element,
+                             stop - start, self.bits_per_element, self.word_bits)
+
+    # Layout hooks for append() / extend()
+
+    def _words_for(self, count: int, k: int) -> int:
+        return math.ceil(count * k / self.word_bits)
+
+    def _pack_at(self, values: List[int], k: int, start_word: int, first_element: int) -> None:
+        pack_values(values, k, self.compressed_data, start_word, self.word_bits, first_element)
+
+    def _unpack_at(self, start_word: int, first_element: int, count: int, k: int) -> List[int]:
+        return unpack_values(self.compressed_data, self._bit_position(start_word, first_element, k),
+                             count, k, self.word_bits)
+
+    def _bit_position(self, start_word: int, first_element: int, k: int) -> int:
+        return start_word * self.word_bits + first_element * k
+
+    def _get_state(self):
+        meta, arrays = super()._get_state()
+        meta["word_bits"] = self.word_bits
+        return meta, arrays
+
+    def _set_state(self, meta, arrays) -> None:
+        super()._set_state(meta, arrays)
+        # Files written before 64-bit words existed have no "word_bits"
+        self.word_bits = meta.get("word_bits", 32)
+
+    def _compress_numpy(self, data: List[int]) -> None:
+        # Vectorized version of compress(), bit-identical output
+        values = numpy_engine.to_numpy(data)
+        self.num_elements = len(values)
+        if self.num_elements == 0:
+            self.compressed_data = array(WORD_TYPECODES[self.word_bits])
+            return
+
+        self.bits_per_element = numpy_engine.bits_for(values)
+        check_value_bits(self.bits_per_element, self.word_bits)
+        words = numpy_engine.pack_spanning(values, self.bits_per_element, self.word_bits)
+        self.compressed_data = numpy_engine.words_to_array(words, self.word_bits)
+
+    def _decompress_range_numpy(self, start: int, stop: int) -> List[int]:
+        # Vectorized version of decompress_range()
+        if start == stop:
+            return []
+        values = numpy_engine.unpack_spanning_range(self.compressed_data, start, stop,
+                                                    self.bits_per_element, self.word_bits)
+        return numpy_engine.to_list(values)
\ No newline at end of file
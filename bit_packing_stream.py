@@ -0,0 +1,139 @@
+import math
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterable, Iterator, List
+from bit_packing_spanning import BitPackingSpanning
+from numpy_engine import ENGINE_PYTHON
+
+# Streaming version of the spanning BitPacking
+# The input is read block by block, so the full list never has to fit in memory.
+# Each block has its own k, so a big value only costs bits in its own block.
+#
+# Stream layout (little-endian):
+#   "BPS1"
+#   block: number of elements (uint32), k (uint8), ceil(n * k / 32) words (uint32)
+#   block: ...
+
+STREAM_MAGIC = b"BPS1"
+BLOCK_HEADER = struct.Struct("<IB")
+DEFAULT_BLOCK_SIZE = 65536
+
+
+def _to_little_endian(words: array) -> bytes:
+    # The stream is always little-endian, whatever the machine is
+    if sys.byteorder == "big":
+        words = array(words.typecode, words)
+        words.byteswap()
+    return words.tobytes()
+
+
+class BitPackingStreamWriter:
+
+    def __init__(self, stream: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE,
+                 engine: str = ENGINE_PYTHON) -> None:
+        if block_size <= 0:
+            raise ValueError(f"block_size must be positive, got {block_size}")
+
+        # Binary file-like object opened by the caller
+        self.stream: BinaryIO = stream
+        self.block_size: int = block_size
+
+        # Stats, useful to compare with the in-memory codecs
+        self.num_elements: int = 0
+        self.num_blocks: int = 0
+        self.bytes_written: int = 0
+
+        # Only one block is kept in memory at a time
+        self._buffer: List[int] = []
+        self._packer = BitPackingSpanning(engine=engine)
+        self._closed = False
+
+        self._write(STREAM_MAGIC)
+
+    def write(self, values: Iterable[int]) -> None:
+        # Accepts any iterable (list, generator, file reader...)
+        if self._closed:
+            raise ValueError("Cannot write to a closed stream writer")
+
+        buffer = self._buffer
+        for value in values:
+            buffer.append(value)
+            if len(buffer) == self.block_size:
+                self._flush_block()
+                buffer = self._buffer
+
+    def close(self) -> None:
+        # Write the last (partial) block
+        # The stream itself is closed by its owner
+        if self._closed:
+            return
+        if self._buffer:
+            self._flush_block()
+        self.stream.flush()
+        self._closed = True
+
+    def __enter__(self) -> "BitPackingStreamWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _flush_block(self) -> None:
+        # 1 - Pack the block with its own k
+        self._packer.compress(self._buffer)
+
+        # 2 - Header + raw words
+        self._write(BLOCK_HEADER.pack(self._packer.num_elements, self._packer.bits_per_element))
+        self._write(_to_little_endian(self._packer.compressed_data))
+
+        self.num_elements += self._packer.num_elements
+        self.num_blocks += 1
+        self._buffer = []
+
+    def _write(self, payload: bytes) -> None:
+        self.stream.write(payload)
+        self.bytes_written += len(payload)
+
+
+class BitPackingStreamReader:
+
+    def __init__(self, stream: BinaryIO, engine: str = ENGINE_PYTHON) -> None:
+        # Binary file-like object opened by the caller
+        self.stream: BinaryIO = stream
+        self._unpacker = BitPackingSpanning(engine=engine)
+
+        magic = stream.read(len(STREAM_MAGIC))
+        if magic != STREAM_MAGIC:
+            raise ValueError("Not a BitPacking stream (bad magic)")
+
+    def __iter__(self) -> Iterator[int]:
+        # Yield the values one by one, decoding one block at a time
+        for block in self.iter_blocks():
+            yield from block
+
+    def iter_blocks(self) -> Iterator[List[int]]:
+        # Yield one decoded block at a time
+        while True:
+            header = self.stream.read(BLOCK_HEADER.size)
+            if not header:
+                return
+            if len(header) < BLOCK_HEADER.size:
+                raise ValueError("Truncated stream: incomplete block header")
+
+            num_elements, k = BLOCK_HEADER.unpack(header)
+            num_words = math.ceil(num_elements * k / 32)
+            payload = self.stream.read(num_words * 4)
+            if len(payload) < num_words * 4:
+                raise ValueError("Truncated stream: incomplete block payload")
+
+            words = array('I')
+            words.frombytes(payload)
+            if sys.byteorder == "big":
+                words.byteswap()
+
+            # Reuse the spanning decoder on this block
+            self._unpacker.compressed_data = words
+            self._unpacker.num_elements = num_elements
+            self._unpacker.bits_per_element = k
+            yield self._unpacker.decompress()
@@ -0,0 +1,173 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List
+from integer_compressor import IntegerCompressor
+
+# Default number of values per cached block
+DEFAULT_CACHE_BLOCK_SIZE = 256
+
+# Default memory budget of the cache (1 MiB)
+DEFAULT_CACHE_BUDGET = 1 << 20
+
+# Approximate size of one decoded int (an int object is 28-36 bytes)
+INT_SIZE_IN_BYTES = 32
+
+
+# This is the "cached" version, for hot random access
+# It is a Decorator (like the overflow and delta versions) around any codec:
+# get(i) decodes the whole block of 'block_size' values around i once,
+# then the next get() in the same block is a plain list read.
+# The least recently used blocks are dropped when the memory budget is full.
+class CachedCompressor(IntegerCompressor):
+
+    def __init__(self, wrapped_compressor: IntegerCompressor, block_size: int = DEFAULT_CACHE_BLOCK_SIZE,
+                 memory_budget: int = DEFAULT_CACHE_BUDGET) -> None:
+        super().__init__()
+        if block_size <= 0:
+            raise ValueError(f"block_size must be positive, got {block_size}")
+        if memory_budget <= 0:
+            raise ValueError(f"memory_budget must be positive, got {memory_budget}")
+
+        # The codec that really stores the values
+        self.wrapped_compressor: IntegerCompressor = wrapped_compressor
+        self.block_size: int = block_size
+        self.memory_budget: int = memory_budget
+
+        # Block index -> decoded values, the oldest block first
+        self._blocks: "OrderedDict[int, List[int]]" = OrderedDict()
+        self.memory_used: int = 0
+
+        # Counters, to check that the cache is worth it
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # Guards the blocks, the LRU order and the sync with the wrapped codec
+        # (reentrant: get() holds it when it calls _sync())
+        self._lock = threading.RLock()
+
+        # compressed_data of the wrapped codec when the blocks were decoded
+        # (compress() always builds a new array, so a new one means stale blocks)
+        self._source = None
+        self._sync()
+
+    def compress(self, data: List[int]) -> None:
+        self.wrapped_compressor.compress(data)
+        self._sync()
+
+    def extend(self, values) -> None:
+        self.wrapped_compressor.extend(values)
+        self._sync()
+
+    def _sync(self) -> None:
+        # Copy the wrapped codec fields and drop every cached block
+        with self._lock:
+            self.compressed_data = self.wrapped_compressor.compressed_data
+            self.num_elements = self.wrapped_compressor.num_elements
+            self.bits_per_element = self.wrapped_compressor.bits_per_element
+            self._source = self.compressed_data
+            self.clear_cache()
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+            self.memory_used = 0
+
+    def get(self, i: int) -> int:
+        # The LRU order is shared state: one thread at a time (see ConcurrentCompressor)
+        # The staleness check is in the lock too, so _sync() never empties
+        # the blocks while another thread adds or drops one
+        with self._lock:
+            # The wrapped codec may have been compressed again (or extended) directly
+            if (self.wrapped_compressor.compressed_data is not self._source
+                    or self.wrapped_compressor.num_elements != self.num_elements):
+                self._sync()
+            if not (0 <= i < self.num_elements):
+                raise IndexError(f"Index {i} is out of bounds")
+
+            block_index, index_in_block = divmod(i, self.block_size)
+            block = self._blocks.get(block_index)
+            if block is None:
+                self.misses += 1
+                block = self._load_block(block_index)
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(block_index)
+        return block[index_in_block]
+
+    def get_many(self, indices) -> List[int]:
+        return [self.get(i) for i in self._check_indices(indices)]
+
+    def _load_block(self, block_index: int) -> List[int]:
+        # 1 - Decode the whole block with the wrapped codec
+        start = block_index * self.block_size
+        stop = min(start + self.block_size, self.num_elements)
+        block = self.wrapped_compressor.decompress_range(start, stop)
+
+        # 2 - Make room: drop the least recently used blocks
+        # (the new block is always kept, even if it is bigger than the budget)
+        self._blocks[block_index] = block
+        self.memory_used += self._block_size_in_bytes(block)
+        while self.memory_used > self.memory_budget and len(self._blocks) > 1:
+            _, oldest = self._blocks.popitem(last=False)
+            self.memory_used -= self._block_size_in_bytes(oldest)
+            self.evictions += 1
+        return block
+
+    @staticmethod
+    def _block_size_in_bytes(block: List[int]) -> int:
+        # List itself + its int objects (approximate)
+        return sys.getsizeof(block) + INT_SIZE_IN_BYTES * len(block)
+
+    def cache_info(self) -> Dict[str, int]:
+        # Same idea as functools.lru_cache().cache_info()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "blocks": len(self._blocks),
+            "memory_used": self.memory_used,
+            "memory_budget": self.memory_budget,
+        }
+
+    def _record_get(self, i: int, stats) -> None:
+        self.wrapped_compressor._record_get(i, stats)
+
+    def _stats_gauges(self, counters):
+        gauges = self.wrapped_compressor._stats_gauges(counters)
+        gauges["cache"] = self.cache_info()
+        return gauges
+
+    # Everything else goes straight to the wrapped codec (no caching)
+
+    def decompress(self) -> List[int]:
+        return self.wrapped_compressor.decompress()
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        return self.wrapped_compressor.decompress_range(start, stop)
+
+    def sum(self) -> int:
+        return self.wrapped_compressor.sum()
+
+    def min(self) -> int:
+        return self.wrapped_compressor.min()
+
+    def max(self) -> int:
+        return self.wrapped_compressor.max()
+
+    def count_where(self, lo=None, hi=None) -> int:
+        return self.wrapped_compressor.count_where(lo, hi)
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        return self.wrapped_compressor.select_where(lo, hi)
+
+    def _lower_bound(self, value: int, lo: int, hi: int, right: bool = False) -> int:
+        return self.wrapped_compressor._lower_bound(value, lo, hi, right)
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # The cache is not part of the compressed size
+        return self.wrapped_compressor.get_compressed_size_in_bytes()
+
+    def write_to(self, stream: BinaryIO) -> None:
+        # The cache is not saved: the file holds the wrapped codec only
+        self.wrapped_compressor.write_to(stream)
@@ -1,12 +1,31 @@
+from typing import Any, Dict, Tuple
 from integer_compressor import IntegerCompressor
 from bit_packing_non_spanning import BitPackingNonSpanning
 from bit_packing_spanning import BitPackingSpanning
-from bit_packing_overflow import BitPackingOverflow
+from bit_packing_overflow import BitPackingOverflow, MAIN_BITS_AUTO
+from bit_packing_pfor import BitPackingPFor
+from bit_packing_dictionary import BitPackingDictionary, DICTIONARY_SORTED, DEFAULT_MAX_CARDINALITY
+from bit_packing_rle import BitPackingRLE
+from bit_packing_block_adaptive import BitPackingBlockAdaptive, DEFAULT_BLOCK_SIZE
+from delta_zigzag import DeltaZigzagCompressor, DEFAULT_CHECKPOINT_INTERVAL
+from cached_compressor import CachedCompressor, DEFAULT_CACHE_BLOCK_SIZE, DEFAULT_CACHE_BUDGET
+from concurrent_compressor import ConcurrentCompressor
+from numpy_engine import ENGINE_PYTHON
+from appendable import WIDEN_SEGMENT
+import cost_model
+from cost_model import OBJECTIVE_SIZE
 
 # Constants to avoid typos
 COMPRESSOR_NON_SPANNING = "non_spanning"
 COMPRESSOR_SPANNING = "spanning"
 COMPRESSOR_OVERFLOW = "overflow"
+COMPRESSOR_BLOCK_ADAPTIVE = "block_adaptive"
+COMPRESSOR_PFOR = "pfor"
+COMPRESSOR_DICTIONARY = "dictionary"
+COMPRESSOR_RLE = "rle"
+
+# Codecs without the numpy engine and parallel=N
+PYTHON_ONLY_CODECS = (COMPRESSOR_PFOR, COMPRESSOR_BLOCK_ADAPTIVE)
 
 # This is the "Factory" pattern
 # It creates the compressor objects for us
@@ -15,18 +34,113 @@ class CompressorFactory:
 
     @staticmethod
     def create_compressor(compressor_type: str, **kwargs) -> IntegerCompressor:
+        # Optional snapshot stage, for a compressor shared by several threads
+        # (or used from asyncio): every compress() builds a new codec with the same arguments
+        if kwargs.get("concurrent", False):
+            codec_kwargs = dict(kwargs, concurrent=False)
+            return ConcurrentCompressor(
+                lambda: CompressorFactory.create_compressor(compressor_type, **codec_kwargs),
+                executor=kwargs.get("executor"))
+
+        compressor = CompressorFactory._create_codec(compressor_type, **kwargs)
+
+        # Optional pre-transform stage in front of the codec
+        # delta=True for sorted columns, zigzag=True for signed values
+        delta: bool = kwargs.get("delta", False)
+        zigzag: bool = kwargs.get("zigzag", False)
+        if delta or zigzag:
+            checkpoint_interval: int = kwargs.get("checkpoint_interval", DEFAULT_CHECKPOINT_INTERVAL)
+            compressor = DeltaZigzagCompressor(compressor, delta=delta, zigzag=zigzag,
+                                               checkpoint_interval=checkpoint_interval)
+
+        # Optional LRU cache of decoded blocks, for get() with a lot of locality
+        if kwargs.get("cache", False):
+            cache_block_size: int = kwargs.get("cache_block_size", DEFAULT_CACHE_BLOCK_SIZE)
+            cache_budget: int = kwargs.get("cache_budget", DEFAULT_CACHE_BUDGET)
+            compressor = CachedCompressor(compressor, block_size=cache_block_size,
+                                          memory_budget=cache_budget)
+        return compressor
+
+    @staticmethod
+    def create_best(data, objective: str = OBJECTIVE_SIZE, **kwargs) -> Tuple[IntegerCompressor, Dict[str, Any]]:
+        # Pick the codec from a sample of 'data' (see cost_model.py)
+        # objective: "size", "decode_speed" or "random_access"
+        # Returns the compressor (not compressed yet) + a report that explains the choice
+        # Other arguments (engine, cache...) are given to create_compressor()
+        exclude: Tuple[str, ...] = ()
+        if kwargs.get("engine", ENGINE_PYTHON) != ENGINE_PYTHON or kwargs.get("parallel", 1) != 1:
+            # Only the codecs that support these options
+            exclude = PYTHON_ONLY_CODECS
+        compressor_type, codec_kwargs, report = cost_model.select_codec(data, objective, exclude)
+        compressor = CompressorFactory.create_compressor(compressor_type, **{**kwargs, **codec_kwargs})
+        return compressor, report
+
+    @staticmethod
+    def _create_codec(compressor_type: str, **kwargs) -> IntegerCompressor:
+
+        # Get the 'engine' argument
+        # "python" (default) or "numpy" for the vectorized engine
+        engine: str = kwargs.get("engine", ENGINE_PYTHON)
+
+        # Get the 'parallel' argument
+        # Number of worker processes for big inputs (default: 1, no pool)
+        parallel: int = kwargs.get("parallel", 1)
+
+        # Get the 'word_bits' argument
+        # 32 (default) or 64 for values wider than 32 bits
+        word_bits: int = kwargs.get("word_bits", 32)
+
+        # Get the 'widen' argument
+        # What extend() does when a value needs a wider k: "segment" (default) or "repack"
+        widen: str = kwargs.get("widen", WIDEN_SEGMENT)
         
         if compressor_type == COMPRESSOR_NON_SPANNING:
-            return BitPackingNonSpanning()
+            return BitPackingNonSpanning(engine=engine, parallel=parallel, word_bits=word_bits, widen=widen)
             
         elif compressor_type == COMPRESSOR_SPANNING:
-            return BitPackingSpanning()
+            return BitPackingSpanning(engine=engine, parallel=parallel, word_bits=word_bits, widen=widen)
             
         elif compressor_type == COMPRESSOR_OVERFLOW:
             # Get the 'main_bits' argument
-            # Default to 8 bits if not provided
-            main_bits: int = kwargs.get("main_bits", 8) 
-            return BitPackingOverflow(main_bits=main_bits)
+            # Default to 8 bits if not provided, "auto" to let compress() choose
+            main_bits = kwargs.get("main_bits", 8) 
+            return BitPackingOverflow(main_bits=main_bits, engine=engine, parallel=parallel,
+                                      word_bits=word_bits)
+
+        elif compressor_type == COMPRESSOR_PFOR:
+            # Get the 'main_bits' argument
+            # Default to "auto": compress() chooses k' from the data
+            main_bits = kwargs.get("main_bits", MAIN_BITS_AUTO)
+            CompressorFactory._check_python_only(compressor_type, engine, parallel)
+            return BitPackingPFor(main_bits=main_bits, word_bits=word_bits)
+
+        elif compressor_type == COMPRESSOR_DICTIONARY:
+            # Get the 'dictionary_order' argument
+            # "sorted" (default) or "frequency" (most frequent values get the smallest codes)
+            order: str = kwargs.get("dictionary_order", DICTIONARY_SORTED)
+            # Get the 'max_cardinality' argument
+            # Above this many distinct values, plain packing is used (default: 4096)
+            max_cardinality: int = kwargs.get("max_cardinality", DEFAULT_MAX_CARDINALITY)
+            return BitPackingDictionary(order=order, max_cardinality=max_cardinality, engine=engine,
+                                        parallel=parallel, word_bits=word_bits)
+
+        elif compressor_type == COMPRESSOR_RLE:
+            return BitPackingRLE(engine=engine, parallel=parallel, word_bits=word_bits)
+
+        elif compressor_type == COMPRESSOR_BLOCK_ADAPTIVE:
+            # Get the 'block_size' argument
+            # Default to 128 values per block if not provided
+            block_size: int = kwargs.get("block_size", DEFAULT_BLOCK_SIZE)
+            CompressorFactory._check_python_only(compressor_type, engine, parallel)
+            return BitPackingBlockAdaptive(block_size=block_size, word_bits=word_bits)
             
         else:
-            raise ValueError(f"Unknown compressor type: '{compressor_type}'")
\ No newline at end of file
+            raise ValueError(f"Unknown compressor type: '{compressor_type}'")
+
+    @staticmethod
+    def _check_python_only(compressor_type: str, engine: str, parallel: int) -> None:
+        # These codecs only have the pure Python code: say it instead of
+        # silently running it (and a benchmark labelled "numpy" measuring Python)
+        if engine != ENGINE_PYTHON or parallel != 1:
+            raise ValueError(f"'{compressor_type}' only supports engine='{ENGINE_PYTHON}' and parallel=1, "
+                             f"got engine='{engine}', parallel={parallel}")
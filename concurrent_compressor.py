@@ -0,0 +1,196 @@
+import asyncio
+import threading
+from array import array
+from concurrent.futures import Executor
+from typing import BinaryIO, Callable, Dict, List, Optional
+from integer_compressor import IntegerCompressor, writable
+from instrumentation import INSTRUMENTED_OPERATIONS
+
+# Below this many values, the async methods run in the event loop thread
+# (an executor round trip costs more than the work itself)
+ASYNC_INLINE_LIMIT = 4096
+
+
+def clone_compressor(compressor: IntegerCompressor, memo: Optional[Dict[int, object]] = None) -> IntegerCompressor:
+    # Copy of a compressor that shares no array with it
+    # (like copy.deepcopy(), but memoryviews from mmap=True become arrays,
+    # and the arrays shared by a decorator and its wrapped codec stay shared)
+    if memo is None:
+        memo = {}
+    if id(compressor) in memo:
+        return memo[id(compressor)]
+
+    clone = object.__new__(type(compressor))
+    memo[id(compressor)] = clone
+    for name, value in vars(compressor).items():
+        if name in INSTRUMENTED_OPERATIONS or name == "_stats":
+            # The timed methods are bound to the original: the copy starts without stats
+            continue
+        if isinstance(value, (array, memoryview)):
+            if id(value) not in memo:
+                memo[id(value)] = value[:] if isinstance(value, array) else writable(value)
+            value = memo[id(value)]
+        elif isinstance(value, IntegerCompressor):
+            value = clone_compressor(value, memo)
+        elif isinstance(value, (dict, list)):
+            # e.g. the blocks of a CachedCompressor (the decoded lists are never changed)
+            value = value.copy()
+        setattr(clone, name, value)
+    return clone
+
+
+# This is the "concurrent" version, for compressors shared by several threads
+# The real codec is an immutable snapshot: it is never changed once published.
+#   - Reads take the current snapshot once and only use it: no lock, and
+#     they never see a half-written state (new words with an old k...)
+#   - compress() builds a new codec on the side, extend() changes a copy,
+#     then the new snapshot is published with one assignment
+# The copy is a full one: extend() costs O(n) in time and memory, whatever
+# the size of the batch (few big batches are fine, many small ones are not).
+# Only this opt-in wrapper publishes atomically: the plain codecs were not
+# changed, and a reader that runs during their compress() / extend() can
+# still see a half-written state.
+class ConcurrentCompressor(IntegerCompressor):
+
+    def __init__(self, compressor_builder: Callable[[], IntegerCompressor],
+                 executor: Optional[Executor] = None) -> None:
+        # No super().__init__(): compressed_data, num_elements and
+        # bits_per_element are read from the snapshot (see the properties below)
+
+        # Makes an empty codec with the right configuration (type, k', engine...)
+        self._compressor_builder = compressor_builder
+        self._snapshot: IntegerCompressor = compressor_builder()
+
+        # Writers are serialized, readers never take it
+        self._write_lock = threading.Lock()
+
+        # Executor of the async methods (None = default executor of the event loop)
+        self.executor: Optional[Executor] = executor
+
+    @property
+    def snapshot(self) -> IntegerCompressor:
+        # The current codec: several reads on it are consistent with each other
+        return self._snapshot
+
+    @property
+    def compressed_data(self) -> array:
+        return self._snapshot.compressed_data
+
+    @property
+    def num_elements(self) -> int:
+        return self._snapshot.num_elements
+
+    @property
+    def bits_per_element(self) -> int:
+        return self._snapshot.bits_per_element
+
+    # ---- Writes: build, then publish ----
+
+    def compress(self, data: List[int]) -> None:
+        # Built outside the lock: readers (and other writers) are not blocked
+        compressor = self._compressor_builder()
+        compressor.compress(data)
+        self.publish(compressor)
+
+    def extend(self, values) -> None:
+        # Copy-on-write: the current snapshot is copied, never changed
+        # (the whole column, under the lock: O(n) per call, see above)
+        with self._write_lock:
+            compressor = clone_compressor(self._snapshot)
+            compressor.extend(values)
+            self._snapshot = compressor
+
+    def publish(self, compressor: IntegerCompressor) -> None:
+        # Replace the snapshot (e.g. with a codec loaded from a file)
+        # The caller must not change 'compressor' after this call
+        with self._write_lock:
+            self._snapshot = compressor
+
+    # ---- Reads: one snapshot per call ----
+
+    def get(self, i: int) -> int:
+        return self._snapshot.get(i)
+
+    def get_many(self, indices) -> List[int]:
+        return self._snapshot.get_many(indices)
+
+    def decompress(self) -> List[int]:
+        return self._snapshot.decompress()
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        return self._snapshot.decompress_range(start, stop)
+
+    def sum(self) -> int:
+        return self._snapshot.sum()
+
+    def min(self) -> int:
+        return self._snapshot.min()
+
+    def max(self) -> int:
+        return self._snapshot.max()
+
+    def count_where(self, lo=None, hi=None) -> int:
+        return self._snapshot.count_where(lo, hi)
+
+    def select_where(self, lo=None, hi=None) -> List[int]:
+        return self._snapshot.select_where(lo, hi)
+
+    def searchsorted(self, value: int, side: str = "left") -> int:
+        return self._snapshot.searchsorted(value, side)
+
+    def contains(self, value: int) -> bool:
+        return self._snapshot.contains(value)
+
+    def next_geq(self, value: int) -> Optional[int]:
+        return self._snapshot.next_geq(value)
+
+    def intersect(self, other: IntegerCompressor) -> List[int]:
+        # One snapshot of each side for the whole intersection
+        if isinstance(other, ConcurrentCompressor):
+            other = other.snapshot
+        return self._snapshot.intersect(other)
+
+    def _record_get(self, i: int, stats) -> None:
+        self._snapshot._record_get(i, stats)
+
+    def _stats_gauges(self, counters):
+        return self._snapshot._stats_gauges(counters)
+
+    def get_compressed_size_in_bytes(self) -> int:
+        return self._snapshot.get_compressed_size_in_bytes()
+
+    def write_to(self, stream: BinaryIO) -> None:
+        # The file holds the current snapshot
+        self._snapshot.write_to(stream)
+
+    # ---- asyncio facade ----
+    # Big operations run in the executor so they do not block the event loop
+
+    async def _run(self, size: int, function: Callable, *args):
+        if size < ASYNC_INLINE_LIMIT:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def aget(self, i: int) -> int:
+        return self._snapshot.get(i)
+
+    async def aget_many(self, indices) -> List[int]:
+        snapshot = self._snapshot
+        return await self._run(len(indices), snapshot.get_many, indices)
+
+    async def adecompress(self) -> List[int]:
+        snapshot = self._snapshot
+        return await self._run(snapshot.num_elements, snapshot.decompress)
+
+    async def adecompress_range(self, start: int, stop: int) -> List[int]:
+        snapshot = self._snapshot
+        return await self._run(stop - start, snapshot.decompress_range, start, stop)
+
+    async def acompress(self, data: List[int]) -> None:
+        await self._run(len(data), self.compress, data)
+
+    async def aextend(self, values) -> None:
+        # The copy costs as much as the column, so it always goes to the executor
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.extend, values)
@@ -0,0 +1,298 @@
+import math
+from itertools import islice
+from operator import sub
+from typing import Any, Dict, List, Tuple
+from bit_packing_overflow import choose_main_bits, predict_overflow_size
+from bit_packing_pfor import choose_pfor_bits, predict_pfor_size
+from bit_packing_dictionary import DEFAULT_MAX_CARDINALITY
+from bit_packing_block_adaptive import DEFAULT_BLOCK_SIZE
+from delta_zigzag import DEFAULT_CHECKPOINT_INTERVAL, zigzag_encode
+from integer_compressor import check_value_bits
+
+# Codec choice from a sample of the input (used by CompressorFactory.create_best())
+#
+# Nothing is compressed here: we read a few contiguous runs of the input,
+# compute some statistics on them (bit-length histogram, outliers, sortedness)
+# and predict the size and the speed of every codec with simple formulas.
+# The sizes use the same rules as get_compressed_size_in_bytes(), the speeds
+# are average costs per value measured with the Python engine (benchmark.py).
+
+OBJECTIVE_SIZE = "size"
+OBJECTIVE_DECODE_SPEED = "decode_speed"
+OBJECTIVE_RANDOM_ACCESS = "random_access"
+OBJECTIVES = (OBJECTIVE_SIZE, OBJECTIVE_DECODE_SPEED, OBJECTIVE_RANDOM_ACCESS)
+
+# Inputs up to this size are read completely
+SAMPLE_SIZE = 1 << 16
+
+# Bigger inputs: this many runs of SAMPLE_SIZE // SAMPLE_RUNS contiguous values,
+# spread over the input (contiguous, so the deltas and the blocks are real ones)
+SAMPLE_RUNS = 64
+
+# Candidates whose cost is within this margin of the best one are "as fast":
+# the smallest of them is chosen
+COST_MARGIN = 0.10
+
+# Average cost per value in ns (decompress) and per call in ns (get)
+DECODE_COST_NS = {"non_spanning": 200, "spanning": 280, "overflow": 300, "pfor": 280, "dictionary": 330,
+                  "block_adaptive": 500}
+GET_COST_NS = {"non_spanning": 900, "spanning": 900, "overflow": 1200, "pfor": 1100, "dictionary": 1100,
+               "block_adaptive": 2000}
+# Extra cost of one value of the overflow area (or PFOR exception) / one delta to add up
+OVERFLOW_VALUE_COST_NS = 300
+DELTA_COST_NS = 550
+# Run-length: a value costs (almost) nothing, a run costs the decoding of its value and its end
+RLE_VALUE_COST_NS = 25
+RLE_RUN_COST_NS = 1000
+
+# Minimum share of non-decreasing neighbours for the delta candidate
+SORTED_THRESHOLD = 0.9
+
+# The dictionary candidate needs every distinct value to be seen many times in the
+# sample (else the sample surely missed some of them): at most 1 distinct value per 16
+DISTINCT_SHARE = 1 / 16
+
+
+def sample_runs(data) -> List[List[int]]:
+    # Contiguous runs of the input (the whole input if it is small)
+    n = len(data)
+    if n <= SAMPLE_SIZE:
+        return [_as_list(data[0:n])]
+    run_length = SAMPLE_SIZE // SAMPLE_RUNS
+    step = (n - run_length) // (SAMPLE_RUNS - 1)
+    return [_as_list(data[start:start + run_length]) for start in range(0, step * SAMPLE_RUNS, step)]
+
+
+def _as_list(values) -> List[int]:
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+def _max_value(data) -> int:
+    # Exact max of the whole input: one pass in C (the sample could miss a
+    # 40-bit outlier, and then the 32-bit words would not be enough)
+    if hasattr(data, "max") and not isinstance(data, list):
+        return int(data.max())
+    return max(data)
+
+
+def _max_delta_bits(data) -> int:
+    # Exact width of the widest zigzag delta of the whole input, in C too (one
+    # big drop the sample missed would not fit the words of the delta candidate)
+    if len(data) < 2:
+        return 0
+    if hasattr(data, "astype") and not isinstance(data, list):
+        if int(data.max()).bit_length() <= 62:
+            values = data.astype("int64")
+            deltas = values[1:] - values[:-1]
+            return max(zigzag_encode(int(deltas.max())), zigzag_encode(int(deltas.min()))).bit_length()
+        data = data.tolist()
+    largest = max(map(sub, islice(data, 1, None), data))
+    smallest = min(map(sub, islice(data, 1, None), data))
+    return max(zigzag_encode(largest), zigzag_encode(smallest)).bit_length()
+
+
+def input_statistics(data) -> Dict[str, Any]:
+    # Statistics of the sample, used by the cost model
+    # (no codec holds values wider than 64 bits: say it now, not in the histogram)
+    max_bits = _max_value(data).bit_length() if len(data) else 0
+    check_value_bits(max_bits, 64)
+    runs = sample_runs(data)
+    sample_size = sum(len(run) for run in runs)
+
+    bit_length_counts = [0] * 65
+    all_ones_counts = [0] * 65
+    non_decreasing = 0
+    changes = 0
+    pairs = 0
+    max_delta_bits = 0
+    block_bits_total = 0
+    blocks = 0
+    distinct = set()
+    for run in runs:
+        distinct.update(run)
+        for value in run:
+            bits = value.bit_length()
+            bit_length_counts[bits] += 1
+            if value == (1 << bits) - 1:
+                all_ones_counts[bits] += 1
+
+        # Deltas between neighbours (zigzag, so unsorted runs are fine too)
+        for previous, value in zip(run, run[1:]):
+            if value >= previous:
+                non_decreasing += 1
+            if value != previous:
+                changes += 1
+            max_delta_bits = max(max_delta_bits, zigzag_encode(value - previous).bit_length())
+        pairs += len(run) - 1
+
+        # Frame of reference per block, like the block adaptive codec
+        for start in range(0, len(run), DEFAULT_BLOCK_SIZE):
+            block = run[start:start + DEFAULT_BLOCK_SIZE]
+            block_bits_total += (max(block) - min(block)).bit_length()
+            blocks += 1
+
+    sortedness = non_decreasing / pairs if pairs else 1.0
+    if sortedness >= SORTED_THRESHOLD:
+        # The delta candidate will be considered: its width must hold for every value
+        max_delta_bits = _max_delta_bits(data)
+
+    return {
+        "num_elements": len(data),
+        "sample_size": sample_size,
+        "max_bits": max_bits,
+        "bit_length_counts": bit_length_counts,
+        "all_ones_counts": all_ones_counts,
+        "sortedness": sortedness,
+        "run_break_fraction": changes / pairs if pairs else 0.0,
+        "max_delta_bits": max(max_delta_bits, 1),
+        "mean_block_bits": block_bits_total / blocks if blocks else 0.0,
+        "distinct_values": len(distinct),
+    }
+
+
+def estimate_candidates(stats: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # Predicted size (bytes) and costs (ns) of every codec that can hold the input
+    n = stats["num_elements"]
+    k = max(stats["max_bits"], 1)
+    word_bits = 32 if k <= 32 else 64
+    word_size = word_bits // 8
+    candidates: Dict[str, Dict[str, Any]] = {}
+
+    def add(name: str, compressor_type: str, kwargs: Dict[str, Any], size: float,
+            decode_ns: float, get_ns: float, **details) -> None:
+        candidates[name] = {
+            "compressor_type": compressor_type,
+            "kwargs": kwargs,
+            "size_bytes": int(size),
+            "decode_seconds": decode_ns * n / 1e9,
+            "get_ns": get_ns,
+            **details,
+        }
+
+    common = {"word_bits": word_bits} if word_bits == 64 else {}
+
+    # 1 - Non-spanning and spanning: k from the exact max
+    # (non-spanning needs at least one element per word)
+    if k <= word_bits:
+        elements_per_int = word_bits // k
+        add("non_spanning", "non_spanning", dict(common),
+            math.ceil(n / elements_per_int) * word_size,
+            DECODE_COST_NS["non_spanning"], GET_COST_NS["non_spanning"], bits_per_element=k)
+    add("spanning", "spanning", dict(common),
+        math.ceil(n * k / word_bits) * word_size,
+        DECODE_COST_NS["spanning"], GET_COST_NS["spanning"], bits_per_element=k)
+
+    # 2 - Overflow: best k' for the sample histogram, then the size for the whole input
+    # with the same share of overflow values
+    bit_length_counts = stats["bit_length_counts"]
+    all_ones_counts = stats["all_ones_counts"]
+    main_bits, _ = choose_main_bits(bit_length_counts, all_ones_counts, stats["sample_size"], word_bits)
+    outliers = sum(bit_length_counts[main_bits + 1:]) + all_ones_counts[main_bits]
+    outlier_fraction = outliers / stats["sample_size"]
+    overflow_size = predict_overflow_size(n, main_bits, round(outlier_fraction * n), word_bits)
+    add("overflow", "overflow", dict(common, main_bits="auto"), overflow_size,
+        DECODE_COST_NS["overflow"] + OVERFLOW_VALUE_COST_NS * outlier_fraction,
+        GET_COST_NS["overflow"] + OVERFLOW_VALUE_COST_NS * outlier_fraction,
+        bits_per_element=main_bits, outlier_fraction=outlier_fraction)
+
+    # 3 - PFOR: same idea, but only the values wider than k' are exceptions
+    main_bits, _ = choose_pfor_bits(bit_length_counts, stats["sample_size"], word_bits)
+    exception_fraction = sum(bit_length_counts[main_bits + 1:]) / stats["sample_size"]
+    add("pfor", "pfor", dict(common, main_bits="auto"),
+        predict_pfor_size(n, main_bits, round(exception_fraction * n), word_bits),
+        DECODE_COST_NS["pfor"] + OVERFLOW_VALUE_COST_NS * exception_fraction,
+        GET_COST_NS["pfor"] + OVERFLOW_VALUE_COST_NS * exception_fraction,
+        bits_per_element=main_bits, outlier_fraction=exception_fraction)
+
+    # 4 - Dictionary, for low-cardinality inputs: codes of (cardinality - 1).bit_length() bits
+    cardinality = stats["distinct_values"]
+    if cardinality <= min(DEFAULT_MAX_CARDINALITY, stats["sample_size"] * DISTINCT_SHARE):
+        code_bits = max((cardinality - 1).bit_length(), 1)
+        add("dictionary", "dictionary", dict(common),
+            math.ceil(n * code_bits / word_bits) * word_size + cardinality * word_size,
+            DECODE_COST_NS["dictionary"], GET_COST_NS["dictionary"],
+            bits_per_element=code_bits, cardinality=cardinality)
+
+    # 5 - Run-length: number of runs from the share of neighbours that differ,
+    # every run = its value (k bits) + its end (bits of n)
+    runs = 1 + round((n - 1) * stats["run_break_fraction"])
+    add("rle", "rle", dict(common),
+        math.ceil(runs * k / word_bits) * word_size + math.ceil(runs * n.bit_length() / word_bits) * word_size,
+        RLE_VALUE_COST_NS + RLE_RUN_COST_NS * runs / n,
+        GET_COST_NS["spanning"] * (runs.bit_length() + 1),
+        bits_per_element=k, runs=runs)
+
+    # 6 - Block adaptive: mean k of the sampled blocks + directory (min, k, offset)
+    block_words = math.ceil(DEFAULT_BLOCK_SIZE * stats["mean_block_bits"] / word_bits)
+    num_blocks = math.ceil(n / DEFAULT_BLOCK_SIZE)
+    add("block_adaptive", "block_adaptive", dict(common),
+        num_blocks * (block_words * word_size + word_size + 1 + 4),
+        DECODE_COST_NS["block_adaptive"], GET_COST_NS["block_adaptive"],
+        bits_per_element=stats["mean_block_bits"])
+
+    # 7 - Delta + zigzag in front of spanning, for (almost) sorted inputs
+    # (zigzag too, so a few decreasing values do not break it; the checkpoints
+    # are signed 64-bit values)
+    if (stats["sortedness"] >= SORTED_THRESHOLD and stats["max_delta_bits"] <= word_bits
+            and stats["max_bits"] < 64):
+        delta_bits = stats["max_delta_bits"]
+        checkpoints = math.ceil(n / DEFAULT_CHECKPOINT_INTERVAL)
+        add("spanning+delta", "spanning", dict(common, delta=True, zigzag=True),
+            math.ceil(n * delta_bits / word_bits) * word_size + checkpoints * 8,
+            DECODE_COST_NS["spanning"] + DELTA_COST_NS,
+            GET_COST_NS["spanning"] + DELTA_COST_NS * DEFAULT_CHECKPOINT_INTERVAL / 2,
+            bits_per_element=delta_bits)
+    return candidates
+
+
+def choose(candidates: Dict[str, Dict[str, Any]], objective: str) -> Tuple[str, str]:
+    # Name of the best candidate for the objective + why
+    def smallest(names):
+        # Same size: the fastest to decode
+        return min(names, key=lambda name: (candidates[name]["size_bytes"], candidates[name]["decode_seconds"]))
+
+    if objective == OBJECTIVE_SIZE:
+        best = smallest(candidates)
+        return best, f"smallest predicted size ({candidates[best]['size_bytes']} bytes)"
+
+    metric = "decode_seconds" if objective == OBJECTIVE_DECODE_SPEED else "get_ns"
+    fastest = min(candidate[metric] for candidate in candidates.values())
+    # Almost as fast = as fast: then the size decides
+    close = [name for name, candidate in candidates.items() if candidate[metric] <= fastest * (1 + COST_MARGIN)]
+    best = smallest(close)
+    reason = f"lowest predicted {metric} ({candidates[best][metric]:.6g})"
+    if len(close) > 1:
+        reason += f", smallest of {', '.join(sorted(close))} (within {COST_MARGIN:.0%} of the fastest)"
+    return best, reason
+
+
+def select_codec(data, objective: str = OBJECTIVE_SIZE,
+                 exclude: Tuple[str, ...] = ()) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    # (compressor type, factory arguments, report) for the input
+    # 'exclude': compressor types that must not be chosen
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: '{objective}' (allowed: {', '.join(OBJECTIVES)})")
+    if len(data) == 0:
+        report = {"objective": objective, "chosen": "spanning", "reason": "empty input", "candidates": {}}
+        return "spanning", {}, report
+
+    stats = input_statistics(data)
+    candidates = {name: candidate for name, candidate in estimate_candidates(stats).items()
+                  if candidate["compressor_type"] not in exclude}
+    best, reason = choose(candidates, objective)
+    report = {
+        "objective": objective,
+        "chosen": best,
+        "reason": reason,
+        "statistics": {
+            "num_elements": stats["num_elements"],
+            "sample_size": stats["sample_size"],
+            "max_bits": stats["max_bits"],
+            "sortedness": stats["sortedness"],
+            "run_break_fraction": stats["run_break_fraction"],
+            "outlier_fraction": candidates["overflow"]["outlier_fraction"],
+            "bit_length_histogram": {bits: count for bits, count in enumerate(stats["bit_length_counts"]) if count},
+        },
+        "candidates": candidates,
+    }
+    return candidates[best]["compressor_type"], dict(candidates[best]["kwargs"]), report
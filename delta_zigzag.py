@@ -0,0 +1,229 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List
+from integer_compressor import IntegerCompressor, codec_from_state, writable
+
+# Default distance between two absolute values (checkpoints)
+DEFAULT_CHECKPOINT_INTERVAL = 128
+
+# Range of a checkpoint: array('q') holds signed 64-bit values
+CHECKPOINT_MIN = -(1 << 63)
+CHECKPOINT_MAX = (1 << 63) - 1
+
+
+def zigzag_encode(value: int) -> int:
+    # Signed -> unsigned: 0, -1, 1, -2, 2... -> 0, 1, 2, 3, 4...
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def zigzag_decode(value: int) -> int:
+    # Inverse of zigzag_encode()
+    return value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
+
+
+# This is the "delta + zigzag" pre-transform stage
+# It is a Decorator (like the overflow version) that can go in front of any codec:
+#   - delta:  store x[i] - x[i-1] instead of x[i] (small for sorted columns)
+#             with an absolute checkpoint every 'checkpoint_interval' values,
+#             so get(i) only has to add up the deltas since the last checkpoint
+#   - zigzag: map signed values (or signed deltas) to unsigned ones
+class DeltaZigzagCompressor(IntegerCompressor):
+
+    codec_name = "delta_zigzag"
+
+    def __init__(self, wrapped_compressor: IntegerCompressor, delta: bool = True,
+                 zigzag: bool = False, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        super().__init__()
+        if checkpoint_interval <= 0:
+            raise ValueError(f"checkpoint_interval must be positive, got {checkpoint_interval}")
+
+        # The codec that stores the transformed values
+        self.wrapped_compressor: IntegerCompressor = wrapped_compressor
+        self.delta: bool = delta
+        self.zigzag: bool = zigzag
+        self.checkpoint_interval: int = checkpoint_interval
+
+        # Absolute value at every position multiple of checkpoint_interval
+        # 'q' = signed 64-bit, so negative values are fine here
+        self.checkpoints: array = array('q')
+
+    def compress(self, data: List[int]) -> None:
+        # 1 - Transform the values (in locals: if a value is rejected,
+        # the compressor keeps its previous content)
+        checkpoints = array('q')
+        transformed: List[int] = []
+        if self.delta:
+            previous = 0
+            for i, val in enumerate(data):
+                if i % self.checkpoint_interval == 0:
+                    # Absolute value in the checkpoints, nothing in the stream
+                    checkpoints.append(self._checkpoint_value(i, val, previous))
+                    transformed.append(0)
+                else:
+                    transformed.append(self._encode(val - previous))
+                previous = val
+        else:
+            transformed = [self._encode(val) for val in data]
+
+        # 2 - Compress them with the wrapped codec, then publish the new state
+        self.wrapped_compressor.compress(transformed)
+        self.num_elements = len(data)
+        self.checkpoints = checkpoints
+        self.compressed_data = self.wrapped_compressor.compressed_data
+        self.bits_per_element = self.wrapped_compressor.bits_per_element
+
+    def extend(self, values) -> None:
+        # Transform the batch from the last value on, then append it to the wrapped codec
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if not values:
+            return
+        if self.num_elements == 0:
+            self.compress(values)
+            return
+
+        new_checkpoints: List[int] = []
+        transformed: List[int] = []
+        if self.delta:
+            previous = self.get(self.num_elements - 1)
+            for i, val in enumerate(values, self.num_elements):
+                if i % self.checkpoint_interval == 0:
+                    new_checkpoints.append(self._checkpoint_value(i, val, previous))
+                    transformed.append(0)
+                else:
+                    transformed.append(self._encode(val - previous))
+                previous = val
+        else:
+            transformed = [self._encode(val) for val in values]
+
+        # Nothing is changed before the whole batch is encoded
+        self.wrapped_compressor.extend(transformed)
+        if new_checkpoints:
+            self.checkpoints = writable(self.checkpoints)
+            self.checkpoints.extend(new_checkpoints)
+        self.num_elements += len(values)
+        self.compressed_data = self.wrapped_compressor.compressed_data
+        self.bits_per_element = self.wrapped_compressor.bits_per_element
+
+    def _checkpoint_value(self, i: int, val: int, previous: int) -> int:
+        # A checkpoint follows the same rule as a delta (sorted input without zigzag),
+        # and must fit in the signed 64-bit checkpoints
+        if i > 0 and not self.zigzag and val < previous:
+            raise ValueError("Negative delta (input is not sorted): use zigzag=True")
+        if not CHECKPOINT_MIN <= val <= CHECKPOINT_MAX:
+            raise ValueError(f"Value {val} does not fit in the signed 64-bit checkpoints of the delta stage")
+        return val
+
+    def _encode(self, value: int) -> int:
+        if self.zigzag:
+            return zigzag_encode(value)
+        if value < 0:
+            if self.delta:
+                raise ValueError("Negative delta (input is not sorted): use zigzag=True")
+            raise ValueError("Negative value: use zigzag=True")
+        return value
+
+    def _decode(self, value: int) -> int:
+        return zigzag_decode(value) if self.zigzag else value
+
+    def get(self, i: int) -> int:
+        if not (0 <= i < self.num_elements):
+            raise IndexError(f"Index {i} is out of bounds")
+
+        if not self.delta:
+            return self._decode(self.wrapped_compressor.get(i))
+
+        # Start from the nearest checkpoint and add the deltas up to i
+        checkpoint_index, offset = divmod(i, self.checkpoint_interval)
+        value = self.checkpoints[checkpoint_index]
+        if offset:
+            start = i - offset + 1
+            for stored in self.wrapped_compressor.decompress_range(start, i + 1):
+                value += self._decode(stored)
+        return value
+
+    def decompress(self) -> List[int]:
+        return self.decompress_range(0, self.num_elements)
+
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        self._check_range(start, stop)
+
+        if not self.delta:
+            return [self._decode(stored) for stored in self.wrapped_compressor.decompress_range(start, stop)]
+
+        # Decode from the checkpoint before 'start', then drop the extra values
+        first = start - start % self.checkpoint_interval
+        result: List[int] = []
+        value = 0
+        for position, stored in enumerate(self.wrapped_compressor.decompress_range(first, stop), first):
+            if position % self.checkpoint_interval == 0:
+                value = self.checkpoints[position // self.checkpoint_interval]
+            else:
+                value += self._decode(stored)
+            if position >= start:
+                result.append(value)
+        return result
+
+    def min(self) -> int:
+        # Delta without zigzag only accepts sorted input: compress() and extend()
+        # reject every decreasing value, deltas and checkpoints alike
+        # (see _checkpoint_value()), so the first value is the min, the last the max
+        if self.delta and not self.zigzag:
+            self._check_not_empty("min")
+            return self.get(0)
+        return super().min()
+
+    def max(self) -> int:
+        if self.delta and not self.zigzag:
+            self._check_not_empty("max")
+            return self.get(self.num_elements - 1)
+        return super().max()
+
+    def _lower_bound(self, value: int, lo: int, hi: int, right: bool = False) -> int:
+        if not self.delta or self.num_elements == 0:
+            return super()._lower_bound(value, lo, hi, right)
+
+        # The checkpoints are a sparse index of the sorted column: bisect them,
+        # then decode the one interval that holds the answer
+        search = bisect_right if right else bisect_left
+        checkpoint = search(self.checkpoints, value)
+        position = 0
+        if checkpoint > 0:
+            start = (checkpoint - 1) * self.checkpoint_interval
+            stop = min(start + self.checkpoint_interval, self.num_elements)
+            position = start + search(self.decompress_range(start, stop), value)
+        return min(max(position, lo), hi)
+
+    def get_compressed_size_in_bytes(self) -> int:
+        # Wrapped codec + checkpoints
+        checkpoints_size = self.checkpoints.itemsize * len(self.checkpoints)
+        return self.wrapped_compressor.get_compressed_size_in_bytes() + checkpoints_size
+
+    def _get_state(self):
+        # Our own fields + the full state of the wrapped codec
+        wrapped_meta, wrapped_arrays = self.wrapped_compressor._get_state()
+        meta = {
+            "num_elements": self.num_elements,
+            "delta": self.delta,
+            "zigzag": self.zigzag,
+            "checkpoint_interval": self.checkpoint_interval,
+            "wrapped_codec": self.wrapped_compressor.codec_name,
+            "wrapped_meta": wrapped_meta,
+        }
+        arrays = {"checkpoints": self.checkpoints}
+        for name, data in wrapped_arrays.items():
+            arrays["wrapped." + name] = data
+        return meta, arrays
+
+    @classmethod
+    def _from_state(cls, meta, arrays) -> "DeltaZigzagCompressor":
+        wrapped_arrays = {name[len("wrapped."):]: data for name, data in arrays.items()
+                          if name.startswith("wrapped.")}
+        wrapped = codec_from_state(meta["wrapped_codec"], meta["wrapped_meta"], wrapped_arrays)
+
+        compressor = cls(wrapped, delta=meta["delta"], zigzag=meta["zigzag"],
+                         checkpoint_interval=meta["checkpoint_interval"])
+        compressor.num_elements = meta["num_elements"]
+        compressor.checkpoints = arrays["checkpoints"]
+        compressor.compressed_data = wrapped.compressed_data
+        compressor.bits_per_element = wrapped.bits_per_element
+        return compressor
@@ -0,0 +1,169 @@
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+# Operations that get a call count and a timer
+INSTRUMENTED_OPERATIONS = ("compress", "extend", "decompress", "decompress_range", "get", "get_many")
+
+# Operations that decode values (counted in values_decoded / bytes_decoded)
+DECODING_OPERATIONS = ("decompress", "decompress_range", "get", "get_many")
+
+# Operations whose peak memory is measured with enable_stats(memory=True)
+MEMORY_OPERATIONS = ("compress", "extend")
+
+
+# Counters and timers of one compressor
+#
+# Nothing is measured until enable_stats() is called on the compressor:
+# it replaces the methods above by timed versions on the instance only,
+# so a compressor without stats runs the plain class methods (no "if enabled" test).
+class CompressorStats:
+
+    def __init__(self, callback: Optional[Callable[[Dict[str, object]], None]] = None,
+                 memory: bool = False) -> None:
+        # Called with the snapshot by export()
+        self.callback = callback
+        # Measure the peak memory of compress / extend (tracemalloc slows them down)
+        self.memory = memory
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        # Bytes allocated at the peak of the last call / of the biggest call
+        self.last_peak_bytes: Dict[str, int] = {}
+        self.max_peak_bytes: Dict[str, int] = {}
+        # Free counters, filled by the codecs (_record_get)
+        self.counters: Dict[str, int] = {}
+        # busy = True inside a timed operation: the nested calls (decompress -> get...)
+        # are not counted twice. One flag per thread, so the other threads are still counted
+        self._local = threading.local()
+
+    def add(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, operation: str, seconds: float) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        self.seconds[operation] = self.seconds.get(operation, 0.0) + seconds
+
+    def record_peak(self, operation: str, peak_bytes: int) -> None:
+        self.last_peak_bytes[operation] = peak_bytes
+        self.max_peak_bytes[operation] = max(self.max_peak_bytes.get(operation, 0), peak_bytes)
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.seconds.clear()
+        self.counters.clear()
+        self.last_peak_bytes.clear()
+        self.max_peak_bytes.clear()
+
+
+def traced_peak(function: Callable, *args, **kwargs):
+    # (result, peak memory allocated during the call in bytes), with tracemalloc
+    # If tracemalloc is already running, only its peak is reset, and the memory
+    # already allocated before the call is not counted
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        result = function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return result, max(peak - before, 0)
+
+
+def _timed(compressor, stats: CompressorStats, operation: str) -> Callable:
+    # Timed version of one bound method
+    method = getattr(type(compressor), operation).__get__(compressor)
+    perf_counter = time.perf_counter
+    decodes = operation in DECODING_OPERATIONS
+    traces_memory = operation in MEMORY_OPERATIONS
+    # Operations whose first argument is a sequence of values / indices
+    takes_sequence = operation in ("compress", "extend", "get_many")
+
+    def timed(*args, **kwargs):
+        local = stats._local
+        if getattr(local, "busy", False):
+            return method(*args, **kwargs)
+        if takes_sequence and args and not hasattr(args[0], "__len__"):
+            # A generator of indices / values: read it once here, so the method
+            # and the counters below see the same values
+            args = (list(args[0]),) + args[1:]
+        local.busy = True
+        start = perf_counter()
+        try:
+            if traces_memory and stats.memory:
+                # The time includes the tracemalloc overhead
+                result, peak_bytes = traced_peak(method, *args, **kwargs)
+                stats.record_peak(operation, peak_bytes)
+            else:
+                result = method(*args, **kwargs)
+        finally:
+            local.busy = False
+        stats.record(operation, perf_counter() - start)
+
+        # Counted after the timer, so the counters do not slow the timings down
+        if operation == "get":
+            stats.add("gets")
+            compressor._record_get(args[0], stats)
+        elif operation == "get_many":
+            indices = compressor._check_indices(args[0])
+            stats.add("gets", len(indices))
+            for i in indices:
+                compressor._record_get(i, stats)
+        elif operation in ("compress", "extend"):
+            stats.add("values_compressed", len(args[0]) if hasattr(args[0], "__len__") else 0)
+        if decodes:
+            count = 1 if operation == "get" else len(result)
+            stats.add("values_decoded", count)
+            stats.add("bits_decoded", count * compressor.bits_per_element)
+        return result
+
+    return timed
+
+
+def enable(compressor, callback: Optional[Callable[[Dict[str, object]], None]] = None,
+           memory: bool = False) -> CompressorStats:
+    # Install the timed methods on this instance
+    stats = CompressorStats(callback, memory)
+    for operation in INSTRUMENTED_OPERATIONS:
+        setattr(compressor, operation, _timed(compressor, stats, operation))
+    compressor._stats = stats
+    return stats
+
+
+def disable(compressor) -> None:
+    # Back to the plain class methods
+    for operation in INSTRUMENTED_OPERATIONS:
+        compressor.__dict__.pop(operation, None)
+    compressor._stats = None
+
+
+def snapshot(compressor, stats: CompressorStats) -> Dict[str, object]:
+    # Plain dict (JSON friendly) with everything measured so far
+    operations: Dict[str, Dict[str, float]] = {}
+    for operation, calls in stats.calls.items():
+        seconds = stats.seconds[operation]
+        operations[operation] = {"calls": calls, "seconds": seconds, "mean_seconds": seconds / calls}
+        if operation in stats.max_peak_bytes:
+            operations[operation]["peak_bytes"] = stats.max_peak_bytes[operation]
+            operations[operation]["last_peak_bytes"] = stats.last_peak_bytes[operation]
+
+    counters: Dict[str, object] = dict(stats.counters)
+    counters["bytes_decoded"] = counters.pop("bits_decoded", 0) // 8
+    return {
+        "codec": compressor.codec_name or type(compressor).__name__,
+        "num_elements": compressor.num_elements,
+        "bits_per_element": compressor.bits_per_element,
+        "operations": operations,
+        "counters": counters,
+        # Codec specific rates (word crossings, overflow hits...)
+        **compressor._stats_gauges(counters),
+    }
+
+
+def rate(part: int, total: int) -> float:
+    return part / total if total else 0.0
+
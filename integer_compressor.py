@@ -1,11 +1,82 @@
 import abc
+import io
+import json
+import mmap as mmap_module
+import struct
+import sys
 from array import array
-from typing import List
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+import instrumentation
+
+# On-disk format (little-endian):
+#   magic "BPKC" | version (uint16) | reserved (uint16) | header length (uint32)
+#   header: JSON with the codec name, its metadata and the array table
+#   payload: the raw arrays, each one aligned on 8 bytes
+FORMAT_MAGIC = b"BPKC"
+FORMAT_VERSION = 1
+FORMAT_PREAMBLE = struct.Struct("<4sHHI")
+FORMAT_ALIGNMENT = 8
+
+# Codec name -> class, filled automatically by IntegerCompressor subclasses
+_CODECS: Dict[str, Type["IntegerCompressor"]] = {}
+
+
+# Supported word sizes for the bit-packing codecs -> array typecode
+# 'I' = unsigned int (32 bits), 'Q' = unsigned long long (64 bits)
+WORD_TYPECODES: Dict[int, str] = {32: 'I', 64: 'Q'}
+
+
+def check_word_bits(word_bits: int) -> int:
+    # Validate the word size given to a codec
+    if word_bits not in WORD_TYPECODES:
+        raise ValueError(f"word_bits must be 32 or 64, got {word_bits}")
+    return word_bits
+
+
+def check_value_bits(bits: int, word_bits: int) -> None:
+    # A value can span two words, but it cannot be wider than one word
+    if bits > word_bits:
+        raise ValueError(f"Values need {bits} bits, more than the {word_bits}-bit words"
+                         + (" (use word_bits=64)" if word_bits < 64 else ""))
+
+
+# Number of values decoded at a time by the scan operators (sum, count_where...)
+# The full list is never built, only one block of this size
+SCAN_BLOCK_SIZE = 4096
+
+
+def writable(data) -> array:
+    # Arrays loaded with mmap=True are read-only memoryviews:
+    # return an array copy of them (arrays are returned as they are)
+    if isinstance(data, array):
+        return data
+    result = array(data.format)
+    result.frombytes(data.cast("B"))
+    return result
+
+
+def zero_array(typecode: str, length: int) -> array:
+    # Array of 'length' zeros, allocated at its final size in one go
+    # (array(typecode, [0] * length) would first build a list of 'length' ints)
+    return array(typecode, [0]) * length
+
+
+def _aligned(offset: int) -> int:
+    return (offset + FORMAT_ALIGNMENT - 1) // FORMAT_ALIGNMENT * FORMAT_ALIGNMENT
 
 # This is the "interface" for all integer compressors
 # All my compressors must implement these methods
 class IntegerCompressor(abc.ABC):
 
+    # Name used in the on-disk format (same as the factory name)
+    codec_name: str = ""
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # Register every codec so load() can find its class by name
+        if "codec_name" in cls.__dict__:
+            _CODECS[cls.codec_name] = cls
+
     def __init__(self) -> None:
         """
         Init the shared attributes.
@@ -31,9 +102,358 @@ class IntegerCompressor(abc.ABC):
         # Child classes MUST implement this
         pass
 
+    def decompress_range(self, start: int, stop: int) -> List[int]:
+        # Decompress only the elements in [start, stop)
+        # Default: one get() per index, child classes can do better
+        self._check_range(start, stop)
+        return [self.get(i) for i in range(start, stop)]
+
+    def _check_range(self, start: int, stop: int) -> None:
+        # Same rule as get(): no negative or past-the-end positions
+        if not (0 <= start <= stop <= self.num_elements):
+            raise IndexError(f"Range [{start}, {stop}) is out of bounds")
+
+    def get_many(self, indices) -> List[int]:
+        # Get several values in one call
+        # 'indices' can be a list, an array or a NumPy array
+        # Default: one get() per index, child classes can do better
+        return [self.get(i) for i in self._check_indices(indices)]
+
+    def _check_indices(self, indices) -> List[int]:
+        # Convert the indices to a list of ints and check the bounds once
+        if hasattr(indices, "tolist"):
+            # array and NumPy arrays
+            indices = indices.tolist()
+        else:
+            indices = list(indices)
+
+        if indices:
+            lowest = min(indices)
+            if lowest < 0:
+                raise IndexError(f"Index {lowest} is out of bounds")
+            highest = max(indices)
+            if highest >= self.num_elements:
+                raise IndexError(f"Index {highest} is out of bounds")
+        return indices
+
     def get_compressed_size_in_bytes(self) -> int:
         # Get the size of the compressed data in bytes
         if not self.compressed_data:
             return 0
         # .itemsize is the size of one 'I' (4 bytes)
-        return self.compressed_data.itemsize * len(self.compressed_data)
\ No newline at end of file
+        return self.compressed_data.itemsize * len(self.compressed_data)
+
+    # ---- Instrumentation (off by default) ----
+    # enable_stats() times compress / decompress / get... on this instance only,
+    # a compressor without stats runs the plain methods (see instrumentation.py)
+
+    _stats: Optional[instrumentation.CompressorStats] = None
+
+    def enable_stats(self, callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     memory: bool = False) -> None:
+        # 'callback' receives the stats dict on every export_stats()
+        # memory=True also measures the peak memory of every compress() / extend()
+        if self._stats is None:
+            instrumentation.enable(self, callback, memory)
+            return
+        if callback is not None:
+            self._stats.callback = callback
+        if memory:
+            self._stats.memory = True
+
+    def disable_stats(self) -> None:
+        if self._stats is not None:
+            instrumentation.disable(self)
+
+    def reset_stats(self) -> None:
+        if self._stats is not None:
+            self._stats.reset()
+
+    def get_stats(self) -> Dict[str, Any]:
+        # Counters and timers so far (empty dict if the stats are disabled)
+        if self._stats is None:
+            return {}
+        return instrumentation.snapshot(self, self._stats)
+
+    def export_stats(self) -> Dict[str, Any]:
+        # Same as get_stats(), and give the dict to the callback
+        stats = self.get_stats()
+        if stats and self._stats.callback is not None:
+            self._stats.callback(stats)
+        return stats
+
+    def _record_get(self, i: int, stats: instrumentation.CompressorStats) -> None:
+        # Codec specific counters for one get(i) (only called when the stats are enabled)
+        pass
+
+    def _stats_gauges(self, counters: Dict[str, Any]) -> Dict[str, Any]:
+        # Codec specific values added to get_stats() (rates...)
+        return {}
+
+    def append(self, value: int) -> None:
+        # Add one value at the end
+        self.extend([value])
+
+    def extend(self, values) -> None:
+        # Add several values at the end
+        # Default: compress everything again, child classes can do better
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        if values:
+            self.compress(self.decompress() + values)
+
+    # ---- Scan and aggregate operators ----
+    # They decode one block of SCAN_BLOCK_SIZE values at a time,
+    # child classes can skip blocks or whole areas when they know more
+
+    def _iter_blocks(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, List[int]]]:
+        # Yield (position of the first value, decoded values) for [start, stop)
+        if stop is None:
+            stop = self.num_elements
+        for block_start in range(start, stop, SCAN_BLOCK_SIZE):
+            block_stop = min(block_start + SCAN_BLOCK_SIZE, stop)
+            yield block_start, self.decompress_range(block_start, block_stop)
+
+    def sum(self) -> int:
+        return sum(sum(block) for _, block in self._iter_blocks())
+
+    def min(self) -> int:
+        self._check_not_empty("min")
+        return min(min(block) for _, block in self._iter_blocks())
+
+    def max(self) -> int:
+        self._check_not_empty("max")
+        return max(max(block) for _, block in self._iter_blocks())
+
+    def count_where(self, lo: Optional[int] = None, hi: Optional[int] = None) -> int:
+        # Number of values v with lo <= v < hi (None = no bound)
+        lo, hi = predicate_bounds(lo, hi)
+        count = 0
+        for _, block in self._iter_blocks():
+            count += count_in_range(block, lo, hi)
+        return count
+
+    def select_where(self, lo: Optional[int] = None, hi: Optional[int] = None) -> List[int]:
+        # Positions of the values v with lo <= v < hi (None = no bound), in order
+        lo, hi = predicate_bounds(lo, hi)
+        indices: List[int] = []
+        for block_start, block in self._iter_blocks():
+            indices.extend(select_in_range(block, block_start, lo, hi))
+        return indices
+
+    # ---- Search on sorted columns ----
+    # Only for compressors built from sorted (non-decreasing) input, like bisect:
+    # on unsorted input the results mean nothing. They never decompress the column,
+    # only O(log n) values are decoded (child classes with an index do better)
+
+    def searchsorted(self, value: int, side: str = "left") -> int:
+        # Position where 'value' would be inserted to keep the column sorted (like numpy.searchsorted)
+        # "left" = before the values equal to it, "right" = after them
+        if side not in ("left", "right"):
+            raise ValueError(f"side must be 'left' or 'right', got '{side}'")
+        return self._lower_bound(value, 0, self.num_elements, side == "right")
+
+    def contains(self, value: int) -> bool:
+        i = self._lower_bound(value, 0, self.num_elements)
+        return i < self.num_elements and self.get(i) == value
+
+    def next_geq(self, value: int) -> Optional[int]:
+        # Smallest value >= 'value' (None if all the values are smaller)
+        i = self._lower_bound(value, 0, self.num_elements)
+        return self.get(i) if i < self.num_elements else None
+
+    def intersect(self, other: "IntegerCompressor") -> List[int]:
+        # Values of both sorted columns, in order (a value found twice in both is kept twice)
+        # The smaller column is decoded block by block, the values are searched in the
+        # bigger one with galloping: O(m log(n / m)) get() calls for m <= n values
+        small, large = (self, other) if self.num_elements <= other.num_elements else (other, self)
+        result: List[int] = []
+        position = 0
+        for _, block in small._iter_blocks():
+            for value in block:
+                position = large._gallop(value, position)
+                if position == large.num_elements:
+                    return result
+                if large.get(position) == value:
+                    result.append(value)
+                    position += 1
+        return result
+
+    def _lower_bound(self, value: int, lo: int, hi: int, right: bool = False) -> int:
+        # First position in [lo, hi) whose value is >= 'value' (> 'value' if right), hi if none
+        # Binary search with get()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self.get(mid)
+            if current < value or (right and current == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _gallop(self, value: int, lo: int) -> int:
+        # Same as _lower_bound(value, lo, num_elements), for a value close to lo:
+        # look at lo, lo + 1, lo + 3, lo + 7... then binary search the last gap
+        n = self.num_elements
+        hi = lo
+        step = 1
+        while hi < n and self.get(hi) < value:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        return self._lower_bound(value, lo, min(hi, n))
+
+    def _check_not_empty(self, operator: str) -> None:
+        # Same rule as the built-in min() / max()
+        if self.num_elements == 0:
+            raise ValueError(f"{operator}() of an empty compressor")
+
+    # ---- Serialization ----
+
+    def _get_state(self) -> Tuple[Dict[str, Any], Dict[str, array]]:
+        # What needs to be saved: (small metadata, big arrays)
+        # Child classes extend this with their own fields
+        meta = {"num_elements": self.num_elements, "bits_per_element": self.bits_per_element}
+        return meta, {"compressed_data": self.compressed_data}
+
+    def _set_state(self, meta: Dict[str, Any], arrays: Dict[str, array]) -> None:
+        # Inverse of _get_state()
+        self.num_elements = meta["num_elements"]
+        self.bits_per_element = meta["bits_per_element"]
+        self.compressed_data = arrays["compressed_data"]
+
+    @classmethod
+    def _from_state(cls, meta: Dict[str, Any], arrays: Dict[str, array]) -> "IntegerCompressor":
+        # Build an instance from saved state
+        # Child classes with constructor arguments override this
+        compressor = cls()
+        compressor._set_state(meta, arrays)
+        return compressor
+
+    def write_to(self, stream: BinaryIO) -> None:
+        # Write the compressor in the binary format to a file-like object
+        if not self.codec_name:
+            raise TypeError(f"{type(self).__name__} cannot be serialized")
+
+        meta, arrays = self._get_state()
+
+        # 1 - Array table, offsets are relative to the start of the payload
+        table = []
+        offset = 0
+        for name, data in arrays.items():
+            table.append({"name": name, "typecode": _typecode(data), "itemsize": data.itemsize,
+                          "length": len(data), "offset": offset})
+            offset = _aligned(offset + data.itemsize * len(data))
+        header = json.dumps({"codec": self.codec_name, "meta": meta, "arrays": table}).encode()
+
+        # 2 - Preamble + header
+        stream.write(FORMAT_PREAMBLE.pack(FORMAT_MAGIC, FORMAT_VERSION, 0, len(header)))
+        stream.write(header)
+
+        # 3 - Raw arrays, each one aligned on 8 bytes
+        payload_start = _aligned(FORMAT_PREAMBLE.size + len(header))
+        position = FORMAT_PREAMBLE.size + len(header)
+        for entry, data in zip(table, arrays.values()):
+            start = payload_start + entry["offset"]
+            stream.write(b"\0" * (start - position))
+            stream.write(data if sys.byteorder == "little" else _swapped(data))
+            position = start + data.itemsize * len(data)
+
+    def to_bytes(self) -> bytes:
+        # Serialize the compressor to bytes
+        stream = io.BytesIO()
+        self.write_to(stream)
+        return stream.getvalue()
+
+    def save(self, path: str) -> None:
+        # Serialize the compressor to a file
+        with open(path, "wb") as stream:
+            self.write_to(stream)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "IntegerCompressor":
+        # Load a compressor from bytes (the arrays are copied)
+        return _load_buffer(memoryview(data), copy=True)
+
+    @staticmethod
+    def load(path: str, mmap: bool = True) -> "IntegerCompressor":
+        # Load a compressor from a file
+        # With mmap=True the arrays are memoryviews on the mapped file:
+        # nothing is copied, get() only touches the pages it needs
+        with open(path, "rb") as stream:
+            if mmap and sys.byteorder == "little":
+                mapped = mmap_module.mmap(stream.fileno(), 0, access=mmap_module.ACCESS_READ)
+                return _load_buffer(memoryview(mapped), copy=False)
+            return _load_buffer(memoryview(stream.read()), copy=True)
+
+
+def _typecode(data: array) -> str:
+    # Arrays loaded with mmap are memoryviews: same codes in .format
+    return data.format if isinstance(data, memoryview) else data.typecode
+
+
+def _swapped(data: array) -> bytes:
+    # Little-endian bytes of an array on a big-endian machine
+    copy = array(_typecode(data), data)
+    copy.byteswap()
+    return copy.tobytes()
+
+
+def predicate_bounds(lo: Optional[int], hi: Optional[int]) -> Tuple[Any, Any]:
+    # Replace the missing bounds so that lo <= v < hi is always a valid test
+    # (an int compares fine with infinity)
+    return (float("-inf") if lo is None else lo), (float("inf") if hi is None else hi)
+
+
+def count_in_range(values: List[int], lo, hi) -> int:
+    # Number of values with lo <= v < hi
+    return len([v for v in values if lo <= v < hi])
+
+
+def select_in_range(values: List[int], first_position: int, lo, hi) -> List[int]:
+    # Positions (starting at first_position) of the values with lo <= v < hi
+    return [position for position, v in enumerate(values, first_position) if lo <= v < hi]
+
+
+def codec_from_state(codec: str, meta: Dict[str, Any], arrays: Dict[str, array]) -> IntegerCompressor:
+    # Build a compressor of the given codec from its saved state
+    codec_class = _CODECS.get(codec)
+    if codec_class is None:
+        raise ValueError(f"Unknown codec in file: '{codec}'")
+    return codec_class._from_state(meta, arrays)
+
+
+def _load_buffer(buffer: memoryview, copy: bool) -> IntegerCompressor:
+    # Parse the binary format from a buffer (bytes or mapped file)
+    # Import the factory so every codec class is registered
+    import compressor_factory  # noqa: F401
+
+    if len(buffer) < FORMAT_PREAMBLE.size:
+        raise ValueError("Not a compressor file (too short)")
+    magic, version, _, header_length = FORMAT_PREAMBLE.unpack(buffer[:FORMAT_PREAMBLE.size])
+    if magic != FORMAT_MAGIC:
+        raise ValueError("Not a compressor file (bad magic)")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version} (max {FORMAT_VERSION})")
+
+    header_end = FORMAT_PREAMBLE.size + header_length
+    header = json.loads(bytes(buffer[FORMAT_PREAMBLE.size:header_end]))
+    payload_start = _aligned(header_end)
+
+    arrays: Dict[str, array] = {}
+    for entry in header["arrays"]:
+        typecode = entry["typecode"]
+        if array(typecode).itemsize != entry["itemsize"]:
+            raise ValueError(f"Array '{entry['name']}' was saved with a different item size")
+        start = payload_start + entry["offset"]
+        raw = buffer[start:start + entry["itemsize"] * entry["length"]]
+        if copy:
+            data = array(typecode)
+            data.frombytes(raw)
+            if sys.byteorder == "big":
+                data.byteswap()
+        else:
+            # Zero-copy view on the mapped file
+            data = raw.cast(typecode)
+        arrays[entry["name"]] = data
+
+    return codec_from_state(header["codec"], header["meta"], arrays)
@@ -1,8 +1,29 @@
-from compressor_factory import CompressorFactory, COMPRESSOR_SPANNING, COMPRESSOR_NON_SPANNING, COMPRESSOR_OVERFLOW
+from compressor_factory import CompressorFactory, COMPRESSOR_SPANNING, COMPRESSOR_NON_SPANNING, COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR, COMPRESSOR_DICTIONARY, COMPRESSOR_RLE, COMPRESSOR_BLOCK_ADAPTIVE, MAIN_BITS_AUTO
+from cost_model import OBJECTIVES, select_codec
 import sys
 import argparse
 import ast
-from typing import List, Optional
+import time
+from array import array
+from typing import BinaryIO, Iterator, List, Optional
+
+# Formats accepted by --input
+FORMAT_CSV = "csv"                # 1,2,3 (also accepts spaces, newlines and [ ])
+FORMAT_NEWLINE = "newline"        # one value per line
+FORMAT_BINARY_U32 = "binary-u32"  # raw little-endian uint32
+FORMAT_BINARY_U64 = "binary-u64"  # raw little-endian uint64
+INPUT_FORMATS = [FORMAT_CSV, FORMAT_NEWLINE, FORMAT_BINARY_U32, FORMAT_BINARY_U64]
+
+# Number of values per chunk (binary) / bytes per read (text) for --input
+INPUT_CHUNK_SIZE = 1 << 20
+
+# Codecs whose extend() compresses (or encodes) the whole column again:
+# with --input they get all the chunks in one compress() instead,
+# else the time would grow with the square of the number of chunks
+WHOLE_INPUT_CODECS = (COMPRESSOR_PFOR, COMPRESSOR_DICTIONARY)
+
+# Separators of the text formats, all turned into spaces before split()
+_TEXT_SEPARATORS = bytes.maketrans(b",[]()", b"     ")
 
 
 # This is the main test function
@@ -18,6 +39,8 @@ def test_compression(compressor_name: str, data: List[int], **kwargs) -> None:
         
         # 2. Compress
         compressor.compress(data)
+        if kwargs.get("main_bits") == MAIN_BITS_AUTO:
+            print(f"Auto main_bits: k'={compressor.main_bits} (predicted size: {compressor.predicted_size_in_bytes} bytes)")
         
         # 3. Decompress
         decompressed_data = compressor.decompress()
@@ -40,9 +63,20 @@ def test_compression(compressor_name: str, data: List[int], **kwargs) -> None:
             print("SUCCESS: get() works.")
         else:
             print("FAILURE: get() failed!")
-            
-        # 6. Show size
-        original_size = len(data) * 4 # 4 bytes per int
+
+        # 6. Same reads with the stats enabled (timed methods on the instance)
+        compressor.enable_stats()
+        start, stop = (1, len(data) - 1) if len(data) > 1 else (0, len(data))
+        timed_ok = (compressor.decompress_range(start, stop) == data[start:stop]
+                    and compressor.get_many(i for i in range(len(data))) == data)
+        compressor.disable_stats()
+        if timed_ok:
+            print("SUCCESS: reads work with the stats enabled.")
+        else:
+            print("FAILURE: reads with the stats enabled failed!")
+
+        # 7. Show size
+        original_size = len(data) * kwargs.get("word_bits", 32) // 8 # 4 (or 8) bytes per int
         compressed_size = compressor.get_compressed_size_in_bytes()
         print(f"Original size (approx): {original_size} bytes")
         print(f"Compressed size: {compressed_size} bytes")
@@ -62,6 +96,7 @@ def parse_array(text: Optional[str]) -> Optional[List[int]]:
     - Python list literal like [1,2,3]
     - CSV format like 1,2,3
     - Or '-' to read from STDIN
+    Nested lists like [[1,2],[3]] are rejected (ValueError).
     
     Returns list[int] or None if text is None.
     """
@@ -77,29 +112,164 @@ def parse_array(text: Optional[str]) -> Optional[List[int]]:
     if not s:
         return []
 
-    # Method 1: Try to parse as Python literal (accepts [1,2,3])
+    # The tokenizer below drops every bracket: "[[1,2],[3]]" would become [1,2,3]
+    if s.count("[") + s.count("(") > 1:
+        raise ValueError(f"Nested arrays are not supported: {text}")
+
+    # Method 1: Split on commas, spaces and brackets (accepts [1,2,3] and 1,2,3)
+    # This is fast, ast.literal_eval() is very slow on big lists
+    try:
+        return parse_text_values(s.encode())
+    except ValueError:
+        pass
+
+    # Method 2: Fallback to a Python literal (hex values, expressions...)
     try:
         val = ast.literal_eval(s)
         if isinstance(val, (list, tuple)):
             return [int(x) for x in val]
     except Exception:
         pass
+    raise ValueError(f"Cannot parse array from: {text}")
+
+
+def parse_text_values(chunk: bytes) -> List[int]:
+    # Commas, brackets and whitespace are all separators
+    return list(map(int, chunk.translate(_TEXT_SEPARATORS).split()))
 
-    # Method 2: Fallback to comma-separated values
+
+def read_text_chunks(stream: BinaryIO, chunk_size: int = INPUT_CHUNK_SIZE) -> Iterator[List[int]]:
+    # Read the text 'chunk_size' bytes at a time
+    # The last number of a chunk may be cut: keep it for the next chunk
+    rest = b""
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        data = rest + data.translate(_TEXT_SEPARATORS)
+        cut = max(data.rfind(b" "), data.rfind(b"\n"), data.rfind(b"\r"), data.rfind(b"\t"))
+        if cut < 0:
+            # No separator yet: the whole chunk is part of one number
+            rest = data
+            continue
+        rest = data[cut + 1:]
+        values = parse_text_values(data[:cut])
+        if values:
+            yield values
+    values = parse_text_values(rest)
+    if values:
+        yield values
+
+
+def read_binary_chunks(stream: BinaryIO, typecode: str, chunk_size: int = INPUT_CHUNK_SIZE) -> Iterator[array]:
+    # Read raw little-endian integers 'chunk_size' values at a time
+    # array.frombytes() fills the array in C: no Python int per value
+    itemsize = array(typecode).itemsize
+    while True:
+        data = stream.read(chunk_size * itemsize)
+        if not data:
+            break
+        # A file that is not a multiple of the value size is probably the wrong format
+        # (checked on the bytes: array.fromfile() would drop the extra ones silently)
+        if len(data) % itemsize:
+            raise ValueError(f"Input size is not a multiple of {itemsize} bytes")
+        chunk = array(typecode)
+        chunk.frombytes(data)
+        if sys.byteorder == "big":
+            chunk.byteswap()
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
+
+
+def read_input_chunks(path: str, input_format: str, chunk_size: int = INPUT_CHUNK_SIZE) -> Iterator:
+    # Chunks of values from a file ('-' = stdin), in the given format
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
     try:
-        parts = [p.strip() for p in s.split(',') if p.strip() != '']
-        return [int(p) for p in parts]
-    except Exception:
-        raise ValueError(f"Cannot parse array from: {text}")
+        if input_format == FORMAT_BINARY_U32:
+            yield from read_binary_chunks(stream, 'I', chunk_size)
+        elif input_format == FORMAT_BINARY_U64:
+            yield from read_binary_chunks(stream, 'Q', chunk_size)
+        else:
+            # csv and newline use the same tokenizer (newlines are whitespace)
+            yield from read_text_chunks(stream, chunk_size * 8)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def compress_input(compressor_name: str, path: str, input_format: str, **kwargs) -> None:
+    # Parse the input chunk by chunk and feed every chunk to the compressor
+    # (compress() for the first chunk, then extend()), the full list is never built
+    # The WHOLE_INPUT_CODECS get the full list in one compress()
+    print("-" * 40)
+    print(f"TESTING: '{compressor_name}' on {path} ({input_format})")
+    try:
+        compressor = CompressorFactory.create_compressor(compressor_name, **kwargs)
+        start_time = time.perf_counter()
+        if compressor_name in WHOLE_INPUT_CODECS:
+            values: List[int] = []
+            for chunk in read_input_chunks(path, input_format):
+                values += chunk
+            compressor.compress(values)
+        else:
+            for chunk in read_input_chunks(path, input_format):
+                if compressor.num_elements == 0:
+                    compressor.compress(chunk.tolist() if isinstance(chunk, array) else chunk)
+                else:
+                    compressor.extend(chunk)
+        elapsed = time.perf_counter() - start_time
+
+        num_elements = compressor.num_elements
+        original_size = num_elements * kwargs.get("word_bits", 32) // 8
+        compressed_size = compressor.get_compressed_size_in_bytes()
+        print(f"Values: {num_elements}")
+        print(f"Parse + compress time: {elapsed:.3f} s")
+        print(f"Original size (approx): {original_size} bytes")
+        print(f"Compressed size: {compressed_size} bytes")
+        if num_elements:
+            print(f"Ratio: {original_size / max(compressed_size, 1):.2f}x")
+            index_to_test = num_elements // 2
+            print(f"get({index_to_test}) = {compressor.get(index_to_test)}")
+    except Exception as e:
+        print(f"ERROR testing '{compressor_name}': {e}")
+        sys.exit(1)
+    print("-" * 40)
+
+
+def test_best(data: List[int], objective: str) -> None:
+    # Let the cost model choose the codec, show why, then test it
+    compressor_type, kwargs, report = select_codec(data, objective)
+    print(f"Best codec for '{objective}': {report['chosen']} ({report['reason']})")
+    for name, candidate in report["candidates"].items():
+        print(f"  {name:<15} predicted size {candidate['size_bytes']:>10} bytes  "
+              f"decode {candidate['decode_seconds']:.6f}s  get {candidate['get_ns']:.0f}ns")
+    test_compression(compressor_type, data, **kwargs)
+
+
+def parse_main_bits(text: str):
+    # --main-bits accepts a number of bits or "auto"
+    if text == MAIN_BITS_AUTO:
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"main bits must be an integer or '{MAIN_BITS_AUTO}', got '{text}'")
 
 
 def main():
     # This is the main entry point
     # It parses command line arguments and runs the appropriate tests
     parser = argparse.ArgumentParser(description="Run compressor tests. Both arguments are optional.")
-    parser.add_argument('compressor', nargs='?', help=f"Compressor name (one of: {COMPRESSOR_NON_SPANNING}, {COMPRESSOR_SPANNING}, {COMPRESSOR_OVERFLOW})")
+    parser.add_argument('compressor', nargs='?', help=f"Compressor name (one of: {COMPRESSOR_NON_SPANNING}, {COMPRESSOR_SPANNING}, {COMPRESSOR_OVERFLOW}, {COMPRESSOR_PFOR}, {COMPRESSOR_DICTIONARY}, {COMPRESSOR_RLE}, {COMPRESSOR_BLOCK_ADAPTIVE})")
     parser.add_argument('array', nargs='?', help="Array to test: Python list literal '[1,2,3]' or comma-separated '1,2,3'. Use '-' to read from stdin.")
-    parser.add_argument('--main-bits', type=int, default=3, help="(optional) main_bits for overflow compressor (default: 3)")
+    parser.add_argument('--delta', action='store_true', help="(optional) delta-encode the array first (sorted columns)")
+    parser.add_argument('--zigzag', action='store_true', help="(optional) zigzag-encode the values first (negative integers)")
+    parser.add_argument('--word-bits', type=int, choices=[32, 64], default=32, help="(optional) size of the storage words, 64 for values wider than 32 bits (default: 32)")
+    parser.add_argument('--input', help="(optional) read the values from a file ('-' = stdin) chunk by chunk, instead of the array argument")
+    parser.add_argument('--format', choices=INPUT_FORMATS, default=FORMAT_CSV, help=f"(optional) format of --input (default: {FORMAT_CSV})")
+    parser.add_argument('--best', choices=OBJECTIVES, help="(optional) give only the array: let the cost model choose the codec for this objective")
+    parser.add_argument('--main-bits', type=parse_main_bits, default=3, help=f"(optional) main_bits for overflow compressor, or '{MAIN_BITS_AUTO}' to choose it from the data (default: 3)")
 
     args = parser.parse_args()
 
@@ -107,16 +277,48 @@ def main():
     test_data_simple: List[int] = [1, 2, 3, 4, 5, 6, 7, 0, 1, 3]
     test_data_medium: List[int] = [100, 2000, 4095, 0, 1234, 567]
     test_data_overflow: List[int] = [1, 2, 3, 1024, 4, 5, 2048]
+    test_data_dictionary: List[int] = [404, 200, 200, 3000000, 200, 404, 200, 3000000, 200, 200, 200, 200]
+    test_data_runs: List[int] = [0, 0, 0, 0, 0, 0, 7, 7, 7, 0, 0, 0, 0, 0, 0, 0, 0, 1500, 0, 0]
+
+    allowed = [COMPRESSOR_NON_SPANNING, COMPRESSOR_SPANNING, COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR, COMPRESSOR_DICTIONARY,
+               COMPRESSOR_RLE, COMPRESSOR_BLOCK_ADAPTIVE]
 
-    allowed = [COMPRESSOR_NON_SPANNING, COMPRESSOR_SPANNING, COMPRESSOR_OVERFLOW]
+    # Optional pre-transform stage, only used on a provided array
+    stage = {"delta": args.delta, "zigzag": args.zigzag, "word_bits": args.word_bits}
+
+    # With --best the codec is chosen for us: a single positional is the array
+    if args.best is not None and args.array is None:
+        args.compressor, args.array = None, args.compressor
+        if args.array is None:
+            print("--best needs an array")
+            sys.exit(2)
 
     compressor = args.compressor
-    array = parse_array(args.array) if args.array is not None else None
+    values = parse_array(args.array) if args.array is not None else None
 
     print("===== STARTING COMPRESSION TESTS =====")
 
+    # Case 0: --input file - parse it in chunks and feed the compressor(s)
+    if args.input is not None:
+        if values is not None:
+            print("Use either an array argument or --input, not both")
+            sys.exit(2)
+        if compressor is not None and compressor not in allowed:
+            print(f"Unknown compressor '{compressor}'. Allowed: {allowed}")
+            sys.exit(2)
+        if args.input == "-" and compressor is None:
+            print("With --input -, give a compressor name (stdin can only be read once)")
+            sys.exit(2)
+        for name in ([compressor] if compressor is not None else allowed):
+            if name in (COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR):
+                compress_input(name, args.input, args.format, main_bits=args.main_bits, **stage)
+            else:
+                compress_input(name, args.input, args.format, **stage)
+        print("\n===== DONE =====")
+        return
+
     # Case 1: No arguments - run all tests on default datasets
-    if compressor is None and array is None:
+    if compressor is None and values is None:
         # Test non-spanning
         test_compression(COMPRESSOR_NON_SPANNING, test_data_simple)
         test_compression(COMPRESSOR_NON_SPANNING, test_data_medium)
@@ -129,16 +331,34 @@ def main():
         print("\n===== TESTING OVERFLOW AREA =====")
         test_compression(COMPRESSOR_OVERFLOW, test_data_overflow, main_bits=args.main_bits)
 
+        # Test PFOR (patched exceptions)
+        print("\n===== TESTING PFOR =====")
+        test_compression(COMPRESSOR_PFOR, test_data_overflow, main_bits=args.main_bits)
+
+        # Test dictionary
+        print("\n===== TESTING DICTIONARY =====")
+        test_compression(COMPRESSOR_DICTIONARY, test_data_dictionary)
+        test_compression(COMPRESSOR_DICTIONARY, test_data_dictionary, dictionary_order="frequency")
+
+        # Test run-length
+        print("\n===== TESTING RUN-LENGTH =====")
+        test_compression(COMPRESSOR_RLE, test_data_runs)
+
+        # Test block adaptive
+        print("\n===== TESTING BLOCK ADAPTIVE =====")
+        test_compression(COMPRESSOR_BLOCK_ADAPTIVE, test_data_simple)
+        test_compression(COMPRESSOR_BLOCK_ADAPTIVE, test_data_overflow)
+
         print("\n===== ALL TESTS FINISHED =====")
         return
 
     # Case 2: Only compressor provided - run it on default datasets
-    if compressor is not None and array is None:
+    if compressor is not None and values is None:
         if compressor not in allowed:
             print(f"Unknown compressor '{compressor}'. Allowed: {allowed}")
             sys.exit(2)
 
-        if compressor == COMPRESSOR_OVERFLOW:
+        if compressor in (COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR):
             print(f"Running '{compressor}' on default overflow data with main_bits={args.main_bits}")
             test_compression(compressor, test_data_overflow, main_bits=args.main_bits)
         else:
@@ -150,25 +370,33 @@ def main():
         return
 
     # Case 3: Only array provided - run all compressors on this array
-    if compressor is None and array is not None:
-        print(f"Running all compressors on provided array: {array}")
-        test_compression(COMPRESSOR_NON_SPANNING, array)
-        test_compression(COMPRESSOR_SPANNING, array)
-        test_compression(COMPRESSOR_OVERFLOW, array, main_bits=args.main_bits)
+    if compressor is None and values is not None:
+        if args.best is not None:
+            test_best(values, args.best)
+            print("\n===== DONE =====")
+            return
+        print(f"Running all compressors on provided array: {values}")
+        test_compression(COMPRESSOR_NON_SPANNING, values, **stage)
+        test_compression(COMPRESSOR_SPANNING, values, **stage)
+        test_compression(COMPRESSOR_OVERFLOW, values, main_bits=args.main_bits, **stage)
+        test_compression(COMPRESSOR_PFOR, values, main_bits=args.main_bits, **stage)
+        test_compression(COMPRESSOR_DICTIONARY, values, **stage)
+        test_compression(COMPRESSOR_RLE, values, **stage)
+        test_compression(COMPRESSOR_BLOCK_ADAPTIVE, values, **stage)
         print("\n===== DONE =====")
         return
 
     # Case 4: Both compressor and array provided - run that specific test
-    if compressor is not None and array is not None:
+    if compressor is not None and values is not None:
         if compressor not in allowed:
             print(f"Unknown compressor '{compressor}'. Allowed: {allowed}")
             sys.exit(2)
 
-        print(f"Running compressor '{compressor}' on provided array: {array}")
-        if compressor == COMPRESSOR_OVERFLOW:
-            test_compression(compressor, array, main_bits=args.main_bits)
+        print(f"Running compressor '{compressor}' on provided array: {values}")
+        if compressor in (COMPRESSOR_OVERFLOW, COMPRESSOR_PFOR):
+            test_compression(compressor, values, main_bits=args.main_bits, **stage)
         else:
-            test_compression(compressor, array)
+            test_compression(compressor, values, **stage)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+import math
+from array import array
+from typing import List
+from unpack_kernels import spanning_layout
+
+# NumPy is optional: the pure Python engine works without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Engine names (same idea as the compressor name constants)
+ENGINE_PYTHON = "python"
+ENGINE_NUMPY = "numpy"
+
+# The vectorized spanning packer works on groups of word_bits elements:
+# 32 values of k bits always fill exactly k 32-bit words,
+# and 64 values fill exactly k 64-bit words
+
+# Array typecode of the storage words, by word size
+_WORD_TYPECODES = {32: 'I', 64: 'Q'}
+
+
+def check_engine(engine: str) -> str:
+    # Validate the engine name given to a compressor
+    if engine not in (ENGINE_PYTHON, ENGINE_NUMPY):
+        raise ValueError(f"Unknown engine: '{engine}'")
+    if engine == ENGINE_NUMPY and np is None:
+        raise ImportError("The 'numpy' engine requires NumPy to be installed")
+    return engine
+
+
+def to_numpy(data) -> "np.ndarray":
+    # Convert a list / array / ndarray of non-negative ints to uint64
+    if isinstance(data, np.ndarray):
+        return data.astype(np.uint64, copy=False)
+    return np.asarray(data, dtype=np.uint64)
+
+
+def words_to_array(words: "np.ndarray", word_bits: int = 32) -> array:
+    # Convert packed words back to the array('I') / array('Q') used by the codecs
+    result = array(_WORD_TYPECODES[word_bits])
+    dtype = np.uint32 if word_bits == 32 else np.uint64
+    result.frombytes(words.astype(dtype, copy=False).tobytes())
+    return result
+
+
+def array_to_words(compressed_data: array, first: int = 0, last: int = None) -> "np.ndarray":
+    # View the array('I') / array('Q') (or a slice of it) as uint64 words (no Python loop)
+    dtype = np.uint32 if compressed_data.itemsize == 4 else np.uint64
+    return np.frombuffer(compressed_data, dtype=dtype)[first:last].astype(np.uint64)
+
+
+def pack_spanning(values: "np.ndarray", k: int, word_bits: int = 32) -> "np.ndarray":
+    # Same layout as BitPackingSpanning.compress:
+    # element i starts at global bit i * k, low bits first
+    group_size = word_bits
+    num_elements = len(values)
+    output_size = math.ceil(num_elements * k / word_bits)
+    num_groups = math.ceil(num_elements / group_size)
+
+    # 1 - Pad to full groups and put each lane in its own row
+    padded = np.zeros(num_groups * group_size, dtype=np.uint64)
+    padded[:num_elements] = values & np.uint64((1 << k) - 1)
+    lanes = padded.reshape(num_groups, group_size).T.copy()
+
+    # 2 - Write every lane at its precomputed position
+    # (uint64 shifts wrap, so 64-bit words need no mask)
+    words = np.zeros((k, num_groups), dtype=np.uint64)
+    mask_word_bits = np.uint64((1 << word_bits) - 1)
+    for lane, (word, offset, spills) in enumerate(spanning_layout(k, word_bits)):
+        words[word] |= (lanes[lane] << np.uint64(offset)) & mask_word_bits
+        if spills:
+            words[word + 1] |= lanes[lane] >> np.uint64(word_bits - offset)
+
+    # 3 - Back to the sequential word order, cut to the real size
+    return words.T.reshape(-1)[:output_size]
+
+
+def unpack_spanning(words: "np.ndarray", num_elements: int, k: int, word_bits: int = 32) -> "np.ndarray":
+    # Inverse of pack_spanning
+    group_size = word_bits
+    num_groups = math.ceil(num_elements / group_size)
+    padded = np.zeros(num_groups * k, dtype=np.uint64)
+    padded[:len(words)] = words[:num_groups * k]
+    rows = padded.reshape(num_groups, k).T.copy()
+
+    mask = np.uint64((1 << k) - 1)
+    lanes = np.empty((group_size, num_groups), dtype=np.uint64)
+    for lane, (word, offset, spills) in enumerate(spanning_layout(k, word_bits)):
+        value = rows[word] >> np.uint64(offset)
+        if spills:
+            value |= rows[word + 1] << np.uint64(word_bits - offset)
+        lanes[lane] = value & mask
+
+    return lanes.T.reshape(-1)[:num_elements]
+
+
+def unpack_spanning_range(compressed_data: array, start: int, stop: int, k: int,
+                          word_bits: int = 32) -> "np.ndarray":
+    # Decode only the elements in [start, stop)
+    # Groups of word_bits elements start on a word boundary, so we only read
+    # the words of the groups that overlap the range
+    group_size = word_bits
+    first_group = start // group_size
+    last_group = math.ceil(stop / group_size)
+    words = array_to_words(compressed_data, first_group * k, last_group * k)
+    group_start = first_group * group_size
+    values = unpack_spanning(words, stop - group_start, k, word_bits)
+    return values[start - group_start:]
+
+
+def pack_non_spanning(values: "np.ndarray", k: int, word_bits: int = 32) -> "np.ndarray":
+    # Same layout as BitPackingNonSpanning.compress:
+    # elements_per_int values per word, never across two words
+    elements_per_int = word_bits // k
+    num_elements = len(values)
+    output_size = math.ceil(num_elements / elements_per_int)
+
+    padded = np.zeros(output_size * elements_per_int, dtype=np.uint64)
+    padded[:num_elements] = values & np.uint64((1 << k) - 1)
+    slots = padded.reshape(output_size, elements_per_int)
+
+    words = np.zeros(output_size, dtype=np.uint64)
+    for slot in range(elements_per_int):
+        words |= slots[:, slot] << np.uint64(slot * k)
+    return words
+
+
+def unpack_non_spanning(words: "np.ndarray", num_elements: int, k: int, word_bits: int = 32) -> "np.ndarray":
+    # Inverse of pack_non_spanning
+    elements_per_int = word_bits // k
+    shifts = np.arange(elements_per_int, dtype=np.uint64) * np.uint64(k)
+    mask = np.uint64((1 << k) - 1)
+    slots = (words[:, None] >> shifts[None, :]) & mask
+    return slots.reshape(-1)[:num_elements]
+
+
+def unpack_non_spanning_range(compressed_data: array, start: int, stop: int, k: int,
+                              word_bits: int = 32) -> "np.ndarray":
+    # Decode only the elements in [start, stop)
+    elements_per_int = word_bits // k
+    first_word = start // elements_per_int
+    last_word = math.ceil(stop / elements_per_int)
+    words = array_to_words(compressed_data, first_word, last_word)
+    word_start = first_word * elements_per_int
+    values = unpack_non_spanning(words, stop - word_start, k, word_bits)
+    return values[start - word_start:]
+
+
+def check_indices(indices, num_elements: int) -> "np.ndarray":
+    # Same checks as IntegerCompressor._check_indices, on an int64 array
+    positions = np.asarray(indices, dtype=np.int64).reshape(-1)
+    if len(positions):
+        lowest = int(positions.min())
+        if lowest < 0:
+            raise IndexError(f"Index {lowest} is out of bounds")
+        highest = int(positions.max())
+        if highest >= num_elements:
+            raise IndexError(f"Index {highest} is out of bounds")
+    return positions
+
+
+def gather_spanning(words: "np.ndarray", positions: "np.ndarray", k: int, word_bits: int = 32) -> "np.ndarray":
+    # Random access for many positions at once (spanning layout)
+    # Read the word + the next word so a value is never cut
+    # One zero word is added at the end for the last window
+    padded = np.append(words, np.uint64(0))
+    bit_cursor = positions.astype(np.uint64) * np.uint64(k)
+    word_index = (bit_cursor // np.uint64(word_bits)).astype(np.int64)
+    bit_offset = bit_cursor % np.uint64(word_bits)
+    low = padded[word_index] >> bit_offset
+    # Shifting a uint64 by 64 is undefined, so offset 0 takes nothing from the next word
+    spill_shift = (np.uint64(word_bits) - bit_offset) % np.uint64(word_bits)
+    high = np.where(bit_offset == 0, np.uint64(0), padded[word_index + 1] << spill_shift)
+    return (low | high) & np.uint64((1 << k) - 1)
+
+
+def gather_non_spanning(words: "np.ndarray", positions: "np.ndarray", k: int, word_bits: int = 32) -> "np.ndarray":
+    # Random access for many positions at once (non-spanning layout)
+    elements_per_int = word_bits // k
+    word_index = positions // elements_per_int
+    bit_offset = ((positions % elements_per_int) * k).astype(np.uint64)
+    return (words[word_index] >> bit_offset) & np.uint64((1 << k) - 1)
+
+
+def bits_for(values: "np.ndarray") -> int:
+    # Same rule as the Python codecs: k = max.bit_length(), at least 1
+    max_val = int(values.max()) if len(values) else 0
+    return max(max_val.bit_length(), 1)
+
+
+def to_list(values: "np.ndarray") -> List[int]:
+    # Python ints, like the pure Python decompress()
+    return values.tolist()
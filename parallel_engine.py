@@ -0,0 +1,124 @@
+import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+# Parallel pack/unpack for the spanning and non-spanning layouts
+# The input is cut at word-aligned element boundaries, so every chunk
+# can be packed on its own and the word arrays are just put end to end:
+# the result is exactly the same as the single-process version.
+
+LAYOUT_SPANNING = "spanning"
+LAYOUT_NON_SPANNING = "non_spanning"
+
+# Below this many elements per worker, starting processes costs more than it saves
+MIN_CHUNK_SIZE = 1 << 16
+
+
+def check_parallel(parallel: int) -> int:
+    # Validate the number of worker processes given to a compressor
+    if not isinstance(parallel, int) or parallel < 1:
+        raise ValueError(f"parallel must be a positive integer, got {parallel}")
+    return parallel
+
+
+def use_parallel(parallel: int, num_elements: int) -> bool:
+    # Only worth it if every worker gets a real chunk
+    return parallel > 1 and num_elements >= 2 * MIN_CHUNK_SIZE
+
+
+def _alignment(layout: str, k: int, word_bits: int = 32) -> int:
+    # Number of elements that always fill whole words
+    if layout == LAYOUT_SPANNING:
+        return word_bits          # word_bits values of k bits = k words
+    return word_bits // k         # elements_per_int values = 1 word
+
+
+def _words_for(layout: str, count: int, k: int, word_bits: int = 32) -> int:
+    # Number of words used by 'count' elements
+    if layout == LAYOUT_SPANNING:
+        return math.ceil(count * k / word_bits)
+    return math.ceil(count / (word_bits // k))
+
+
+def _typecode(word_bits: int) -> str:
+    # 'I' = 32-bit words, 'Q' = 64-bit words
+    return 'I' if word_bits == 32 else 'Q'
+
+
+def chunk_bounds(layout: str, start: int, stop: int, k: int, workers: int,
+                 word_bits: int = 32) -> List[Tuple[int, int]]:
+    # Split [start, stop) into at most 'workers' chunks
+    # Every inner boundary is a multiple of the alignment
+    alignment = _alignment(layout, k, word_bits)
+    chunk_size = math.ceil((stop - start) / workers / alignment) * alignment
+    bounds = []
+    chunk_start = start
+    while chunk_start < stop:
+        # The first chunk may be shorter, to get back on an aligned boundary
+        chunk_stop = min((chunk_start // alignment) * alignment + chunk_size, stop)
+        bounds.append((chunk_start, chunk_stop))
+        chunk_start = chunk_stop
+    return bounds
+
+
+def _pack_chunk(task: Tuple[str, List[int], int, int]) -> bytes:
+    # Runs in a worker process
+    # (the codec modules import this one, so import them here)
+    import bit_packing_non_spanning
+    import bit_packing_spanning
+    layout, chunk, k, word_bits = task
+    output = array(_typecode(word_bits), [0]) * _words_for(layout, len(chunk), k, word_bits)
+    if layout == LAYOUT_SPANNING:
+        bit_packing_spanning.pack_values(chunk, k, output, word_bits=word_bits)
+    else:
+        bit_packing_non_spanning.pack_values(chunk, k, output, word_bits)
+    return output.tobytes()
+
+
+def _unpack_chunk(task: Tuple[str, bytes, int, int, int, int]) -> List[int]:
+    # Runs in a worker process
+    # 'first' is the position of the chunk inside its first word
+    import bit_packing_non_spanning
+    import bit_packing_spanning
+    layout, payload, first, count, k, word_bits = task
+    words = array(_typecode(word_bits))
+    words.frombytes(payload)
+    if layout == LAYOUT_SPANNING:
+        return bit_packing_spanning.unpack_values(words, first * k, count, k, word_bits)
+    return bit_packing_non_spanning.unpack_values(words, first, count, k, word_bits)
+
+
+def parallel_pack(layout: str, data: List[int], k: int, workers: int, word_bits: int = 32) -> array:
+    # Pack 'data' with k bits per value using 'workers' processes
+    bounds = chunk_bounds(layout, 0, len(data), k, workers, word_bits)
+    tasks = [(layout, data[chunk_start:chunk_stop], k, word_bits) for chunk_start, chunk_stop in bounds]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(_pack_chunk, tasks))
+
+    # Stitch the word arrays together (the chunks are word-aligned)
+    compressed_data = array(_typecode(word_bits))
+    for part in parts:
+        compressed_data.frombytes(part)
+    return compressed_data
+
+
+def parallel_unpack(layout: str, compressed_data: array, start: int, stop: int,
+                    k: int, workers: int, word_bits: int = 32) -> List[int]:
+    # Decode [start, stop) using 'workers' processes
+    alignment = _alignment(layout, k, word_bits)
+    tasks = []
+    for chunk_start, chunk_stop in chunk_bounds(layout, start, stop, k, workers, word_bits):
+        # Send only the words of this chunk
+        aligned_start = (chunk_start // alignment) * alignment
+        first_word = _words_for(layout, aligned_start, k, word_bits)
+        last_word = _words_for(layout, chunk_stop, k, word_bits)
+        payload = bytes(compressed_data[first_word:last_word])
+        tasks.append((layout, payload, chunk_start - aligned_start, chunk_stop - chunk_start, k, word_bits))
+
+    result: List[int] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for part in executor.map(_unpack_chunk, tasks):
+            result.extend(part)
+    return result
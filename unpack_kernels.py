@@ -0,0 +1,88 @@
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+# Specialized unpack routines, one per (k, word size)
+# (same structure as the FastPFor unpackers)
+#
+# Spanning layout: a group of word_bits values of k bits always fills
+# exactly k words, so the position of every value inside a group is fixed.
+# For each k we generate the Python source of a loop that reads k words
+# and returns the word_bits values with straight-line shifts and masks:
+# no division, no modulo and no "does it wrap?" test per value.
+#
+# Non-spanning layout: one word holds word_bits // k values,
+# the generated loop reads one word and returns all of them.
+#
+# The source is compiled once per (k, word size), the first time it is used.
+
+# Below this many values the generic loop is as fast as a kernel
+MIN_KERNEL_VALUES = 64
+
+# MASKS[k] = (1 << k) - 1, so get() does not rebuild the mask on every call
+MASKS: Tuple[int, ...] = tuple((1 << k) - 1 for k in range(65))
+
+
+@lru_cache(maxsize=None)
+def spanning_layout(k: int, word_bits: int = 32) -> Tuple[Tuple[int, int, bool], ...]:
+    # For each of the word_bits lanes of a group: (word index, bit offset, spills?)
+    # This is computed once per (k, word size)
+    layout = []
+    for lane in range(word_bits):
+        word, offset = divmod(lane * k, word_bits)
+        layout.append((word, offset, offset + k > word_bits))
+    return tuple(layout)
+
+
+def _lane_expression(word: int, offset: int, spills: bool, k: int, word_bits: int) -> str:
+    # Python expression that extracts one value from the words w0, w1...
+    mask = (1 << k) - 1
+    if spills:
+        # Low bits at the top of this word, high bits at the bottom of the next one
+        return f"((w{word} >> {offset}) | (w{word + 1} << {word_bits - offset})) & {mask}"
+    if offset + k == word_bits:
+        # Top of the word: the shift already drops the other bits
+        return f"w{word} >> {offset}" if offset else f"w{word}"
+    if offset == 0:
+        return f"w{word} & {mask}"
+    return f"(w{word} >> {offset}) & {mask}"
+
+
+def _compile(name: str, source: str) -> Callable:
+    namespace: dict = {}
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    return namespace[name]
+
+
+@lru_cache(maxsize=None)
+def spanning_kernel(k: int, word_bits: int = 32) -> Callable[[object, int, int, List[int]], None]:
+    # kernel(words, first_word, num_groups, result):
+    # decode num_groups full groups starting at words[first_word], append them to result
+    word_names = ", ".join(f"w{word}" for word in range(k))
+    lanes = ", ".join(_lane_expression(word, offset, spills, k, word_bits)
+                      for word, offset, spills in spanning_layout(k, word_bits))
+    name = f"unpack_spanning_{word_bits}_{k}"
+    source = (
+        f"def {name}(words, first_word, num_groups, result):\n"
+        f"    extend = result.extend\n"
+        f"    it = iter(words[first_word:first_word + num_groups * {k}])\n"
+        f"    for {word_names}, in zip({', '.join(['it'] * k)}):\n"
+        f"        extend(({lanes},))\n"
+    )
+    return _compile(name, source)
+
+
+@lru_cache(maxsize=None)
+def non_spanning_kernel(k: int, word_bits: int = 32) -> Callable[[object, int, int, List[int]], None]:
+    # kernel(words, first_word, num_words, result):
+    # decode every value of num_words full words starting at words[first_word]
+    elements_per_int = word_bits // k
+    lanes = ", ".join(_lane_expression(0, slot * k, False, k, word_bits)
+                      for slot in range(elements_per_int))
+    name = f"unpack_non_spanning_{word_bits}_{k}"
+    source = (
+        f"def {name}(words, first_word, num_words, result):\n"
+        f"    extend = result.extend\n"
+        f"    for w0 in words[first_word:first_word + num_words]:\n"
+        f"        extend(({lanes},))\n"
+    )
+    return _compile(name, source)